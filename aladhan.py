@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+BASE = "https://api.aladhan.com/v1"
+
+
+class UpstreamError(RuntimeError):
+    """Aladhan javob berdi, lekin code != 200. retryable=False — so‘rovning o‘zi noto‘g‘ri (masalan noma'lum shahar)."""
+
+    def __init__(self, message: str, status: int = 0):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        return self.status == 429 or self.status >= 500 or self.status == 0
+
+
+class CircuitOpen(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    closed -> (ketma-ket failure_threshold xato) -> open -> (reset_timeout) -> half_open -> 1 ta sinov so‘rovi
+    Sinov muvaffaqiyatli bo‘lsa closed, aks holda yana open.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        # sinov so‘rovi boshlangan vaqt (0 — yo‘q); bekor qilingan sinov breaker'ni qotirib qo‘ymasin
+        self._probe_at = 0.0
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold:
+            return "closed"
+        if time.time() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        now = time.time()
+        if state == "half_open" and now - self._probe_at >= self.reset_timeout:
+            self._probe_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probe_at = 0.0
+
+    def record_failure(self) -> None:
+        self._probe_at = 0.0
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            if self.failures == self.failure_threshold:
+                self.opens += 1
+            self.opened_at = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opens": self.opens,
+            "opened_at": self.opened_at or None,
+        }
+
+
+class AladhanClient:
+    """
+    Bitta process uchun bitta pooled aiohttp session.
+    main() da start() qilinadi, shutdown'da close().
+    """
+
+    def __init__(
+        self,
+        base: str = BASE,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        keepalive_timeout: float = 60.0,
+        dns_ttl: int = 300,
+        timeout: float = 20.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+        max_backoff: float = 5.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.base = base.rstrip("/")
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.requests = 0
+        self.retried = 0
+        self.failed = 0
+        self.last_error = ""
+        self.last_ok_at = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None and not self._session.closed
+
+    async def start(self) -> None:
+        if self.started:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_ttl,
+            use_dns_cache=True,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _request(self, path: str, params: Dict[str, Any], timeout: Optional[float]) -> Dict[str, Any]:
+        kw = {}
+        if timeout is not None:
+            kw["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        async with self._session.get(f"{self.base}{path}", params=params, **kw) as r:
+            try:
+                data = await r.json(content_type=None)
+            except ValueError:
+                raise UpstreamError(f"HTTP {r.status}: JSON emas", r.status)
+
+        if not isinstance(data, dict) or data.get("code") != 200:
+            raise UpstreamError(str(data), r.status if r.status != 200 else 500)
+        return data
+
+    async def get_json(self, path: str, params: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        timeout — har bir urinish uchun. Tarmoq/5xx/429 xatolarida jitter'li exponential backoff bilan
+        qayta uriniladi; ketma-ket muvaffaqiyatsiz chaqiruvlar circuit breaker'ni ochadi va u ochiq
+        turganda so‘rov yuborilmay darhol CircuitOpen ko‘tariladi.
+        """
+        # start() unutilgan bo‘lsa ham (skript/test) — birinchi so‘rovda ochiladi
+        if not self.started:
+            await self.start()
+        if not self.breaker.allow():
+            raise CircuitOpen(f"Aladhan circuit open ({self.last_error})")
+
+        self.requests += 1
+        attempt = 0
+        while True:
+            try:
+                data = await self._request(path, params, timeout)
+            except UpstreamError as e:
+                if not e.retryable:
+                    # so‘rov xatosi — upstream sog‘, breaker'ga ta'sir qilmaydi
+                    self.breaker.record_success()
+                    raise
+                err: Exception = e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                err = e
+            else:
+                self.breaker.record_success()
+                self.last_ok_at = time.time()
+                return data
+
+            self.last_error = f"{type(err).__name__}: {err}"[:200]
+            if attempt >= self.retries:
+                self.failed += 1
+                self.breaker.record_failure()
+                raise err
+            attempt += 1
+            self.retried += 1
+            # full jitter: 0..min(max, base * 2^n)
+            await asyncio.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            **self.breaker.stats(),
+            "requests": self.requests,
+            "retried": self.retried,
+            "failed": self.failed,
+            "last_error": self.last_error,
+            "last_ok_at": self.last_ok_at or None,
+        }
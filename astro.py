@@ -0,0 +1,304 @@
+"""
+Offline namoz vaqtlari hisoblagichi (Aladhan / praytimes.org algoritmi bilan bir xil).
+
+method=2 (ISNA): Fajr 15°, Isha 15°; Imsak = Fajr - 10 min; Maghrib = quyosh botishi.
+school=1 (Hanafi): Asr soya koeffitsiyenti 2, school=0 (Shafi'i) — 1.
+Yuqori kengliklar: Aladhan default'i (latitudeAdjustmentMethod=3, angle based) — Fajr quyosh
+chiqishidan, Isha botishidan tunning angle/60 qismidan uzoq bo‘lmaydi (Astana yozda).
+
+Tekshirish (yozib olingan calendarByCity javobiga nisbatan):
+    python astro.py record Tashkent 2025 3 tests/data/calendarByCity_Tashkent_2025-03_m2_s1.json
+    python astro.py compare tests/data/calendarByCity_Tashkent_2025-03_m2_s1.json Tashkent
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import sys
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+
+# method -> (fajr_angle, isha_angle, isha_minutes)
+METHODS: Dict[int, Tuple[float, Optional[float], int]] = {
+    1: (18.0, 18.0, 0),      # Karachi
+    2: (15.0, 15.0, 0),      # ISNA
+    3: (18.0, 17.0, 0),      # MWL
+    4: (18.5, None, 90),     # Umm al-Qura
+    5: (19.5, 17.5, 0),      # Egypt
+}
+
+IMSAK_MINUTES = 10
+SUNSET_ANGLE = 0.833
+
+PRAYERS = ("Imsak", "Fajr", "Sunrise", "Dhuhr", "Asr", "Sunset", "Maghrib", "Isha")
+
+HIJRI_MONTHS = (
+    "Muharram", "Safar", "Rabīʿ al-awwal", "Rabīʿ al-thānī", "Jumādá al-ūlá", "Jumādá al-ākhirah",
+    "Rajab", "Shaʿbān", "Ramaḍān", "Shawwāl", "Dhū al-Qaʿdah", "Dhū al-Ḥijjah",
+)
+
+_RAD = math.pi / 180.0
+
+
+def _fix(a: float, b: float) -> float:
+    a = a - b * math.floor(a / b)
+    return a + b if a < 0 else a
+
+
+def _julian(d: date) -> float:
+    # 0h UT dagi Julian sana
+    return d.toordinal() + 1721424.5
+
+
+def _sun_position(jd: float) -> Tuple[float, float]:
+    """-> (declination deg, equation of time hours)"""
+    D = jd - 2451545.0
+    g = _fix(357.529 + 0.98560028 * D, 360.0)
+    q = _fix(280.459 + 0.98564736 * D, 360.0)
+    L = _fix(q + 1.915 * math.sin(g * _RAD) + 0.020 * math.sin(2 * g * _RAD), 360.0)
+    e = 23.439 - 0.00000036 * D
+    ra = math.atan2(math.cos(e * _RAD) * math.sin(L * _RAD), math.cos(L * _RAD)) / _RAD / 15.0
+    eqt = q / 15.0 - _fix(ra, 24.0)
+    decl = math.asin(math.sin(e * _RAD) * math.sin(L * _RAD)) / _RAD
+    return decl, eqt
+
+
+def _day_times(jd0: float, lat: float, fajr_angle: float, isha_angle: Optional[float], asr_factor: int) -> Dict[str, float]:
+    """
+    Bir kun uchun vaqtlar (soat, UT + longitude tuzatishisiz, "local solar").
+    praytimes.org kabi bitta iteratsiya: taxminiy vaqtlardan quyosh holati olinadi.
+    """
+    slat = math.sin(lat * _RAD)
+    clat = math.cos(lat * _RAD)
+
+    def mid_day(t: float) -> float:
+        _, eqt = _sun_position(jd0 + t)
+        return _fix(12.0 - eqt, 24.0)
+
+    def angle_time(angle: float, t: float, ccw: bool) -> float:
+        decl, _ = _sun_position(jd0 + t)
+        noon = mid_day(t)
+        sd, cd = math.sin(decl * _RAD), math.cos(decl * _RAD)
+        x = (-math.sin(angle * _RAD) - sd * slat) / (cd * clat)
+        x = max(-1.0, min(1.0, x))
+        T = math.acos(x) / _RAD / 15.0
+        return noon - T if ccw else noon + T
+
+    def asr_time(t: float) -> float:
+        decl, _ = _sun_position(jd0 + t)
+        angle = -math.atan(1.0 / (asr_factor + math.tan(abs(lat - decl) * _RAD))) / _RAD
+        return angle_time(angle, t, False)
+
+    fajr = angle_time(fajr_angle, 5 / 24, True)
+    sunrise = angle_time(SUNSET_ANGLE, 6 / 24, True)
+    dhuhr = mid_day(12 / 24)
+    asr = asr_time(13 / 24)
+    sunset = angle_time(SUNSET_ANGLE, 18 / 24, False)
+    isha = angle_time(isha_angle, 18 / 24, False) if isha_angle is not None else None
+
+    return {
+        "Fajr": fajr,
+        "Sunrise": sunrise,
+        "Dhuhr": dhuhr,
+        "Asr": asr,
+        "Sunset": sunset,
+        "Isha": isha,
+    }
+
+
+def _adjust_high_lats(res: Dict[str, float], fajr_angle: float, isha_angle: Optional[float]) -> None:
+    """praytimes.org adjustHighLats, "AngleBased" — Aladhan default'i."""
+    night = _fix(res["Sunrise"] - res["Sunset"], 24.0)
+    portion = fajr_angle / 60.0 * night
+    # angle_time x'ni [-1, 1] ga qisadi: quyosh shu burchakka tushmasa ham farq portion'dan oshadi
+    if _fix(res["Sunrise"] - res["Fajr"], 24.0) > portion:
+        res["Fajr"] = res["Sunrise"] - portion
+    if isha_angle is not None:
+        portion = isha_angle / 60.0 * night
+        if _fix(res["Isha"] - res["Sunset"], 24.0) > portion:
+            res["Isha"] = res["Sunset"] + portion
+
+
+def compute_days(
+    lat: float,
+    lng: float,
+    days: List[date],
+    tz: str = "Asia/Tashkent",
+    method: int = 2,
+    school: int = 1,
+) -> List[Dict[str, int]]:
+    """
+    Ko‘p kun uchun bitta o‘tishda hisoblaydi.
+    return: har kun uchun {prayer: minutes since local midnight}
+    """
+    fajr_angle, isha_angle, isha_minutes = METHODS.get(method, METHODS[2])
+    asr_factor = 2 if school == 1 else 1
+    zone = pytz.timezone(tz)
+    lng_h = lng / 15.0
+
+    out: List[Dict[str, int]] = []
+    for d in days:
+        offset_h = zone.utcoffset(datetime(d.year, d.month, d.day, 12)).total_seconds() / 3600.0
+        raw = _day_times(_julian(d) - lng / (15.0 * 24.0), lat, fajr_angle, isha_angle, asr_factor)
+        shift = offset_h - lng_h
+
+        res = {k: v + shift for k, v in raw.items() if v is not None}
+        _adjust_high_lats(res, fajr_angle, isha_angle)
+        res["Imsak"] = res["Fajr"] - IMSAK_MINUTES / 60.0
+        res["Maghrib"] = res["Sunset"]
+        if isha_angle is None:
+            res["Isha"] = res["Maghrib"] + isha_minutes / 60.0
+
+        # Aladhan kabi eng yaqin minutga yaxlitlanadi
+        out.append({k: int(math.floor(_fix(v + 0.5 / 60.0, 24.0) * 60.0)) for k, v in res.items()})
+    return out
+
+
+def compute_year(lat: float, lng: float, year: int, tz: str = "Asia/Tashkent", method: int = 2, school: int = 1):
+    start = date(year, 1, 1)
+    n = (date(year + 1, 1, 1) - start).days
+    days = [start + timedelta(days=i) for i in range(n)]
+    return days, compute_days(lat, lng, days, tz, method, school)
+
+
+def hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+# ===== Hijri (tabular / Kuwaiti algoritm) =====
+
+def gregorian_to_hijri(d: date, adjust: int = 0) -> Tuple[int, int, int]:
+    jdn = (d + timedelta(days=adjust)).toordinal() + 1721425
+    l = jdn - 1948440 + 10632
+    n = (l - 1) // 10631
+    l = l - 10631 * n + 354
+    j = ((10985 - l) // 5316) * ((50 * l) // 17719) + (l // 5670) * ((43 * l) // 15238)
+    l = l - ((30 - j) // 15) * ((17719 * j) // 50) - (j // 16) * ((15238 * j) // 43) + 29
+    m = (24 * l) // 709
+    day = l - (709 * m) // 24
+    y = 30 * n + j - 30
+    return y, m, day
+
+
+def hijri_to_gregorian(y: int, m: int, d: int, adjust: int = 0) -> date:
+    jdn = (11 * y + 3) // 30 + 354 * y + 30 * m - (m - 1) // 2 + d + 1948440 - 385
+    return date.fromordinal(jdn - 1721425) - timedelta(days=adjust)
+
+
+# ===== Aladhan'ga o‘xshash javob =====
+
+def _tz_label(zone, d: date) -> str:
+    off = zone.utcoffset(datetime(d.year, d.month, d.day, 12))
+    hours = int(off.total_seconds() // 3600)
+    return f"({hours:+03d})"
+
+
+def calendar_days(
+    lat: float,
+    lng: float,
+    days: List[date],
+    tz: str = "Asia/Tashkent",
+    method: int = 2,
+    school: int = 1,
+    hijri_adjust: int = 0,
+) -> List[dict]:
+    """calendarByCity "data" elementlari formatida (timings + gregorian/hijri sana)."""
+    zone = pytz.timezone(tz)
+    computed = compute_days(lat, lng, days, tz, method, school)
+    out = []
+    for d, t in zip(days, computed):
+        label = _tz_label(zone, d)
+        hy, hm, hd = gregorian_to_hijri(d, hijri_adjust)
+        out.append({
+            "timings": {k: f"{hhmm(t[k])} {label}" for k in PRAYERS if k in t},
+            "date": {
+                "gregorian": {"date": d.strftime("%d-%m-%Y")},
+                "hijri": {
+                    "date": f"{hd:02d}-{hm:02d}-{hy}",
+                    "day": f"{hd:02d}",
+                    "year": str(hy),
+                    "month": {"number": hm, "en": HIJRI_MONTHS[hm - 1]},
+                },
+            },
+        })
+    return out
+
+
+# ===== Tekshirish =====
+
+def compare_with_recorded(
+    recorded: List[dict],
+    lat: float,
+    lng: float,
+    tz: str = "Asia/Tashkent",
+    method: int = 2,
+    school: int = 1,
+    prayers: Tuple[str, ...] = ("Imsak", "Maghrib"),
+) -> Dict[str, int]:
+    """
+    recorded: Aladhan calendarByCity javobidagi "data" ro‘yxati.
+    return: har namoz uchun maksimal farq (minut).
+    """
+    days = [datetime.strptime(r["date"]["gregorian"]["date"], "%d-%m-%Y").date() for r in recorded]
+    computed = compute_days(lat, lng, days, tz, method, school)
+    worst = {p: 0 for p in prayers}
+    for r, c in zip(recorded, computed):
+        for p in prayers:
+            hh, mm = r["timings"][p][:5].split(":")
+            diff = abs(int(hh) * 60 + int(mm) - c[p])
+            worst[p] = max(worst[p], min(diff, 1440 - diff))
+    return worst
+
+
+def record(city: str, year: int, month: int, path: str, method: int = 2, school: int = 1) -> int:
+    """api.aladhan.com calendarByCity javobini fixture sifatida saqlaydi (tarmoq kerak)."""
+    from urllib.parse import urlencode
+    from urllib.request import urlopen
+
+    from cities import country
+
+    params = {"city": city, "country": country(city) or "UZ", "method": method, "school": school}
+    url = f"https://api.aladhan.com/v1/calendarByCity/{year}/{month}?{urlencode(params)}"
+    with urlopen(url, timeout=30) as resp:
+        data = json.load(resp)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    return len(data["data"])
+
+
+def _main(argv: List[str]) -> int:
+    if len(argv) == 5 and argv[0] == "record":
+        n = record(argv[1], int(argv[2]), int(argv[3]), argv[4])
+        print(f"{n} kun yozildi: {argv[4]}")
+        return 0
+    if len(argv) < 3 or argv[0] != "compare":
+        print(__doc__)
+        return 2
+
+    from cities import coords
+
+    path, city = argv[1], argv[2]
+    tz = argv[3] if len(argv) > 3 else "Asia/Tashkent"
+    ll = coords(city)
+    if not ll:
+        print(f"Noma'lum shahar: {city}")
+        return 2
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    recorded = data["data"] if isinstance(data, dict) else data
+
+    worst = compare_with_recorded(recorded, ll[0], ll[1], tz)
+    ok = all(v <= 1 for v in worst.values())
+    for p, v in worst.items():
+        print(f"{p}: max {v} min")
+    print("OK" if ok else "FAIL (>1 min)")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,78 @@
+"""
+Taqvim renderer micro-benchmark (bir process, bir thread):
+
+    python -m bench.render
+    python -m bench.render --iterations 200 --rows 29
+
+    cold     — har chaqiruvda font/shablon/matn keshlari tozalanadi: eski render
+               (fontni qayta yuklash + butun jadvalni chizish) narxiga teng
+    rgb      — issiq keshlar, 24-bit PNG
+    palette  — issiq keshlar, 4-bit palette PNG (default)
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import calendar_image  # noqa: E402
+
+
+def _rows(n: int, seed: int) -> list:
+    return [(f"{1 + i % 28:02d}-03-2026", f"05:{(i + seed) % 60:02d}", f"18:{(i * 7 + seed) % 60:02d}") for i in range(n)]
+
+
+def _clear_caches() -> None:
+    calendar_image._get_font.cache_clear()
+    calendar_image._template.cache_clear()
+    calendar_image._text_mask.cache_clear()
+
+
+def bench(name: str, png_mode: str, cold: bool, iterations: int, n_rows: int) -> dict:
+    # har iteratsiyada boshqa "shahar" — title va vaqtlar o‘zgaradi
+    inputs = [(f"City {i} — Ramazon taqvimi", _rows(n_rows, i)) for i in range(iterations)]
+    sizes: List[int] = []
+    calendar_image.render_png_bytes(*inputs[0], png_mode=png_mode)
+    t0 = time.perf_counter()
+    for title, rows in inputs:
+        if cold:
+            _clear_caches()
+        sizes.append(len(calendar_image.render_png_bytes(title, rows, png_mode=png_mode)))
+    total = time.perf_counter() - t0
+    return {
+        "case": name,
+        "renders_per_s": round(iterations / total, 1),
+        "ms_per_render": round(total / iterations * 1000, 2),
+        "avg_png_kb": round(sum(sizes) / len(sizes) / 1024, 1),
+    }
+
+
+def main(argv: List[str]) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--iterations", type=int, default=100)
+    p.add_argument("--rows", type=int, default=30)
+    p.add_argument("--out", default="")
+    args = p.parse_args(argv)
+
+    results = [
+        bench("cold", "rgb", True, args.iterations, args.rows),
+        bench("rgb", "rgb", False, args.iterations, args.rows),
+        bench("palette", "palette", False, args.iterations, args.rows),
+    ]
+    for r in results:
+        print(json.dumps(r, ensure_ascii=False))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,373 @@
+"""
+Yuklama sinovi: stub Telegram + stub Aladhan bilan bot.py'ning hot path'lari.
+
+    python -m bench.run --users 10000
+    python -m bench.run --users 100000 --scenarios reminder,fanout --out before.json
+
+Ssenariylar:
+    reminder  — N foydalanuvchi, simulyatsiya soati yarim tundan boshlab imsak/maghrib orqali
+                o‘tkaziladi (rebuild_plan + reminder_tick + LiveEngine tick'lari)
+    fanout    — N chatga bir vaqtda start_live
+    calendar  — parallel "cal:<city>" callback'lari (cal_cb)
+    handlers  — aralash menyu xabarlari burst'i (dispatcher orqali)
+    mash      — bir xil tugmani ketma-ket bosish: DM'da "⏳ Bugungi vaqtlar" va "cal:", guruhda
+                bir nechta a'zoning /ramadan'i (throttle/coalesce qancha ish tejaganini ko‘rsatadi)
+
+Natija: throughput, p50/p99, chiquvchi so‘rovlar soni, peak RSS. --out bilan JSON'ga yoziladi
+va versiyalar orasida solishtiriladi. reminder'dagi countdown edit'lari sukut bo‘yicha faqat
+sanaladi (--live-http — stub Bot API'ga ham yuboriladi). Ishchi papka (--workdir) ichida o‘zining data.sqlite3'i bo‘ladi.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bench.stubs import StubAladhan, StubBotAPI  # noqa: E402
+
+SCENARIOS = ("reminder", "fanout", "calendar", "handlers", "mash")
+
+MENU_TEXTS = (
+    "⏳ Bugungi vaqtlar",
+    "🍽 Og‘iz ochish duosi",
+    "🌙 Og‘iz yopish duosi",
+    "📍 Shahar",
+    "📆 Ramazon taqvimi",
+    "/start",
+)
+
+
+class SimClock:
+    """bot/planner/live modullaridagi `time` o‘rniga qo‘yiladi — soatni oldinga surish uchun."""
+
+    def __init__(self, start: float):
+        self._now = start
+        self.perf_counter = time.perf_counter
+        self.monotonic = time.monotonic
+
+    def time(self) -> float:
+        return self._now
+
+    def set(self, ts: float) -> None:
+        self._now = max(self._now, ts)
+
+
+class CountingSender:
+    """
+    LiveEngine edit'larini HTTP'siz sanaydi (--live-http bo‘lmasa): ko‘p soatlik simulyatsiyada
+    millionlab edit bo‘ladi, stub orqali yuborish benchmark'ni sekinlashtiradi xolos.
+    """
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+
+    async def edit(self, chat_id: int, msg_id: int, text: str) -> None:
+        self.calls["editmessagetext"] += 1
+
+    async def send(self, chat_id: int, text: str) -> None:
+        self.calls["sendmessage"] += 1
+
+
+def pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    v = sorted(values)
+    return round(v[min(len(v) - 1, int(q * len(v)))] * 1000, 3)
+
+
+def peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.results: Dict[str, dict] = {}
+
+    # ===== setup =====
+
+    async def setup(self) -> None:
+        a = self.args
+        os.makedirs(a.workdir, exist_ok=True)
+        os.chdir(a.workdir)
+        for f in ("data.sqlite3", "data.sqlite3-wal", "data.sqlite3-shm"):
+            if os.path.exists(f):
+                os.remove(f)
+        os.environ.setdefault("BOT_TOKEN", "123456:bench")
+        os.environ.setdefault("ADMIN_ID", "1")
+        os.environ.setdefault("TIMINGS_BACKEND", "api")
+
+        import bot as botmod
+        import live as livemod
+        import planner as plannermod
+        import prayers
+        from aiogram import Bot, Dispatcher
+        from aiogram.client.session.aiohttp import AiohttpSession
+        from aiogram.client.telegram import TelegramAPIServer
+
+        self.botmod = botmod
+        self.tg = StubBotAPI(latency=a.tg_latency, jitter=a.tg_latency, error_rate=a.tg_error_rate)
+        self.aladhan = StubAladhan(tz=botmod.cfg.tz, latency=a.aladhan_latency, error_rate=a.aladhan_error_rate)
+        await self.tg.start()
+        await self.aladhan.start()
+
+        prayers.set_timezone(botmod.cfg.tz)
+        prayers.set_backend("api")
+        await prayers.start_client(base=self.aladhan.url + "/v1", limit=200, limit_per_host=200)
+        await botmod.db.init()
+        await botmod.shared.init()
+
+        session = AiohttpSession(api=TelegramAPIServer.from_base(self.tg.url))
+        self.bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+        if a.tg_rate > 0:
+            from outbox import OutboxMiddleware
+
+            botmod.outbox.__init__(global_rate=a.tg_rate, private_rate=max(1.0, a.tg_rate / 30))
+            self.bot.session.middleware(OutboxMiddleware(botmod.outbox))
+            botmod.outbox.start()
+        self.dp = Dispatcher()
+        botmod.router.message.middleware(botmod.throttle)
+        botmod.router.callback_query.middleware(botmod.throttle)
+        self.dp.include_router(botmod.router)
+
+        tz = botmod.pytz.timezone(botmod.cfg.tz)
+        today = datetime.now(tz).date()
+        midnight = tz.localize(datetime.combine(today, datetime.min.time())).timestamp()
+        self.clock = SimClock(midnight)
+        botmod.time = self.clock
+        plannermod.time = self.clock
+        livemod.time = self.clock
+        self.live_sender = livemod.BotSender(self.bot) if a.live_http else CountingSender()
+        botmod.live._sender = self.live_sender
+
+        await self.seed(a.users)
+
+    async def seed(self, n: int) -> None:
+        from keyboards import CITIES
+
+        rnd = random.Random(42)
+        rows = [(uid, CITIES[uid % len(CITIES)][0], rnd.choice((1, 5, 10, 15, 30, 60))) for uid in range(1, n + 1)]
+        t = time.perf_counter()
+        conn = self.botmod.db.conn
+        await conn.executemany("INSERT OR REPLACE INTO users(user_id, city, remind_before) VALUES(?,?,?)", rows)
+        await conn.commit()
+        self.results["seed"] = {"users": n, "seconds": round(time.perf_counter() - t, 3)}
+
+    async def close(self) -> None:
+        b = getattr(self, "botmod", None)
+        if b is not None:
+            await b.outbox.close()
+            await b.render_pool.close()
+            await b.db.close()
+            await b.shared.close()
+            import prayers
+
+            await prayers.close_client()
+        if getattr(self, "bot", None) is not None:
+            await self.bot.session.close()
+        for stub in (getattr(self, "tg", None), getattr(self, "aladhan", None)):
+            if stub is not None:
+                await stub.close()
+
+    def _snapshot(self):
+        return Counter(self.tg.calls), Counter(self.aladhan.calls)
+
+    def _record(self, name: str, n: int, seconds: float, lat: List[float], before, extra=None) -> None:
+        tg0, al0 = before
+        res = {
+            "operations": n,
+            "seconds": round(seconds, 3),
+            "throughput_per_s": round(n / seconds, 1) if seconds > 0 else 0.0,
+            "p50_ms": pct(lat, 0.5),
+            "p99_ms": pct(lat, 0.99),
+            "telegram_calls": dict(Counter(self.tg.calls) - tg0),
+            "aladhan_calls": dict(Counter(self.aladhan.calls) - al0),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        if extra:
+            res.update(extra)
+        self.results[name] = res
+
+    # ===== scenarios =====
+
+    async def reminder(self) -> None:
+        b = self.botmod
+        before = self._snapshot()
+        t0 = time.perf_counter()
+        await b.rebuild_plan()
+        plan_s = time.perf_counter() - t0
+
+        ticks: List[float] = []
+        live_ticks = 0
+        while True:
+            nxt = b.planner.next_at()
+            edits = [s.next_edit for s in b.LIVE_TASKS.values()]
+            cands = [x for x in ([nxt] if nxt is not None else []) + ([min(edits)] if edits else [])]
+            if not cands:
+                break
+            self.clock.set(min(cands))
+            now = self.clock.time()
+            if nxt is not None and nxt <= now:
+                t = time.perf_counter()
+                await b.reminder_tick(self.bot)
+                ticks.append(time.perf_counter() - t)
+            b.live.tick(now)
+            live_ticks += 1
+            await b.live.drain()
+
+        total = time.perf_counter() - t0
+        extra = {"plan_build_s": round(plan_s, 3), "live_ticks": live_ticks, "live": b.live.stats()}
+        if isinstance(self.live_sender, CountingSender):
+            extra["live_sender_calls"] = dict(self.live_sender.calls)
+        self._record("reminder", len(ticks), total, ticks, before, extra)
+
+    async def fanout(self) -> None:
+        b = self.botmod
+        n = self.args.users
+        before = self._snapshot()
+        lat: List[float] = []
+
+        async def one(uid: int) -> None:
+            t = time.perf_counter()
+            await b.start_live(self.bot, uid, uid, "maghrib")
+            lat.append(time.perf_counter() - t)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(uid) for uid in range(1, n + 1)), return_exceptions=True)
+        total = time.perf_counter() - t0
+        started = len(b.LIVE_TASKS)
+        for chat_id in list(b.LIVE_TASKS):
+            await b.stop_live(chat_id)
+        self._record("fanout", n, total, lat, before, {"sessions_started": started})
+
+    async def _feed(self, updates: List[dict]) -> List[float]:
+        from aiogram.types import Update
+
+        lat: List[float] = []
+
+        async def one(u: dict) -> None:
+            t = time.perf_counter()
+            try:
+                await self.dp.feed_update(self.bot, Update.model_validate(u, context={"bot": self.bot}))
+            except Exception:
+                pass
+            lat.append(time.perf_counter() - t)
+
+        await asyncio.gather(*(one(u) for u in updates))
+        return lat
+
+    async def calendar(self) -> None:
+        from fake_telegram import FakeTelegramClient
+        from keyboards import CITIES
+
+        fake = FakeTelegramClient("")
+        n = self.args.calendar_requests
+        updates = [fake.callback_update(uid, f"cal:{CITIES[uid % len(CITIES)][0]}") for uid in range(1, n + 1)]
+        before = self._snapshot()
+        t0 = time.perf_counter()
+        lat = await self._feed(updates)
+        self._record("calendar", n, time.perf_counter() - t0, lat, before)
+
+    async def handlers(self) -> None:
+        from fake_telegram import FakeTelegramClient
+
+        fake = FakeTelegramClient("")
+        rnd = random.Random(7)
+        n = self.args.burst
+        updates = [fake.message_update(rnd.randint(1, self.args.users), rnd.choice(MENU_TEXTS)) for _ in range(n)]
+        before = self._snapshot()
+        t0 = time.perf_counter()
+        lat = await self._feed(updates)
+        self._record("handlers", n, time.perf_counter() - t0, lat, before)
+
+    async def mash(self, presses: int = 5) -> None:
+        from fake_telegram import FakeTelegramClient
+        from keyboards import CITIES
+
+        b = self.botmod
+        fake = FakeTelegramClient("")
+        users = range(1, min(self.args.users, 500) + 1)
+        groups = range(1, 51)
+        updates = []
+        for uid in users:
+            updates += [fake.message_update(uid, "⏳ Bugungi vaqtlar") for _ in range(presses)]
+            updates += [fake.callback_update(uid, f"cal:{CITIES[uid % len(CITIES)][0]}") for _ in range(presses)]
+        for g in groups:
+            updates += [fake.message_update(g * 100 + i, "/ramadan", chat_id=-g) for i in range(presses)]
+        random.Random(3).shuffle(updates)
+
+        before = self._snapshot()
+        t0 = time.perf_counter()
+        lat = await self._feed(updates)
+        total = time.perf_counter() - t0
+        for chat_id in list(b.LIVE_TASKS):
+            await b.stop_live(chat_id)
+        extra = {"throttle": b.throttle.stats(), "reply_cache": b.REPLIES.stats()}
+        self._record("mash", len(updates), total, lat, before, extra)
+
+    async def run(self) -> Dict[str, dict]:
+        try:
+            await self.setup()
+            for name in self.args.scenarios:
+                await getattr(self, name)()
+                print(f"{name}: {json.dumps(self.results[name], ensure_ascii=False)}", flush=True)
+        finally:
+            await self.close()
+        self.results["meta"] = {
+            "users": self.args.users,
+            "tg_latency": self.args.tg_latency,
+            "aladhan_latency": self.args.aladhan_latency,
+            "tg_rate": self.args.tg_rate,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        return self.results
+
+
+def parse_args(argv: List[str]):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--users", type=int, default=10_000)
+    p.add_argument("--scenarios", default=",".join(SCENARIOS))
+    p.add_argument("--burst", type=int, default=2_000, help="handlers ssenariysidagi xabarlar soni")
+    p.add_argument("--calendar-requests", type=int, default=200)
+    p.add_argument("--tg-latency", type=float, default=0.005)
+    p.add_argument("--tg-error-rate", type=float, default=0.0)
+    p.add_argument("--aladhan-latency", type=float, default=0.05)
+    p.add_argument("--aladhan-error-rate", type=float, default=0.0)
+    p.add_argument("--tg-rate", type=float, default=0.0, help="outbox global limiti (0 — cheklovsiz)")
+    p.add_argument("--live-http", action="store_true", help="countdown edit'larini ham stub Bot API'ga yuborish")
+    p.add_argument("--workdir", default=os.path.join(ROOT, "bench", "work"))
+    p.add_argument("--out", default="")
+    args = p.parse_args(argv)
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        p.error(f"noma'lum ssenariy: {', '.join(sorted(unknown))}")
+    args.out = os.path.abspath(args.out) if args.out else ""
+    args.workdir = os.path.abspath(args.workdir)
+    return args
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(Bench(args).run())
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results["meta"], ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,162 @@
+"""
+Yuklama sinovi uchun lokal stub serverlar:
+- StubBotAPI — Telegram Bot API (sendMessage, editMessageText, sendPhoto, ...)
+- StubAladhan — api.aladhan.com (timingsByCity, calendarByCity), vaqtlar astro.py bilan
+
+Ikkalasida ham kechikish (latency) va xato ulushi (error_rate) sozlanadi.
+"""
+from __future__ import annotations
+
+import asyncio
+import calendar
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+import astro
+from cities import coords
+
+
+class _StubServer:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._rnd = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    def _app(self) -> web.Application:
+        raise NotImplementedError
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self._app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        sock = site._server.sockets[0]
+        self.url = f"http://{host}:{sock.getsockname()[1]}"
+        return self.url
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _delay(self) -> None:
+        d = self.latency + (self._rnd.random() * self.jitter if self.jitter else 0.0)
+        if d > 0:
+            await asyncio.sleep(d)
+
+    def _fail(self) -> bool:
+        return self.error_rate > 0 and self._rnd.random() < self.error_rate
+
+
+class StubBotAPI(_StubServer):
+    """aiogram: Bot(token, session=AiohttpSession(api=TelegramAPIServer.from_base(stub.url)))"""
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self._msg_id = itertools.count(1)
+        self._file_id = itertools.count(1)
+
+    def _app(self) -> web.Application:
+        app = web.Application(client_max_size=32 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        return app
+
+    async def _params(self, request: web.Request) -> Dict[str, Any]:
+        if request.content_type == "multipart/form-data":
+            data = await request.post()
+            return {k: v for k, v in data.items() if isinstance(v, str)}
+        if request.can_read_body:
+            try:
+                return dict(await request.post())
+            except Exception:
+                return {}
+        return {}
+
+    def _message(self, chat_id: Any, text: str = "") -> Dict[str, Any]:
+        cid = int(chat_id)
+        chat = {"id": cid, "type": "private" if cid > 0 else "supergroup"}
+        if cid < 0:
+            chat["title"] = "g"
+        return {"message_id": next(self._msg_id), "date": int(time.time()), "chat": chat, "text": text}
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        self.calls[method] += 1
+        params = await self._params(request)
+        await self._delay()
+
+        if self._fail():
+            self.errors[method] += 1
+            return web.json_response(
+                {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                 "parameters": {"retry_after": 1}},
+                status=429,
+            )
+
+        if method == "getme":
+            result: Any = {"id": 1, "is_bot": True, "first_name": "stub", "username": "stub_bot"}
+        elif method in ("sendmessage", "editmessagetext"):
+            result = self._message(params.get("chat_id", 1), params.get("text", ""))
+        elif method == "sendphoto":
+            result = self._message(params.get("chat_id", 1))
+            fid = f"stub-photo-{next(self._file_id)}"
+            result["photo"] = [{"file_id": fid, "file_unique_id": fid, "width": 800, "height": 1200}]
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+class StubAladhan(_StubServer):
+    """prayers.start_client(base=stub.url + "/v1")"""
+
+    def __init__(self, tz: str = "Asia/Tashkent", **kw):
+        super().__init__(**kw)
+        self.tz = tz
+
+    def _app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/v1/timingsByCity/{d}", self._today)
+        app.router.add_get("/v1/calendarByCity/{y}/{m}", self._calendar)
+        return app
+
+    def _error(self, msg: str) -> web.Response:
+        return web.json_response({"code": 400, "status": "Bad Request", "data": msg}, status=400)
+
+    async def _today(self, request: web.Request) -> web.Response:
+        self.calls["timingsByCity"] += 1
+        await self._delay()
+        if self._fail():
+            self.errors["timingsByCity"] += 1
+            return self._error("stub error")
+        ll = coords(request.query.get("city", ""))
+        if not ll:
+            return self._error("Unable to locate city")
+        d = datetime.strptime(request.match_info["d"], "%d-%m-%Y").date()
+        day = astro.calendar_days(ll[0], ll[1], [d], self.tz)[0]
+        return web.json_response({"code": 200, "status": "OK", "data": day}, dumps=json.dumps)
+
+    async def _calendar(self, request: web.Request) -> web.Response:
+        self.calls["calendarByCity"] += 1
+        await self._delay()
+        if self._fail():
+            self.errors["calendarByCity"] += 1
+            return self._error("stub error")
+        ll = coords(request.query.get("city", ""))
+        if not ll:
+            return self._error("Unable to locate city")
+        y, m = int(request.match_info["y"]), int(request.match_info["m"])
+        days = [date(y, m, i) for i in range(1, calendar.monthrange(y, m)[1] + 1)]
+        data = astro.calendar_days(ll[0], ll[1], days, self.tz)
+        return web.json_response({"code": 200, "status": "OK", "data": data})
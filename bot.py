@@ -1,251 +1,475 @@
 import asyncio
-from datetime import datetime, timedelta, date as dt_date
+import logging
+import time
+from datetime import datetime, timedelta
 import pytz
 
 from aiogram import Bot, Dispatcher, Router, F
-from aiogram.filters import CommandStart, Command
-from aiogram.types import Message, CallbackQuery, BufferedInputFile
+from aiogram.filters import CommandStart, Command, ChatMemberUpdatedFilter, LEAVE_TRANSITION
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, CallbackQuery, BufferedInputFile, ChatMemberUpdated
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from config import load_config
-from db import DB
-from prayers import get_today, get_calendar_by_city
+from db import CachedDB
+from prayers import (
+    get_today,
+    get_day_times,
+    get_ramadan_rows,
+    prefetch,
+    set_timezone,
+    set_backend,
+    set_store_dir,
+    start_client,
+    close_client,
+    health as timings_health,
+)
+from aladhan import CircuitBreaker
 from keyboards import (
+    CITIES,
     main_menu,
     stop_menu,
     reminder_inline,
     city_inline,
     calendar_city_inline,
 )
-from texts import WELCOME, DUA_OCHISH, DUA_YOPISH, GROUP_HELP
-from calendar_image import render_ramadan_calendar_png
+from texts import WELCOME, DUA_OCHISH, DUA_YOPISH, GROUP_HELP, STALE_NOTE
+from cache import TTLCache
+from calendar_cache import CalendarCache
+from render_pool import RenderPool
+from cities import HINT_THRESHOLD, resolve as resolve_city
+from live import LiveEngine, LiveSession, BotSender, CadencePolicy
+from timings_store import DayTimes
+from astro import hhmm
+from planner import ReminderPlanner
+from outbox import Outbox, OutboxMiddleware, Priority, priority
+from webhook import run_webhook
+from throttle import ThrottleMiddleware
+from diag import PROFILE_MAX, LoopMonitor, format_blocks, pstats_profile, sample_profile
+from shard import ShardRing, make_shared_state
+import metrics
+
+log = logging.getLogger(__name__)
 
 cfg = load_config()
-db = DB()
+# ✅ profil keshi: bir nechta worker bo‘lsa boshqa worker'dagi o‘zgarish TTL ichida ko‘rinadi
+db = CachedDB(
+    max_profiles=cfg.profile_cache_size,
+    ttl=cfg.profile_cache_ttl or (60.0 if cfg.worker_count > 1 else 0.0),
+)
 router = Router()
+# ✅ taqvim render'i event loop'ni to‘xtatmasin — alohida process'larda
+render_pool = RenderPool(cfg.render_workers, cfg.render_concurrency, cfg.render_mode)
+calendars = CalendarCache(cfg.calendar_cache_dir, render_pool, cfg.calendar_png_mode)
+
+live = LiveEngine(
+    cadence=CadencePolicy.parse(cfg.live_cadence),
+    on_finish=lambda s: _spawn(db.delete_live_session(s.chat_id)),
+)
+# chat_id -> LiveSession (DM ham chat)
+LIVE_TASKS: dict[int, LiveSession] = live.sessions
+outbox = Outbox(
+    global_rate=cfg.tg_global_rate,
+    private_rate=cfg.tg_private_rate,
+    group_rate=cfg.tg_group_rate,
+)
+# event loop lag/bloklash kuzatuvchisi (/diag)
+monitor = LoopMonitor(threshold=cfg.block_threshold)
+# menyu tugmalari/komandalar uchun debounce (flags={"throttle": ...} bo‘lgan handler'lar)
+throttle = ThrottleMiddleware(cfg.throttle_window, cfg.chat_throttle_window, scopes={"city": lambda uid: user_city(uid)})
+planner = ReminderPlanner(
+    lambda city: resolve_targets(city),
+    lambda start, end: due_rows(start, end),
+    window=cfg.plan_window,
+)
 
-# chat_id -> asyncio.Task (DM ham chat)
-LIVE_TASKS: dict[int, asyncio.Task] = {}
-# user_id -> temp reminder minutes
-TEMP_REM: dict[int, int] = {}
+# ✅ bir nechta worker: chat'lar ring bo‘yicha bo‘linadi, lease/claim'lar umumiy store'da
+ring = ShardRing(cfg.worker_count)
+shared = make_shared_state(cfg.shared_state_url)
+WORKER = f"w{cfg.worker_id}"
+LEASE_TTL = 30.0
+# shu worker lease olgan chat'lar
+HELD_LEASES: set[int] = set()
 
+# temp reminder minutes (user_id bo‘yicha) — shared store'da, har qanday worker davom ettira oladi
+TEMP_REM_TTL = 3600
+
+
+async def get_temp_rem(user_id: int, default: int) -> int:
+    val = await shared.get_value(f"temp_rem:{user_id}")
+    return int(val) if val else default
 
-def now_tz() -> datetime:
-    return datetime.now(pytz.timezone(cfg.tz))
 
+async def set_temp_rem(user_id: int, minutes: int) -> None:
+    await shared.set_value(f"temp_rem:{user_id}", str(minutes), TEMP_REM_TTL)
 
-def parse_hhmm(s: str) -> datetime:
-    hhmm = (s or "").strip()[:5]
-    return datetime.strptime(hhmm, "%H:%M")
 
+# (kind, city, sana) -> tayyor javob; bir shahar bo‘yicha bir vaqtdagi bosishlar bitta hisobga birlashadi
+REPLIES = TTLCache(max_items=5000)
 
-def build_targets(times: dict) -> tuple[datetime, datetime]:
-    tz = pytz.timezone(cfg.tz)
-    d = now_tz().date()
-    imsak_dt = tz.localize(datetime.combine(d, parse_hhmm(times["imsak"]).time()))
-    magh_dt = tz.localize(datetime.combine(d, parse_hhmm(times["maghrib"]).time()))
-    return imsak_dt, magh_dt
 
+async def cached_reply(kind: str, city: str, build):
+    key = (kind, city, now_tz().date().isoformat())
+    return await REPLIES.get_or_load(key, build, lambda: time.time() + cfg.reply_cache_ttl)
 
-def fmt_countdown(delta: timedelta) -> str:
-    sec = int(delta.total_seconds())
-    if sec < 0:
-        sec = 0
-    h = sec // 3600
-    m = (sec % 3600) // 60
-    s = sec % 60
-    return f"{h:02d}:{m:02d}:{s:02d}"
 
+async def user_city(user_id: int):
+    # throttle scope: bir chatda turli shahar uchun bosishlar bir-birini tashlamasin
+    user = await db.get(user_id)
+    return user["city"] if user else None
+
+
+# target o‘tib ketgan sessiya restart'dan keyin shuncha vaqt ichida "Vaqt bo‘ldi!" bilan yakunlanadi
+RESUME_GRACE = 15 * 60
+
+_BG: set[asyncio.Task] = set()
+
+
+def _spawn(coro) -> None:
+    task = asyncio.create_task(coro)
+    _BG.add(task)
+    task.add_done_callback(_BG.discard)
+
+
+def now_tz() -> datetime:
+    return datetime.now(pytz.timezone(cfg.tz))
 
-def choose_mode(imsak_dt: datetime, magh_dt: datetime, now: datetime) -> str:
-    if now < imsak_dt:
+
+def choose_mode(dt: DayTimes, now: float) -> str:
+    if now < dt.imsak_at:
         return "imsak"
-    if now < magh_dt:
+    if now < dt.maghrib_at:
         return "maghrib"
     return "imsak"
 
 
+def owns(chat_id: int) -> bool:
+    return ring.owner(chat_id) == cfg.worker_id
+
+
 async def stop_live(chat_id: int) -> None:
-    task = LIVE_TASKS.pop(chat_id, None)
-    if task and not task.done():
-        task.cancel()
-        try:
-            await task
-        except Exception:
-            pass
+    if live.remove(chat_id) is not None or chat_id in HELD_LEASES:
+        HELD_LEASES.discard(chat_id)
+        await db.delete_live_session(chat_id)
+        await shared.release_lease(chat_id, WORKER)
+    elif cfg.worker_count > 1:
+        # countdown boshqa worker'da — o‘sha worker keyingi sync'da to‘xtatadi
+        await shared.request_stop(chat_id)
+
+
+async def sync_leases() -> None:
+    """
+    Lease'larni yangilaydi, tugagan sessiyalar lease'ini bo‘shatadi
+    va boshqa worker'lardan kelgan to‘xtatish/qayta rejalash so‘rovlarini bajaradi.
+    """
+    for user_id in await shared.replan_requests(WORKER):
+        # profil keshida eski shahar/remind_before qolgan bo‘lishi mumkin
+        db.invalidate(user_id)
+        await replan_user(user_id)
+
+    for chat_id in await shared.stop_requests(WORKER):
+        live.remove(chat_id)
+        HELD_LEASES.discard(chat_id)
+        await db.delete_live_session(chat_id)
+
+    for chat_id in list(HELD_LEASES - LIVE_TASKS.keys()):
+        HELD_LEASES.discard(chat_id)
+        await shared.release_lease(chat_id, WORKER)
+
+    await shared.renew_leases(HELD_LEASES, WORKER, LEASE_TTL)
+
+
+def build_session(chat_id: int, user_id: int, mode: str, msg_id: int, city: str, dt: DayTimes) -> LiveSession:
+    if mode == "imsak":
+        target = dt.imsak_at
+        title = "🌙 Og‘iz yopishga oz qoldi"
+        target_txt = f"Imsak: {hhmm(dt.imsak)}"
+    else:
+        target = dt.maghrib_at
+        title = "🍽 Og‘iz ochishga oz qoldi"
+        target_txt = f"Maghrib: {hhmm(dt.maghrib)}"
+
+    return LiveSession(
+        chat_id=chat_id,
+        user_id=user_id,
+        mode=mode,
+        msg_id=msg_id,
+        target=target,
+        header=f"{title}\n📍 {city}\n🕰 {target_txt}",
+    )
 
 
-async def live_message_loop(bot: Bot, chat_id: int, user_id: int, mode: str, msg_id: int):
+async def start_live(bot: Bot, chat_id: int, user_id: int, mode: str) -> bool:
     """
-    1 ta xabarni sekundiga edit qilib countdown qiladi.
+    1 ta xabarni countdown qilib turadi (umumiy LiveEngine ticker orqali).
     chat_id: DM yoki group
     user_id: shahar/sozlama kimniki bo‘lsa shu
+    return: sessiya shu chaqiruvda boshlandimi (reminder_tick shunga qarab mark_sent qiladi)
     """
-    while True:
-        user = await db.get(user_id)
-        if not user:
-            return
+    if chat_id in LIVE_TASKS:
+        return False
+    user = await db.get(user_id)
+    if not user:
+        return False
+    # target bir marta hisoblanadi — ticker ichida DB/API yo‘q
+    dt = await get_day_times(user["city"], cfg.country)
+
+    # ✅ chat'da faqat bitta worker countdown qiladi
+    if chat_id not in HELD_LEASES:
+        if not await shared.acquire_lease(chat_id, WORKER, LEASE_TTL):
+            return False
+        HELD_LEASES.add(chat_id)
 
-        try:
-            times = await get_today(user["city"], cfg.country)
-            imsak_dt, magh_dt = build_targets(times)
-        except Exception:
-            await asyncio.sleep(2)
-            continue
+    try:
+        msg = await bot.send_message(chat_id, "⏳ Eslatma boshlandi…", reply_markup=stop_menu())
+    except Exception:
+        HELD_LEASES.discard(chat_id)
+        await shared.release_lease(chat_id, WORKER)
+        raise
+    if chat_id in LIVE_TASKS:
+        return False
+    session = build_session(chat_id, user_id, mode, msg.message_id, user["city"], dt)
+    live.add(session)
+    # restart'dan keyin davom ettirish uchun: write-behind navbati keyingi batch'da commit qiladi
+    await db.save_live_session(session.to_row(), WORKER)
+    return True
 
-        now = now_tz()
 
-        if mode == "imsak":
-            target = imsak_dt
-            title = "🌙 Og‘iz yopishga oz qoldi"
-            target_txt = f"Imsak: {times['imsak']}"
-        else:
-            target = magh_dt
-            title = "🍽 Og‘iz ochishga oz qoldi"
-            target_txt = f"Maghrib: {times['maghrib']}"
-
-        diff = target - now
-        text = (
-            f"{title}\n"
-            f"📍 {user['city']}\n"
-            f"🕰 {target_txt}\n"
-            f"⏳ {fmt_countdown(diff)}\n\n"
-            f"🛑 To‘xtatish bossangiz eslatma to‘xtaydi."
-        )
-
-        # ✅ MUHIM: edit xatoda task o‘lib qolmasin
-        try:
-            await bot.edit_message_text(text, chat_id=chat_id, message_id=msg_id)
-        except Exception:
-            await asyncio.sleep(2)
+async def resume_live_sessions() -> int:
+    """
+    Startup'da: shu worker'ning saqlangan countdown'larini tiklaydi.
+    Birinchi edit'lar cfg.live_resume_stagger oralig‘ida taqsimlanadi — API'ga bir zarbada urilmaydi.
+    """
+    now = time.time()
+    resumed = 0
+    for row in await db.list_live_sessions():
+        owner = row.pop("owner")
+        chat_id = row["chat_id"]
+        if owner != WORKER:
             continue
+        if row["target"] < now - RESUME_GRACE or chat_id in LIVE_TASKS:
+            await db.delete_live_session(chat_id)
+            continue
+        if not await shared.acquire_lease(chat_id, WORKER, LEASE_TTL):
+            continue
+        HELD_LEASES.add(chat_id)
 
-        if diff.total_seconds() <= 0:
-            try:
-                await bot.send_message(chat_id, "✅ Vaqt bo‘ldi!")
-            except Exception:
-                pass
-            return
-
-        await asyncio.sleep(1)
-
-
-async def start_live(bot: Bot, chat_id: int, user_id: int, mode: str):
-    if chat_id in LIVE_TASKS:
-        return
-    msg = await bot.send_message(chat_id, "⏳ Eslatma boshlandi…", reply_markup=stop_menu())
-    task = asyncio.create_task(live_message_loop(bot, chat_id, user_id, mode, msg.message_id))
-    LIVE_TASKS[chat_id] = task
+        session = LiveSession(**row)
+        session.next_edit = now + resumed * cfg.live_resume_stagger
+        live.add(session)
+        resumed += 1
+    return resumed
 
 
 # ===== Commands =====
 
 @router.message(CommandStart())
 async def start(m: Message):
-    await db.ensure(m.from_user.id)
+    await ensure_user(m.from_user.id)
     await m.answer(WELCOME, reply_markup=main_menu())
     if m.chat.type != "private":
         await m.answer(GROUP_HELP)
 
 
-@router.message(Command("ramadan"))
+async def _ramadan_reply(city: str):
+    dt = await get_day_times(city, cfg.country)
+    text = (
+        f"📍 {city}\n"
+        f"🌙 Og‘iz yopish (Imsak): {hhmm(dt.imsak)}\n"
+        f"🍽 Og‘iz ochish (Maghrib): {hhmm(dt.maghrib)}\n"
+        + (STALE_NOTE if dt.stale else "")
+        + "\n⏳ Countdown boshlanmoqda…"
+    )
+    return dt, text
+
+
+@router.message(Command("ramadan"), flags={"throttle": "ramadan", "throttle_scope": "city"})
 async def ramadan_cmd(m: Message):
     """
     group/kanalda /ramadan yozilsa — shu chatda vaqtlar + countdown.
     """
-    await db.ensure(m.from_user.id)
+    await ensure_user(m.from_user.id)
     user = await db.get(m.from_user.id)
 
-    t = await get_today(user["city"], cfg.country)
-    imsak_dt, magh_dt = build_targets(t)
-    mode = choose_mode(imsak_dt, magh_dt, now_tz())
+    dt, text = await cached_reply("ramadan", user["city"], lambda: _ramadan_reply(user["city"]))
+    mode = choose_mode(dt, time.time())
 
     await stop_live(m.chat.id)
+    if m.chat.type != "private":
+        await db.subscribe_group(m.chat.id, user["city"], m.from_user.id)
 
-    await m.answer(
-        f"📍 {user['city']}\n"
-        f"🌙 Og‘iz yopish (Imsak): {t['imsak']}\n"
-        f"🍽 Og‘iz ochish (Maghrib): {t['maghrib']}\n\n"
-        f"⏳ Countdown boshlanmoqda…",
-        reply_markup=stop_menu()
-    )
+    await m.answer(text, reply_markup=stop_menu())
     await start_live(m.bot, m.chat.id, m.from_user.id, mode)
 
 
+# ===== Admin =====
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.0f} ms"
+
+
+def diag_report() -> str:
+    now = time.time()
+    lag = monitor.stats()
+    ages = sorted(now - s.started_at for s in LIVE_TASKS.values())
+    lines = [
+        f"🩺 Diag ({WORKER})",
+        f"⏱ Loop lag: hozir {_ms(lag['lag'])}, p50 {_ms(lag['p50'])}, p99 {_ms(lag['p99'])}, "
+        f"max {_ms(lag['max'])} (5 daq)",
+        f"🚧 Bloklash (>{_ms(monitor.threshold)}): {lag['blocks']} ta (5 daq)",
+    ]
+    if monitor.blocks:
+        last = monitor.blocks[-1]
+        lines.append(f"   oxirgisi {_ms(last['seconds'])}: {(last['stack'] or ['?'])[-1]}")
+    lines.append(
+        f"⏳ LIVE_TASKS: {len(ages)} ta"
+        + (f", eng eskisi {ages[-1] / 60:.0f} daq, mediana {ages[len(ages) // 2] / 60:.0f} daq" if ages else "")
+    )
+    lines.append("🐢 Eng sekin await'lar (10 daq):")
+    for seconds, _, name, labels in metrics.SLOWEST.top(600, 8):
+        lines.append(f"   {_ms(seconds)}  {name.removeprefix('ramadan_')} {' '.join(f'{k}={v}' for k, v in labels)}")
+    lines.append(
+        f"📡 Aladhan: {timings_health()['aladhan']['state']}, outbox navbati: {outbox.stats()['queue_depth']}, "
+        f"render navbati: {render_pool.waiting}"
+    )
+    lines.append("\n/diag profile [s] · /diag pstats [s] · /diag blocks")
+    return "\n".join(lines)
+
+
+@router.message(Command("diag"), F.from_user.id == cfg.admin_id)
+async def diag_cmd(m: Message):
+    """
+    /diag — holat; /diag profile 10 — collapsed stacks; /diag pstats 10 — cProfile; /diag blocks — stack'lar.
+    """
+    args = (m.text or "").split()[1:]
+    action = args[0] if args else ""
+    if action in ("profile", "pstats"):
+        try:
+            seconds = float(args[1]) if len(args) > 1 else 10.0
+        except ValueError:
+            seconds = 10.0
+        seconds = max(1.0, min(PROFILE_MAX, seconds))
+        await m.answer(f"🔬 {seconds:.0f} s profil olinmoqda…")
+        try:
+            data = await (sample_profile(seconds) if action == "profile" else pstats_profile(seconds))
+        except RuntimeError as e:
+            await m.answer(f"⚠️ {e}")
+            return
+        name = f"{action}-{WORKER}-{int(time.time())}.txt"
+        await m.answer_document(BufferedInputFile(data.encode(), filename=name))
+    elif action == "blocks":
+        name = f"blocks-{WORKER}-{int(time.time())}.txt"
+        await m.answer_document(BufferedInputFile(format_blocks(monitor).encode(), filename=name))
+    else:
+        await m.answer(diag_report())
+
+
 # ===== Menu =====
 
 @router.message(F.text == "🍽 Og‘iz ochish duosi")
 async def dua_ochish(m: Message):
-    await db.ensure(m.from_user.id)
+    await ensure_user(m.from_user.id)
     await m.answer(DUA_OCHISH, reply_markup=main_menu())
 
 
 @router.message(F.text == "🌙 Og‘iz yopish duosi")
 async def dua_yopish(m: Message):
-    await db.ensure(m.from_user.id)
+    await ensure_user(m.from_user.id)
     await m.answer(DUA_YOPISH, reply_markup=main_menu())
 
 
 @router.message(F.text == "📍 Shahar")
 async def city(m: Message):
-    await db.ensure(m.from_user.id)
+    await ensure_user(m.from_user.id)
     await m.answer("Shaharni tanlang:", reply_markup=city_inline())
 
 
+PENDING_CITY_TTL = 600
+
+
+def _pending_city_key(chat_id: int, user_id: int) -> str:
+    return f"pending_city:{chat_id}:{user_id}"
+
+
 @router.callback_query(F.data.startswith("city:"))
 async def city_cb(c: CallbackQuery):
-    await db.ensure(c.from_user.id)
+    await ensure_user(c.from_user.id)
     val = c.data.split(":", 1)[1]
 
     if val == "custom":
+        # guruhda faqat shu tugmani bosgan a'zoning keyingi xabari shahar deb olinadi
+        await shared.set_value(_pending_city_key(c.message.chat.id, c.from_user.id), "1", PENDING_CITY_TTL)
         await c.message.answer("✍️ Shahar nomini yozing (masalan: Tashkent yoki Samarkand).")
         await c.answer()
         return
 
     await db.set_city(c.from_user.id, val)
+    await replan_user(c.from_user.id)
     await c.message.answer(f"✅ Shahar saqlandi: {val}", reply_markup=main_menu())
     await c.answer("OK")
 
 
-@router.message(F.text.regexp(r"^[A-Za-zА-Яа-я‘’'` \-]{3,40}$"))
+@router.message(F.text.regexp(r"^[A-Za-zА-Яа-яЁёЎўҚқҒғҲҳ‘’'`ʻʼ \-]{3,40}$"))
 async def custom_city_text(m: Message):
-    await db.ensure(m.from_user.id)
-    city = m.text.strip()
-
-    try:
-        _ = await get_today(city, cfg.country)
-    except Exception:
+    # ✅ MUHIM: guruhdagi oddiy gaplar ("osh", "kitob") shahar bo‘lib qolmasin —
+    # guruhda faqat "✍️ O‘zim yozaman" bosilgandan keyin qabul qilinadi
+    private = m.chat.type == "private"
+    pending = _pending_city_key(m.chat.id, m.from_user.id)
+    pending_set = bool(await shared.get_value(pending))
+    if not private and not pending_set:
+        return
+    # tarmoqsiz — oddiy chat matnlari Aladhan'ga so‘rov yubormaydi
+    # ✅ vaqtlar cfg.tz'da hisoblanadi — boshqa soat mintaqasidagi shahar (Bishkek, Osh) 1 soat xato bo‘lardi
+    city = resolve_city(m.text, tz=cfg.tz)
+    if city is None:
+        # shahar kutilmayotgan bo‘lsa oddiy gaplarga jim turamiz — faqat shaharga o‘xshagan matnga maslahat
+        if pending_set or resolve_city(m.text, threshold=HINT_THRESHOLD) is not None:
+            await m.answer("❗ Bunday shahar topilmadi. Masalan: Toshkent, Samarqand, Andijon.")
         return
+    if pending_set:
+        await shared.set_value(pending, "", 1)
 
-    await db.set_city(m.from_user.id, city)
-    await m.answer(f"✅ Shahar saqlandi: {city}", reply_markup=main_menu())
+    await ensure_user(m.from_user.id)
+    await db.set_city(m.from_user.id, city.name)
+    await replan_user(m.from_user.id)
+    await m.answer(f"✅ Shahar saqlandi: {city.name}", reply_markup=main_menu())
 
 
-@router.message(F.text == "⏳ Bugungi vaqtlar")
-async def today_times(m: Message):
-    await db.ensure(m.from_user.id)
-    user = await db.get(m.from_user.id)
-    t = await get_today(user["city"], cfg.country)
-    await m.answer(
-        f"📍 {user['city']}\n\n"
+async def _today_reply(city: str) -> str:
+    t = await get_today(city, cfg.country)
+    return (
+        f"📍 {city}\n\n"
         f"🌙 Og‘iz yopish (Imsak): {t['imsak']}\n"
-        f"🍽 Og‘iz ochish (Maghrib): {t['maghrib']}\n",
-        reply_markup=main_menu()
+        f"🍽 Og‘iz ochish (Maghrib): {t['maghrib']}\n"
+        + (STALE_NOTE if t.get("stale") else "")
     )
 
 
+@router.message(F.text == "⏳ Bugungi vaqtlar", flags={"throttle": "today", "throttle_scope": "city"})
+async def today_times(m: Message):
+    await ensure_user(m.from_user.id)
+    user = await db.get(m.from_user.id)
+    try:
+        text = await cached_reply("today", user["city"], lambda: _today_reply(user["city"]))
+    except Exception:
+        await m.answer("⚠️ Vaqtlarni hozir olib bo‘lmadi. Birozdan keyin qayta urinib ko‘ring.", reply_markup=main_menu())
+        return
+    await m.answer(text, reply_markup=main_menu())
+
+
 @router.message(F.text == "🔔 Eslatma sozlash")
 async def remind(m: Message):
-    await db.ensure(m.from_user.id)
+    await ensure_user(m.from_user.id)
     user = await db.get(m.from_user.id)
-    TEMP_REM[m.from_user.id] = int(user["remind_before"])
-    await m.answer("Necha minut oldin eslatsin? (Default: 10)", reply_markup=reminder_inline(TEMP_REM[m.from_user.id]))
+    cur = int(user["remind_before"])
+    await set_temp_rem(m.from_user.id, cur)
+    await m.answer("Necha minut oldin eslatsin? (Default: 10)", reply_markup=reminder_inline(cur))
 
 
 @router.callback_query(F.data.startswith("rem:"))
 async def rem_cb(c: CallbackQuery):
-    await db.ensure(c.from_user.id)
-    cur = TEMP_REM.get(c.from_user.id, 10)
+    await ensure_user(c.from_user.id)
+    cur = await get_temp_rem(c.from_user.id, 10)
     act = c.data.split(":", 1)[1]
 
     if act == "+5":
@@ -254,11 +478,12 @@ async def rem_cb(c: CallbackQuery):
         cur = max(1, cur - 5)
     elif act == "save":
         await db.set_remind_before(c.from_user.id, cur)
+        await replan_user(c.from_user.id)
         await c.message.answer(f"✅ Saqlandi: {cur} minut oldin eslatadi.", reply_markup=main_menu())
         await c.answer("Saved")
         return
 
-    TEMP_REM[c.from_user.id] = cur
+    await set_temp_rem(c.from_user.id, cur)
     await c.message.edit_reply_markup(reply_markup=reminder_inline(cur))
     await c.answer()
 
@@ -266,18 +491,28 @@ async def rem_cb(c: CallbackQuery):
 @router.message(F.text == "🛑 To‘xtatish")
 async def stop_btn(m: Message):
     await stop_live(m.chat.id)
+    if m.chat.type != "private":
+        await db.unsubscribe_group(m.chat.id)
     await m.answer("🛑 To‘xtatildi.", reply_markup=main_menu())
 
 
+@router.my_chat_member(ChatMemberUpdatedFilter(LEAVE_TRANSITION))
+async def bot_removed(event: ChatMemberUpdated):
+    # bot guruhdan chiqarildi — countdown to‘xtaydi, obuna o‘chadi
+    await stop_live(event.chat.id)
+    if event.chat.type != "private":
+        await db.unsubscribe_group(event.chat.id)
+
+
 # ===== Ramadan calendar as PNG =====
 
-@router.message(F.text == "📆 Ramazon taqvimi")
+@router.message(F.text == "📆 Ramazon taqvimi", flags={"throttle": "calendar_menu"})
 async def ramadan_calendar_menu(m: Message):
-    await db.ensure(m.from_user.id)
+    await ensure_user(m.from_user.id)
     await m.answer("Qaysi viloyat/shahar uchun Ramazon taqvimi kerak?", reply_markup=calendar_city_inline())
 
 
-@router.callback_query(F.data.startswith("cal:"))
+@router.callback_query(F.data.startswith("cal:"), flags={"throttle": "calendar"})
 async def cal_cb(c: CallbackQuery):
     city = c.data.split(":", 1)[1]
     await c.answer()
@@ -287,20 +522,10 @@ async def cal_cb(c: CallbackQuery):
     rows = []  # (greg_date, imsak, magh)
 
     for year in years_to_try:
-        for month in range(1, 13):
-            try:
-                days = await get_calendar_by_city(month, year, city, cfg.country)
-            except Exception:
-                continue
-
-            for d in days:
-                hijri = d["date"]["hijri"]
-                if hijri["month"]["number"] == 9:  # Ramadan
-                    g_date = d["date"]["gregorian"]["date"]  # dd-mm-yyyy
-                    t = d["timings"]
-                    imsak = (t.get("Imsak") or "")[:5]
-                    magh = (t.get("Maghrib") or "")[:5]
-                    rows.append((g_date, imsak, magh))
+        try:
+            rows = await get_ramadan_rows(city, cfg.country, year)
+        except Exception:
+            continue
 
         if rows:
             break
@@ -309,82 +534,257 @@ async def cal_cb(c: CallbackQuery):
         await c.message.answer("Ramazon taqvimi topilmadi. Keyinroq urinib ko‘ring.", reply_markup=main_menu())
         return
 
-    title = f"{city} — Ramazon taqvimi"
-    png_io = render_ramadan_calendar_png(title=title, rows=rows)
+    caption = f"📍 {city}\n✅ Ramazon taqvimi"
+
+    # ✅ oldin yuklangan bo‘lsa — faqat file_id yuboramiz
+    file_id = calendars.file_id(city, year)
+    if file_id:
+        try:
+            await c.message.answer_photo(photo=file_id, caption=caption, reply_markup=main_menu())
+            return
+        except TelegramBadRequest:
+            calendars.forget_file_id(city, year)
 
-    file = BufferedInputFile(png_io.getvalue(), filename="ramazon_taqvim.png")
-    await c.message.answer_photo(
+    png = await calendars.get_png(city, year, rows)
+    file = BufferedInputFile(png, filename="ramazon_taqvim.png")
+    msg = await c.message.answer_photo(
         photo=file,
-        caption=f"📍 {city}\n✅ Ramazon taqvimi",
+        caption=caption,
         reply_markup=main_menu()
     )
+    if msg.photo:
+        calendars.set_file_id(city, year, msg.photo[-1].file_id)
+
+
+async def prerender_calendars():
+    """
+    Barcha keyboards.CITIES uchun taqvim PNG'ini oldindan chizib qo‘yadi,
+    shunda birinchi foydalanuvchi ham kutmaydi.
+    """
+    now = now_tz()
+    for city, _ in CITIES:
+        for year in (now.year, now.year + 1):
+            if calendars.cached_png(city, year) is not None:
+                break
+            try:
+                rows = await get_ramadan_rows(city, cfg.country, year)
+            except Exception:
+                continue
+            if rows:
+                await calendars.get_png(city, year, rows)
+                break
+
+
+async def prefetch_timings():
+    """
+    Foydalanuvchilar shaharlari uchun bugun/ertangi vaqtlarni keshga oldindan yuklaydi:
+    startup'da va har kecha yarim tundan oldin.
+    """
+    cities = await db.list_cities()
+    return await prefetch(cities, cfg.country, cfg.prefetch_days, cfg.prefetch_concurrency)
 
 
 # ===== Auto reminders (DM only) =====
 
-async def reminder_tick(bot: Bot):
+async def resolve_targets(city: str) -> tuple[float, float]:
+    dt = await get_day_times(city, cfg.country)
+    return dt.imsak_at, dt.maghrib_at
+
+
+async def due_rows(start: float, end: float):
+    # DM chat_id = user_id — faqat shu worker'ga tegishli foydalanuvchilar
+    async for row in db.iter_due(start, end, planner.day):
+        if owns(row["user_id"]):
+            yield row
+
+
+async def rebuild_plan():
     """
-    Avtomatik reminder faqat private (DM) chatda ishlaydi.
-    Group/kanalda /ramadan ishlating.
+    Har kuni (yarim tundan keyin) va startup'da: bugungi reminder vaqtlarini rejalashtiradi.
+    Fire vaqtlari shahar bo‘yicha bitta UPDATE bilan DB'ga yoziladi, planner ularni oynalab o‘qiydi.
     """
-    users = await db.list_enabled()
     now = now_tz()
-    today_str = dt_date.today().isoformat()
+    today = now.date().isoformat()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    until = pytz.timezone(cfg.tz).localize(midnight).timestamp()
+
+    cities = await db.list_cities()
+    resolved = await asyncio.gather(*(resolve_targets(c) for c in cities), return_exceptions=True)
+    for city, t in zip(cities, resolved):
+        # vaqti olinmagan shahar — bugun reminder yo‘q
+        await db.set_city_targets(city, *((None, None) if isinstance(t, BaseException) else t))
+    await planner.rebuild(today, until)
+    await shared.cleanup(today)
+
+
+async def replan_user(user_id: int) -> None:
+    """
+    Foydalanuvchining bugungi rejasi DB'ga yoziladi (qaysi worker bo‘lmasin).
+    Boshqa worker'ga tegishli bo‘lsa — o‘sha worker sync_leases'da heap'ini yangilaydi.
+    """
+    user = await db.get(user_id)
+    if owns(user_id):
+        targets = await planner.update_user(user, user_id)
+    else:
+        targets = None
+        if user and int(user.get("remind_enabled", 1)):
+            try:
+                targets = await resolve_targets(user["city"])
+            except Exception:
+                pass
+    if user is not None:
+        await db.set_user_targets(user_id, *(targets or (None, None)))
+    if not owns(user_id):
+        # egasi o‘qishidan oldin yozuv diskda bo‘lsin
+        await db.flush()
+        await shared.request_replan(user_id, f"w{ring.owner(user_id)}")
+
+
+# polling'da barcha update'lar bitta worker'ga keladi: boshqa worker'larning yangi
+# foydalanuvchilari ham rejalansin (process davomida bir marta tekshiriladi)
+CHECKED_USERS: set[int] = set()
+
+
+async def ensure_user(user_id: int) -> None:
+    await db.ensure(user_id)
+    # yangi foydalanuvchi — default sozlamalar bilan reminder rejasiga qo‘shiladi
+    if owns(user_id):
+        if not planner.knows(user_id):
+            await replan_user(user_id)
+    elif user_id not in CHECKED_USERS:
+        CHECKED_USERS.add(user_id)
+        user = await db.get(user_id)
+        if user and user.get("next_imsak_at") is None and user.get("next_maghrib_at") is None:
+            await replan_user(user_id)
 
-    # ✅ MUHIM: scheduler kechiksa ham ushlashi uchun
-    window = timedelta(minutes=2)
 
-    for u in users:
-        uid = u["user_id"]
+async def reminder_tick(bot: Bot):
+    """
+    Avtomatik reminder faqat private (DM) chatda ishlaydi.
+    Group/kanalda /ramadan ishlating.
+    Planner vaqti kelgan reminder'lar bo‘lganda chaqiradi.
+    """
+    now = time.time()
+    t0 = time.perf_counter()
+    await planner.fill(now)
+    due_list = planner.pop_due(now)
+    metrics.REMINDER_USERS.inc(len(due_list))
+
+    for due in due_list:
+        uid = due.user_id
         chat_id = uid  # DM chat_id = user_id
 
+        # chatda countdown ketyapti — target o‘tmaguncha keyinroq yana urinamiz
         if chat_id in LIVE_TASKS:
+            planner.reschedule(due, now + 10)
             continue
 
-        try:
-            t = await get_today(u["city"], cfg.country)
-            imsak_dt, magh_dt = build_targets(t)
-        except Exception:
+        # ✅ bir kunda bitta reminder — qaysi worker bo‘lmasin
+        if not await shared.claim_reminder(uid, due.kind, due.day, WORKER):
             continue
 
-        before = int(u["remind_before"])
-
-        imsak_remind = imsak_dt - timedelta(minutes=before)
-        mag_remind = magh_dt - timedelta(minutes=before)
+        try:
+            with priority(Priority.HIGH):
+                started = await start_live(bot, chat_id, uid, due.kind)
+        except Exception:
+            log.exception("reminder %s for %s failed", due.kind, uid)
+            metrics.REMINDER_FAILED.inc(reason="error")
+            started = False
+        else:
+            if not started:
+                metrics.REMINDER_FAILED.inc(reason="not_started")
 
-        # ✅ Imsak: remind vaqti kelgan/kechiksa ham (window ichida) start bo‘ladi
-        if imsak_remind - window <= now <= imsak_dt:
-            if (u.get("last_imsak_date") or "") != today_str:
-                try:
-                    await start_live(bot, chat_id, uid, "imsak")
-                    await db.mark_sent(uid, "imsak", today_str)
-                except Exception:
-                    pass
+        if not started:
+            # ✅ MUHIM: reminder yo‘qolmasin — claim bo‘shatiladi, target o‘tmaguncha har 10 s qayta urinamiz
+            await shared.release_claim(uid, due.kind, due.day, WORKER)
+            planner.reschedule(due, now + 10)
             continue
+        await db.mark_sent(uid, due.kind, due.day)
 
-        # ✅ Maghrib: remind vaqti kelgan/kechiksa ham (window ichida) start bo‘ladi
-        if mag_remind - window <= now <= magh_dt:
-            if (u.get("last_maghrib_date") or "") != today_str:
-                try:
-                    await start_live(bot, chat_id, uid, "maghrib")
-                    await db.mark_sent(uid, "maghrib", today_str)
-                except Exception:
-                    pass
+    metrics.REMINDER_TICK.observe(time.perf_counter() - t0)
 
 
 async def main():
+    set_timezone(cfg.tz)
+    set_backend(cfg.timings_backend)
+    set_store_dir(cfg.timings_store_dir)
     await db.init()
+    await shared.init()
+    await start_client(
+        limit=cfg.http_limit,
+        limit_per_host=cfg.http_limit_per_host,
+        keepalive_timeout=cfg.http_keepalive,
+        dns_ttl=cfg.http_dns_ttl,
+        retries=cfg.aladhan_retries,
+        breaker=CircuitBreaker(cfg.breaker_threshold, cfg.breaker_reset),
+    )
     bot = Bot(token=cfg.bot_token)
+    # ✅ barcha send/edit'lar rate limit + prioritet navbati orqali
+    bot.session.middleware(OutboxMiddleware(outbox))
+    # navbatdan keyin — faqat API chaqiruvining o‘zi o‘lchanadi
+    bot.session.middleware(metrics.TelegramMetricsMiddleware())
+    outbox.start()
+    render_pool.start()
+    monitor.start()
     dp = Dispatcher()
+    router.message.middleware(metrics.HandlerMetricsMiddleware())
+    router.callback_query.middleware(metrics.HandlerMetricsMiddleware())
+    router.message.middleware(throttle)
+    router.callback_query.middleware(throttle)
     dp.include_router(router)
 
+    metrics.LIVE_SESSIONS.set_function(lambda: len(LIVE_TASKS))
+    metrics.PROFILE_CACHE_HIT_RATE.set_function(lambda: db.profiles.stats()["hit_rate"])
+    metrics.LIVE_EDITS.set_function(
+        lambda: {k[len("edits_"):]: v for k, v in live.stats().items() if k.startswith("edits_")}, label="result"
+    )
+    metrics.OUTBOX_QUEUE.set_function(lambda: outbox.stats()["queue_depth"], label="priority")
+    metrics.OUTBOX_WAIT.set_function(
+        lambda: {"0.5": outbox.stats()["wait_p50"], "0.99": outbox.stats()["wait_p99"]}, label="quantile"
+    )
+    metrics_runner = None
+    if cfg.metrics_port:
+        metrics_runner = await metrics.start_server(cfg.metrics_host, cfg.metrics_port)
+
+    live.start(BotSender(bot))
+    await resume_live_sessions()
+
     scheduler = AsyncIOScheduler(timezone=cfg.tz)
 
-    # ✅ tezroq tekshiradi, o‘tib ketib qolmaydi
-    scheduler.add_job(reminder_tick, "interval", seconds=10, args=[bot])
+    # ✅ vaqtlar keshda tayyor bo‘lsin — rebuild_plan va handler'lar tarmoqni kutmaydi
+    await prefetch_timings()
+    scheduler.add_job(prefetch_timings, "cron", hour=23, minute=30)
+
+    # ✅ reminder'lar: kuniga bir marta reja, keyin faqat vaqti kelganda uyg‘onadi
+    await rebuild_plan()
+    planner.start(lambda: reminder_tick(bot))
+    scheduler.add_job(rebuild_plan, "cron", hour=0, minute=0, second=5)
+    scheduler.add_job(sync_leases, "interval", seconds=LEASE_TTL / 6)
+    # taqvim PNG'lari: startup'da va har kuni tunda
+    scheduler.add_job(prerender_calendars, "cron", hour=3, minute=0)
+    scheduler.add_job(prerender_calendars, "date")
     scheduler.start()
 
-    await dp.start_polling(bot)
+    try:
+        if cfg.bot_mode == "webhook":
+            await run_webhook(dp, bot, cfg, health=timings_health)
+        elif cfg.worker_id == 0:
+            await dp.start_polling(bot)
+        else:
+            # polling'da update'larni faqat worker 0 oladi; qolganlari reminder/countdown
+            await asyncio.Event().wait()
+    finally:
+        scheduler.shutdown(wait=False)
+        await live.close()
+        await planner.close()
+        await outbox.close()
+        await render_pool.close()
+        await monitor.close()
+        await close_client()
+        await shared.close()
+        await db.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 
 if __name__ == "__main__":
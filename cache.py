@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Process-wide async cache: har bir kalit o‘z muddati (expires_at, epoch sekund) bilan.
+    Bir kalit uchun bir vaqtda kelgan miss'lar bitta loader chaqiruviga birlashadi (single-flight).
+    """
+
+    def __init__(self, max_items: int = 10_000):
+        self.max_items = max_items
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= time.time():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any, expires_at: float) -> None:
+        if len(self._data) >= self.max_items and key not in self._data:
+            self._evict()
+        self._data[key] = (expires_at, value)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def _evict(self) -> None:
+        now = time.time()
+        for k in [k for k, (exp, _) in self._data.items() if exp <= now]:
+            del self._data[k]
+        # hammasi hali tirik bo‘lsa — eng eskisini chiqaramiz
+        while len(self._data) >= self.max_items:
+            self._data.pop(next(iter(self._data)))
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        expires_at: Callable[[], float] | float,
+    ) -> Any:
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.coalesced += 1
+            return await asyncio.shield(fut)
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            # hech kim kutmayotgan bo‘lsa "exception was never retrieved" chiqmasin
+            fut.exception()
+            raise
+        else:
+            exp = expires_at() if callable(expires_at) else expires_at
+            self.set(key, value, exp)
+            fut.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class LRUCache:
+    """
+    Hajmi cheklangan sync LRU (user_id -> profil kabi kichik yozuvlar uchun).
+    ttl > 0 bo‘lsa yozuv shuncha sekunddan keyin eskiradi (bir nechta worker bir-birining
+    yozuvini ko‘rmaydi — eskirish vaqti shu farqni cheklaydi).
+    """
+
+    def __init__(self, max_items: int = 50_000, ttl: float = 0.0):
+        self.max_items = max(1, max_items)
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._peek(key) is not None
+
+    def _peek(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at and expires_at <= time.time():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self._peek(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.time() + self.ttl if self.ttl > 0 else 0.0, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_items:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def update(self, key: Hashable, **fields) -> None:
+        """Keshda bor dict yozuvni joyida yangilaydi (yo‘q bo‘lsa — hech narsa)."""
+        value = self._peek(key)
+        if value is not None:
+            value.update(fields)
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """get() kabi, lekin LRU tartibi va hit/miss statistikasiga ta'sir qilmaydi."""
+        return self._peek(key)
+
+    def values(self) -> List[Any]:
+        """Eskirmagan yozuvlar (nusxa ro‘yxat — aylanish paytida kesh o‘zgarsa ham xavfsiz)."""
+        now = time.time()
+        return [v for exp, v in self._data.values() if not exp or exp > now]
+
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_items": self.max_items,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from calendar_image import LAYOUT_VERSION, PNG_MODES
+from render_pool import RenderPool
+
+Key = Tuple[str, int, str]  # (city, year, "<layout version><png mode>")
+
+
+def _slug(s: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", s.lower()).strip("_") or "city"
+
+
+class CalendarCache:
+    """
+    Ramazon taqvimi PNG'lari uchun kesh: xotira + disk.
+    Telegram'ga bir marta yuklangandan keyin file_id saqlanadi va qayta yuklanmaydi.
+    """
+
+    def __init__(
+        self,
+        directory: str = "cache/calendars",
+        pool: Optional[RenderPool] = None,
+        png_mode: str = "palette",
+    ):
+        if png_mode not in PNG_MODES:
+            raise ValueError(f"Noma'lum PNG mode: {png_mode}")
+        self.dir = directory
+        self.pool = pool or RenderPool(mode="thread")
+        self.png_mode = png_mode
+        self._png: Dict[Key, bytes] = {}
+        self._rendering: Dict[Key, asyncio.Future] = {}
+        self._file_ids: Dict[str, str] = {}
+        self._ids_path = os.path.join(self.dir, "file_ids.json")
+        self._load_file_ids()
+
+    def key(self, city: str, year: int) -> Key:
+        # palette/rgb almashtirilsa eski fayl va file_id ishlatilmaydi
+        return (city, year, f"{LAYOUT_VERSION}{self.png_mode[0]}")
+
+    def _path(self, key: Key) -> str:
+        city, year, ver = key
+        return os.path.join(self.dir, f"{_slug(city)}_{year}_v{ver}.png")
+
+    @staticmethod
+    def _id_key(key: Key) -> str:
+        city, year, ver = key
+        return f"{city}|{year}|{ver}"
+
+    def _load_file_ids(self) -> None:
+        try:
+            with open(self._ids_path, encoding="utf-8") as f:
+                self._file_ids = json.load(f)
+        except (OSError, ValueError):
+            self._file_ids = {}
+
+    def _save_file_ids(self) -> None:
+        os.makedirs(self.dir, exist_ok=True)
+        tmp = self._ids_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._file_ids, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self._ids_path)
+
+    # ===== PNG =====
+
+    def cached_png(self, city: str, year: int) -> Optional[bytes]:
+        key = self.key(city, year)
+        data = self._png.get(key)
+        if data is not None:
+            return data
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        self._png[key] = data
+        return data
+
+    def store_png(self, city: str, year: int, data: bytes) -> None:
+        key = self.key(city, year)
+        self._png[key] = data
+        os.makedirs(self.dir, exist_ok=True)
+        path = self._path(key)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    async def get_png(self, city: str, year: int, rows: List[Tuple[str, str, str]]) -> bytes:
+        data = self.cached_png(city, year)
+        if data is not None:
+            return data
+
+        # bir shahar/yil uchun bir vaqtda bitta render — qolganlar natijasini kutadi
+        key = self.key(city, year)
+        fut = self._rendering.get(key)
+        if fut is not None:
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._rendering[key] = fut
+        try:
+            data = await self.pool.render(f"{city} — Ramazon taqvimi", rows, self.png_mode)
+            self.store_png(city, year, data)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                fut.cancel()
+            else:
+                fut.set_exception(e)
+                fut.exception()
+            raise
+        else:
+            fut.set_result(data)
+            return data
+        finally:
+            self._rendering.pop(key, None)
+
+    # ===== Telegram file_id =====
+
+    def file_id(self, city: str, year: int) -> Optional[str]:
+        return self._file_ids.get(self._id_key(self.key(city, year)))
+
+    def set_file_id(self, city: str, year: int, file_id: str) -> None:
+        self._file_ids[self._id_key(self.key(city, year))] = file_id
+        self._save_file_ids()
+
+    def forget_file_id(self, city: str, year: int) -> None:
+        if self._file_ids.pop(self._id_key(self.key(city, year)), None) is not None:
+            self._save_file_ids()
@@ -1,10 +1,26 @@
 from __future__ import annotations
+from functools import lru_cache
 from typing import List, Tuple
 from io import BytesIO
 
 from PIL import Image, ImageDraw, ImageFont
 
+# Jadval ko‘rinishi o‘zgarsa oshiring — eski keshlangan PNG/file_id'lar ishlatilmaydi
+LAYOUT_VERSION = 2
 
+# "palette" — 16 rangli (4-bit) PNG, Telegram'ga ~5 barobar kichik yuklanadi; "rgb" — oddiy 24-bit
+PNG_MODES = ("palette", "rgb")
+
+# Layout
+PADDING = 24
+LINE_H = 30
+HEADER_H = 110
+COL_W = [70, 170, 120, 140]  # Kun | Sana | Imsak | Maghrib
+HEADERS = ["Kun", "Sana", "Imsak", "Maghrib"]
+TABLE_W = sum(COL_W)
+
+
+@lru_cache(maxsize=None)
 def _get_font(size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
     # Railway (linux)da default font bo‘lmasligi mumkin, shuning uchun fallback bilan
     try:
@@ -13,76 +29,115 @@ def _get_font(size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
         return ImageFont.load_default()
 
 
-def render_ramadan_calendar_png(
-    title: str,
-    rows: List[Tuple[str, str, str]],  # (date, imsak, maghrib)
-) -> BytesIO:
+@lru_cache(maxsize=8)
+def _template(n_rows: int) -> Image.Image:
     """
-    rows: list of (dd-mm-yyyy, HH:MM, HH:MM)
-    return: BytesIO PNG
+    Shahar/yilga bog‘liq bo‘lmagan hamma narsa: subtitle, header, zebra, chiziqlar va "Kun" ustuni.
+    Ramazon 29 yoki 30 kun — amalda 2 ta shablon. Faqat nusxasi ustiga chiziladi.
     """
-    # Layout
-    padding = 24
-    line_h = 30
-    header_h = 110
-    col_w = [70, 170, 120, 140]  # Kun | Sana | Imsak | Maghrib
-    table_w = sum(col_w)
-    table_h = line_h * (len(rows) + 1)  # + header row
-    w = table_w + padding * 2
-    h = header_h + table_h + padding
-
-    img = Image.new("RGB", (w, h), "white")
-    draw = ImageDraw.Draw(img)
+    table_h = LINE_H * (n_rows + 1)  # + header row
+    w = TABLE_W + PADDING * 2
+    h = HEADER_H + table_h + PADDING
 
-    font_title = _get_font(28)
-    font_small = _get_font(18)
-    font_cell = _get_font(18)
-    font_head = _get_font(18)
+    # hamma narsa qora/kulrang — grayscale yetarli (RGB'dan 3 barobar kam xotira)
+    img = Image.new("L", (w, h), "white")
+    draw = ImageDraw.Draw(img)
+    font = _get_font(18)
 
-    # Title
-    draw.text((padding, 20), title, font=font_title, fill="black")
-    draw.text((padding, 60), "Ramazon taqvimi (Imsak / Maghrib)", font=font_small, fill="black")
+    draw.text((PADDING, 60), "Ramazon taqvimi (Imsak / Maghrib)", font=font, fill="black")
 
-    # Table position
-    x0 = padding
-    y0 = header_h
+    x0 = PADDING
+    y0 = HEADER_H
 
     # Header row background
-    draw.rectangle([x0, y0, x0 + table_w, y0 + line_h], outline="black", fill="#f2f2f2")
+    draw.rectangle([x0, y0, x0 + TABLE_W, y0 + LINE_H], outline="black", fill="#f2f2f2")
 
-    headers = ["Kun", "Sana", "Imsak", "Maghrib"]
     x = x0
-    for i, text in enumerate(headers):
-        draw.text((x + 10, y0 + 6), text, font=font_head, fill="black")
-        x += col_w[i]
+    for i, text in enumerate(HEADERS):
+        draw.text((x + 10, y0 + 6), text, font=font, fill="black")
+        x += COL_W[i]
 
-    # Rows
-    for idx, (date_str, imsak, magh) in enumerate(rows, start=1):
-        y = y0 + line_h * idx
+    for idx in range(1, n_rows + 1):
+        y = y0 + LINE_H * idx
         # zebra
         if idx % 2 == 0:
-            draw.rectangle([x0, y, x0 + table_w, y + line_h], fill="#fbfbfb")
-
-        values = [f"{idx:02d}", date_str, imsak, magh]
-
-        x = x0
-        for i, val in enumerate(values):
-            draw.text((x + 10, y + 6), val, font=font_cell, fill="black")
-            x += col_w[i]
-
+            draw.rectangle([x0, y, x0 + TABLE_W, y + LINE_H], fill="#fbfbfb")
+        draw.text((x0 + 10, y + 6), f"{idx:02d}", font=font, fill="black")
         # row line
-        draw.line([x0, y, x0 + table_w, y], fill="black")
+        draw.line([x0, y, x0 + TABLE_W, y], fill="black")
 
     # Borders + vertical lines
-    draw.rectangle([x0, y0, x0 + table_w, y0 + table_h], outline="black")
+    draw.rectangle([x0, y0, x0 + TABLE_W, y0 + table_h], outline="black")
     x = x0
-    for wcol in col_w[:-1]:
+    for wcol in COL_W[:-1]:
         x += wcol
         draw.line([x, y0, x, y0 + table_h], fill="black")
+    return img
+
+
+@lru_cache(maxsize=4096)
+def _text_mask(text: str, size: int) -> Tuple[Image.Image, Tuple[int, int]]:
+    """
+    Matnning antialias maskasi va siljishi. Sana/vaqt qiymatlari shaharlar orasida ko‘p takrorlanadi —
+    har safar glyph'larni qayta rasterlash o‘rniga tayyor maska qo‘yiladi (draw.text bilan piksel-aniq bir xil).
+    """
+    font = _get_font(size)
+    left, top, right, bottom = font.getbbox(text)
+    mask = Image.new("L", (max(1, right - left), max(1, bottom - top)), 0)
+    ImageDraw.Draw(mask).text((-left, -top), text, font=font, fill=255)
+    return mask, (left, top)
+
+
+def _draw_text(img: Image.Image, xy: Tuple[int, int], text: str, size: int) -> None:
+    mask, (dx, dy) = _text_mask(text, size)
+    img.paste(0, (xy[0] + dx, xy[1] + dy), mask)
+
+
+# 256 kulrang -> 16 daraja (palette PNG uchun): 14 ta tekis daraja + header/zebra fonlari aynan saqlanadi
+_GRAY16 = sorted({round(i * 255 / 13) for i in range(14)} | {0xF2, 0xFB})
+_GRAY16_LUT = [min(range(len(_GRAY16)), key=lambda i: abs(_GRAY16[i] - v)) for v in range(256)]
+_GRAY16_PALETTE = [c for g in _GRAY16 for c in (g, g, g)]
+
+
+def render_ramadan_calendar_png(
+    title: str,
+    rows: List[Tuple[str, str, str]],  # (date, imsak, maghrib)
+    png_mode: str = "palette",
+) -> BytesIO:
+    """
+    rows: list of (dd-mm-yyyy, HH:MM, HH:MM)
+    return: BytesIO PNG
+    """
+    if png_mode not in PNG_MODES:
+        raise ValueError(f"Noma'lum PNG mode: {png_mode}")
+
+    img = _template(len(rows)).copy()
+
+    # Title
+    _draw_text(img, (PADDING, 20), title, 28)
+
+    # Rows — faqat o‘zgaradigan ustunlar (Sana | Imsak | Maghrib)
+    xs = [PADDING + sum(COL_W[:i]) + 10 for i in range(1, len(COL_W))]
+    for idx, values in enumerate(rows, start=1):
+        y = HEADER_H + LINE_H * idx + 6
+        for x, val in zip(xs, values):
+            _draw_text(img, (x, y), val, 18)
 
     # Output
     bio = BytesIO()
     bio.name = "ramazon_taqvim.png"
-    img.save(bio, format="PNG")
+    if png_mode == "palette":
+        # antialias uchun 16 kulrang daraja yetarli. zlib 6: ~15 KB / 5 ms; 9 esa ~15% kichik, lekin 6 barobar sekin
+        pal = img.point(_GRAY16_LUT)
+        pal.putpalette(_GRAY16_PALETTE)
+        pal.save(bio, format="PNG", bits=4, compress_level=6)
+    else:
+        img.convert("RGB").save(bio, format="PNG")
     bio.seek(0)
     return bio
+
+
+def render_png_bytes(title: str, rows: List[Tuple[str, str, str]], png_mode: str = "palette") -> bytes:
+    # render_pool worker'ida ishlaydi: natija pickle qilinadigan bytes.
+    # Shu modul faqat Pillow'ni import qiladi — child process tez ko‘tariladi
+    return render_ramadan_calendar_png(title=title, rows=rows, png_mode=png_mode).getvalue()
@@ -0,0 +1,226 @@
+"""
+Offline shaharlar ro‘yxati (O‘zbekiston + Markaziy Osiyo): koordinatalar, davlat kodi va
+lotin/kirill/ruscha yozilishlar. Foydalanuvchi yozgan shahar nomi tarmoqsiz aniqlanadi:
+
+    resolve("Samarqand")  -> City("Samarkand", ...)
+    resolve("самарканд")  -> City("Samarkand", ...)
+    resolve("Samarkan")   -> City("Samarkand", ...)   # trigram fuzzy
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+import pytz
+
+
+@dataclass(frozen=True)
+class City:
+    name: str  # kanonik nom — DB'ga shu yoziladi va Aladhan'ga shu yuboriladi
+    lat: float
+    lng: float
+    country: str
+    tz: str  # IANA; Aladhan vaqtlarni shu mintaqada qaytaradi
+
+
+# (kanonik nom, lat, lng, davlat, boshqa yozilishlar)
+# keyboards.CITIES dagi barcha shaharlar shu yerda bo‘lishi kerak
+_DATA: List[Tuple[str, float, float, str, Tuple[str, ...]]] = [
+    # --- O‘zbekiston: viloyat markazlari ---
+    ("Tashkent", 41.2995, 69.2401, "UZ", ("Toshkent", "Тошкент", "Ташкент")),
+    ("Samarkand", 39.6542, 66.9597, "UZ", ("Samarqand", "Самарқанд", "Самарканд")),
+    ("Bukhara", 39.7747, 64.4286, "UZ", ("Buxoro", "Бухоро", "Бухара")),
+    ("Andijan", 40.7821, 72.3442, "UZ", ("Andijon", "Андижон", "Андижан")),
+    ("Fergana", 40.3842, 71.7843, "UZ", ("Farg‘ona", "Fargona", "Фарғона", "Фергана")),
+    ("Namangan", 40.9983, 71.6726, "UZ", ("Наманган",)),
+    ("Jizzakh", 40.1158, 67.8422, "UZ", ("Jizzax", "Jizzak", "Жиззах", "Джизак")),
+    ("Navoi", 40.0844, 65.3792, "UZ", ("Navoiy", "Навоий", "Навои")),
+    ("Gulistan", 40.4897, 68.7842, "UZ", ("Guliston", "Гулистон", "Гулистан", "Sirdaryo", "Сирдарё")),
+    ("Karshi", 38.8606, 65.7891, "UZ", ("Qarshi", "Қарши", "Карши", "Qashqadaryo")),
+    ("Termez", 37.2242, 67.2783, "UZ", ("Termiz", "Термиз", "Термез", "Surxondaryo")),
+    ("Urgench", 41.5500, 60.6333, "UZ", ("Urganch", "Урганч", "Ургенч", "Xorazm", "Khorezm")),
+    ("Nukus", 42.4531, 59.6103, "UZ", ("Нукус", "Qoraqalpog‘iston", "Karakalpakstan")),
+    ("Nurafshon", 41.0433, 69.3606, "UZ", ("Nurafshan", "Нурафшон", "Toytepa", "Тўйтепа")),
+    # --- O‘zbekiston: boshqa shaharlar ---
+    ("Kokand", 40.5286, 70.9425, "UZ", ("Qo‘qon", "Qoqon", "Қўқон", "Коканд")),
+    ("Margilan", 40.4717, 71.7247, "UZ", ("Marg‘ilon", "Margilon", "Марғилон", "Маргилан")),
+    ("Quvasoy", 40.3000, 71.9800, "UZ", ("Kuvasay", "Қувасой", "Кувасай")),
+    ("Rishton", 40.3567, 71.2847, "UZ", ("Rishtan", "Риштон", "Риштан")),
+    ("Asaka", 40.6414, 72.2389, "UZ", ("Асака",)),
+    ("Chust", 41.0036, 71.2372, "UZ", ("Чуст",)),
+    ("Chirchiq", 41.4689, 69.5822, "UZ", ("Chirchik", "Чирчиқ", "Чирчик")),
+    ("Angren", 41.0167, 70.1436, "UZ", ("Ангрен",)),
+    ("Olmaliq", 40.8447, 69.5981, "UZ", ("Almalyk", "Олмалиқ", "Алмалык")),
+    ("Bekobod", 40.2208, 69.2697, "UZ", ("Bekabad", "Бекобод", "Бекабад")),
+    ("Yangiyul", 41.1122, 69.0472, "UZ", ("Yangiyo‘l", "Янгийўл", "Янгиюль")),
+    ("Yangiyer", 40.2750, 68.8225, "UZ", ("Янгиер",)),
+    ("Shahrisabz", 39.0578, 66.8342, "UZ", ("Шаҳрисабз", "Шахрисабз")),
+    ("Kitob", 39.1206, 66.8856, "UZ", ("Kitab", "Китоб", "Китаб")),
+    ("Guzar", 38.6208, 66.2481, "UZ", ("G‘uzor", "Ғузор", "Гузар")),
+    ("Urgut", 39.4022, 67.2431, "UZ", ("Ургут",)),
+    ("Kattakurgan", 39.8989, 66.2561, "UZ", ("Kattaqo‘rg‘on", "Каттақўрғон", "Каттакурган")),
+    ("Kogon", 39.7225, 64.5517, "UZ", ("Kagan", "Когон", "Каган")),
+    ("Gijduvon", 40.1000, 64.6833, "UZ", ("G‘ijduvon", "Ғиждувон", "Гиждуван")),
+    ("Zarafshan", 41.5667, 64.2000, "UZ", ("Zarafshon", "Зарафшон", "Зарафшан")),
+    ("Uchkuduk", 42.1567, 63.5556, "UZ", ("Uchquduq", "Учқудуқ", "Учкудук")),
+    ("Khiva", 41.3783, 60.3639, "UZ", ("Xiva", "Хива")),
+    ("Denau", 38.2667, 67.9000, "UZ", ("Denov", "Денов", "Денау")),
+    ("Sherabad", 37.6667, 67.0000, "UZ", ("Sherobod", "Шеробод", "Шерабад")),
+    ("Baysun", 38.2031, 67.2000, "UZ", ("Boysun", "Бойсун", "Байсун")),
+    ("Beruniy", 41.6911, 60.7525, "UZ", ("Beruni", "Беруний", "Беруни")),
+    ("Turtkul", 41.5500, 61.0000, "UZ", ("To‘rtko‘l", "Тўрткўл", "Турткуль")),
+    ("Khodjeyli", 42.4031, 59.4536, "UZ", ("Xo‘jayli", "Хўжайли", "Ходжейли")),
+    ("Muynak", 43.7683, 59.0214, "UZ", ("Mo‘ynoq", "Мўйноқ", "Муйнак")),
+    # --- Qozog‘iston ---
+    ("Almaty", 43.2389, 76.8897, "KZ", ("Olmaota", "Алматы", "Алма-Ата")),
+    ("Astana", 51.1694, 71.4491, "KZ", ("Nur-Sultan", "Астана", "Нур-Султан")),
+    ("Shymkent", 42.3417, 69.5901, "KZ", ("Chimkent", "Шымкент", "Чимкент")),
+    ("Turkistan", 43.2973, 68.2517, "KZ", ("Turkestan", "Turkiston", "Туркестан", "Туркистон")),
+    ("Taraz", 42.9000, 71.3667, "KZ", ("Тараз", "Jambyl")),
+    ("Kyzylorda", 44.8528, 65.5092, "KZ", ("Qyzylorda", "Qizilo‘rda", "Кызылорда")),
+    ("Aktobe", 50.2839, 57.1669, "KZ", ("Aqtobe", "Актобе")),
+    ("Atyrau", 47.1167, 51.8833, "KZ", ("Атырау",)),
+    # --- Qirg‘iziston ---
+    ("Bishkek", 42.8746, 74.5698, "KG", ("Бишкек", "Frunze")),
+    ("Osh", 40.5283, 72.7985, "KG", ("O‘sh", "Ош")),
+    ("Jalal-Abad", 40.9333, 73.0000, "KG", ("Jalalabad", "Jalolobod", "Жалал-Абад")),
+    ("Batken", 40.0625, 70.8194, "KG", ("Баткен",)),
+    ("Karakol", 42.4907, 78.3936, "KG", ("Каракол",)),
+    # --- Tojikiston ---
+    ("Dushanbe", 38.5598, 68.7870, "TJ", ("Душанбе",)),
+    ("Khujand", 40.2826, 69.6222, "TJ", ("Xo‘jand", "Khodjent", "Худжанд", "Хужанд")),
+    ("Kulob", 37.9146, 69.7845, "TJ", ("Kulyab", "Куляб", "Кўлоб")),
+    ("Bokhtar", 37.8364, 68.7803, "TJ", ("Kurgan-Tyube", "Бохтар")),
+    ("Istaravshan", 39.9108, 69.0064, "TJ", ("Ura-Tyube", "Истаравшан")),
+    # --- Turkmaniston ---
+    ("Ashgabat", 37.9601, 58.3261, "TM", ("Ashkhabad", "Ashxobod", "Ашхабад")),
+    ("Turkmenabat", 39.0733, 63.5786, "TM", ("Chardzhou", "Chorjo‘y", "Туркменабад")),
+    ("Dashoguz", 41.8363, 59.9666, "TM", ("Tashauz", "Дашогуз")),
+    ("Mary", 37.6000, 61.8333, "TM", ("Marv", "Мары")),
+    ("Balkanabat", 39.5108, 54.3671, "TM", ("Балканабад",)),
+]
+
+# hozircha har davlat bitta mintaqada (Qozog‘iston 2024-03 dan beri butunlay UTC+5)
+_COUNTRY_TZ = {
+    "UZ": "Asia/Tashkent",
+    "KZ": "Asia/Almaty",
+    "KG": "Asia/Bishkek",
+    "TJ": "Asia/Dushanbe",
+    "TM": "Asia/Ashgabat",
+}
+
+CITIES: Dict[str, City] = {name: City(name, lat, lng, cc, _COUNTRY_TZ[cc]) for name, lat, lng, cc, _ in _DATA}
+
+# eski API: city -> (latitude, longitude)
+COORDS: Dict[str, Tuple[float, float]] = {c.name: (c.lat, c.lng) for c in CITIES.values()}
+
+# kirill -> lotin (o‘zbek + rus harflari)
+_TRANSLIT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo", "ж": "j", "з": "z",
+    "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "x", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh",
+    "ъ": "", "ы": "i", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+    "ў": "o", "қ": "k", "ғ": "g", "ҳ": "h",
+}
+_DROP = set(" -‘’'`ʻʼ.")
+# talaffuzi bir xil yozilishlar (kh/x, q/k, dzh/j ...) bitta shaklga keltiriladi
+_FOLD = (("dzh", "j"), ("dj", "j"), ("zh", "j"), ("kh", "x"), ("q", "k"))
+
+FUZZY_THRESHOLD = 0.6
+# shundan past — matn shaharga o‘xshamaydi (oddiy gap), "topilmadi" deb javob berilmaydi
+HINT_THRESHOLD = 0.4
+
+
+def normalize(text: str) -> str:
+    s = "".join(_TRANSLIT.get(ch, ch) for ch in (text or "").strip().casefold() if ch not in _DROP)
+    for a, b in _FOLD:
+        s = s.replace(a, b)
+    return s
+
+
+def _trigrams(s: str) -> Set[str]:
+    s = f"${s}$"
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class _Index:
+    """normalize(alias) -> kanonik nom (aniq) va trigram -> alias'lar (fuzzy)."""
+
+    def __init__(self, data):
+        self.exact: Dict[str, str] = {}
+        self.grams: Dict[str, Set[str]] = {}
+        self.alias_grams: Dict[str, Set[str]] = {}
+        for name, _, _, _, aliases in data:
+            for a in (name,) + aliases:
+                key = normalize(a)
+                self.exact.setdefault(key, name)
+                if key not in self.alias_grams:
+                    g = _trigrams(key)
+                    self.alias_grams[key] = g
+                    for t in g:
+                        self.grams.setdefault(t, set()).add(key)
+
+    def fuzzy(self, key: str, threshold: float) -> Optional[str]:
+        g = _trigrams(key)
+        shared: Dict[str, int] = {}
+        for t in g:
+            for alias in self.grams.get(t, ()):
+                shared[alias] = shared.get(alias, 0) + 1
+        best, best_score = None, 0.0
+        for alias, n in shared.items():
+            # Dice koeffitsienti
+            score = 2 * n / (len(g) + len(self.alias_grams[alias]))
+            if score > best_score:
+                best, best_score = alias, score
+        if best is None or best_score < threshold:
+            return None
+        return self.exact[best]
+
+
+_INDEX = _Index(_DATA)
+
+
+def lookup(name: str) -> Optional[City]:
+    """Aniq moslik (har qanday yozilishda, katta-kichik harf farqsiz)."""
+    canonical = _INDEX.exact.get(normalize(name))
+    return CITIES[canonical] if canonical else None
+
+
+@lru_cache(maxsize=64)
+def _offset(tz: str, hour: int):
+    return datetime.now(pytz.timezone(tz)).utcoffset()
+
+
+def same_clock(a: str, b: str) -> bool:
+    """Ikki mintaqa hozir bir xil UTC offset'dami (Asia/Samarkand == Asia/Tashkent)."""
+    hour = int(datetime.now().timestamp() // 3600)
+    return a == b or _offset(a, hour) == _offset(b, hour)
+
+
+def resolve(text: str, threshold: float = FUZZY_THRESHOLD, tz: Optional[str] = None) -> Optional[City]:
+    """
+    Foydalanuvchi yozgan nom: avval aniq, keyin trigram bo‘yicha eng yaqin shahar.
+    tz berilsa — faqat shu soat mintaqasidagi shaharlar (bot vaqtlarni cfg.tz'da hisoblaydi).
+    """
+    key = normalize(text)
+    if len(key) < 2:
+        return None
+    canonical = _INDEX.exact.get(key) or _INDEX.fuzzy(key, threshold)
+    if not canonical:
+        return None
+    city = CITIES[canonical]
+    if tz is not None and not same_clock(city.tz, tz):
+        return None
+    return city
+
+
+def coords(city: str) -> Optional[Tuple[float, float]]:
+    c = lookup(city)
+    return (c.lat, c.lng) if c else None
+
+
+def country(city: str) -> Optional[str]:
+    c = lookup(city)
+    return c.country if c else None
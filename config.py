@@ -10,6 +10,85 @@ class Config:
     admin_id: int
     tz: str
     country: str
+    # Aladhan HTTP pool
+    http_limit: int = 100
+    http_limit_per_host: int = 20
+    http_keepalive: float = 60.0
+    http_dns_ttl: int = 300
+    # Aladhan: qayta urinishlar va circuit breaker
+    aladhan_retries: int = 2
+    breaker_threshold: int = 5
+    breaker_reset: float = 30.0
+    # "api" yoki "local" (astro.py)
+    timings_backend: str = "api"
+    calendar_cache_dir: str = "cache/calendars"
+    # yillik mmap vaqtlar jadvallari (timings_store.py)
+    timings_store_dir: str = "cache/timings"
+    # taqvim render'i: "process" (default) yoki "thread"; bir vaqtda nechta render
+    render_mode: str = "process"
+    render_workers: int = 2
+    render_concurrency: int = 4
+    # "palette" — 4-bit PNG (kichik upload) yoki "rgb"
+    calendar_png_mode: str = "palette"
+    # har kecha (va startup'da) users'dagi shaharlar uchun necha kunlik vaqt oldindan olinadi
+    prefetch_days: int = 2
+    prefetch_concurrency: int = 4
+    # reminder planner DB'dan shuncha soniyalik oynani heap'ga oladi
+    plan_window: float = 3600.0
+    # menyu debounce: bir foydalanuvchi / bir guruh chat uchun oyna, javob matni keshi (sekund)
+    throttle_window: float = 2.0
+    chat_throttle_window: float = 5.0
+    reply_cache_ttl: float = 30.0
+    # event loop shundan uzoq bloklansa /diag va log'da stack bilan qayd etiladi (sekund)
+    block_threshold: float = 0.1
+    # users profil keshi (LRU): maksimal yozuvlar soni va eskirish (0 — cheksiz)
+    profile_cache_size: int = 50_000
+    profile_cache_ttl: float = 0.0
+    # live countdown edit oralig‘i: "qolgan_sekund:interval,...,*:uzoqda_interval"
+    live_cadence: str = "60:1,300:10,*:60"
+    # restart'dan keyin tiklangan sessiyalar orasidagi interval (sekund)
+    live_resume_stagger: float = 0.05
+    # Telegram chiquvchi limitlar (xabar/sekund)
+    tg_global_rate: float = 30.0
+    tg_private_rate: float = 1.0
+    tg_group_rate: float = 20 / 60
+    # "polling" (default, lokal) yoki "webhook"
+    bot_mode: str = "polling"
+    webhook_base_url: str = ""
+    webhook_path: str = "/webhook"
+    webhook_secret: str = ""
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    webhook_concurrency: int = 100
+    # shuncha update navbatda tursa yangilariga 503 — Telegram keyinroq qayta yuboradi
+    webhook_backlog: int = 1000
+    # ko‘p worker: WORKER_ID 0..WORKER_COUNT-1
+    worker_id: int = 0
+    worker_count: int = 1
+    shared_state_url: str = "sqlite:///data.sqlite3"
+    # Prometheus /metrics (0 — o‘chirilgan)
+    metrics_host: str = "0.0.0.0"
+    metrics_port: int = 0
+
+
+def _int_env(name: str, default: int) -> int:
+    raw = (os.getenv(name) or "").strip()
+    if not raw:
+        return default
+    if not raw.lstrip("-").isdigit():
+        raise RuntimeError(f"{name} raqam bo‘lishi kerak")
+    return int(raw)
+
+
+def _float_env(name: str, default: float) -> float:
+    raw = (os.getenv(name) or "").strip()
+    if not raw:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        raise RuntimeError(f"{name} son bo‘lishi kerak")
+
 
 def load_config() -> Config:
     token = (os.getenv("BOT_TOKEN") or "").strip()
@@ -22,9 +101,74 @@ def load_config() -> Config:
     if not admin.isdigit():
         raise RuntimeError("ADMIN_ID raqam bo‘lishi kerak")
 
+    backend = (os.getenv("TIMINGS_BACKEND") or "api").strip().lower()
+    if backend not in ("api", "local"):
+        raise RuntimeError("TIMINGS_BACKEND 'api' yoki 'local' bo‘lishi kerak")
+
+    render_mode = (os.getenv("RENDER_MODE") or "process").strip().lower()
+    if render_mode not in ("process", "thread"):
+        raise RuntimeError("RENDER_MODE 'process' yoki 'thread' bo‘lishi kerak")
+
+    png_mode = (os.getenv("CALENDAR_PNG_MODE") or "palette").strip().lower()
+    if png_mode not in ("palette", "rgb"):
+        raise RuntimeError("CALENDAR_PNG_MODE 'palette' yoki 'rgb' bo‘lishi kerak")
+
+    mode = (os.getenv("BOT_MODE") or "polling").strip().lower()
+    if mode not in ("polling", "webhook"):
+        raise RuntimeError("BOT_MODE 'polling' yoki 'webhook' bo‘lishi kerak")
+    webhook_path = (os.getenv("WEBHOOK_PATH") or "/webhook").strip()
+    if not webhook_path.startswith("/"):
+        webhook_path = "/" + webhook_path
+
+    worker_count = _int_env("WORKER_COUNT", 1)
+    worker_id = _int_env("WORKER_ID", 0)
+    if worker_count < 1 or not (0 <= worker_id < worker_count):
+        raise RuntimeError("WORKER_ID 0..WORKER_COUNT-1 oralig‘ida bo‘lishi kerak")
+
     return Config(
         bot_token=token,
         admin_id=int(admin),
         tz=tz,
         country=country,
+        http_limit=_int_env("HTTP_LIMIT", 100),
+        http_limit_per_host=_int_env("HTTP_LIMIT_PER_HOST", 20),
+        http_keepalive=_float_env("HTTP_KEEPALIVE", 60.0),
+        http_dns_ttl=_int_env("HTTP_DNS_TTL", 300),
+        aladhan_retries=max(0, _int_env("ALADHAN_RETRIES", 2)),
+        breaker_threshold=max(1, _int_env("BREAKER_THRESHOLD", 5)),
+        breaker_reset=_float_env("BREAKER_RESET", 30.0),
+        timings_backend=backend,
+        calendar_cache_dir=(os.getenv("CALENDAR_CACHE_DIR") or "cache/calendars").strip(),
+        timings_store_dir=(os.getenv("TIMINGS_STORE_DIR") or "cache/timings").strip(),
+        render_mode=render_mode,
+        render_workers=max(1, _int_env("RENDER_WORKERS", 2)),
+        render_concurrency=max(1, _int_env("RENDER_CONCURRENCY", 4)),
+        calendar_png_mode=png_mode,
+        prefetch_days=max(1, _int_env("PREFETCH_DAYS", 2)),
+        prefetch_concurrency=max(1, _int_env("PREFETCH_CONCURRENCY", 4)),
+        plan_window=max(60.0, _float_env("PLAN_WINDOW", 3600.0)),
+        throttle_window=_float_env("THROTTLE_WINDOW", 2.0),
+        chat_throttle_window=_float_env("CHAT_THROTTLE_WINDOW", 5.0),
+        reply_cache_ttl=_float_env("REPLY_CACHE_TTL", 30.0),
+        block_threshold=max(0.01, _float_env("BLOCK_THRESHOLD", 0.1)),
+        profile_cache_size=max(1, _int_env("PROFILE_CACHE_SIZE", 50_000)),
+        profile_cache_ttl=_float_env("PROFILE_CACHE_TTL", 0.0),
+        live_cadence=(os.getenv("LIVE_CADENCE") or "60:1,300:10,*:60").strip(),
+        live_resume_stagger=_float_env("LIVE_RESUME_STAGGER", 0.05),
+        tg_global_rate=_float_env("TG_GLOBAL_RATE", 30.0),
+        tg_private_rate=_float_env("TG_PRIVATE_RATE", 1.0),
+        tg_group_rate=_float_env("TG_GROUP_RATE", 20 / 60),
+        bot_mode=mode,
+        webhook_base_url=(os.getenv("WEBHOOK_BASE_URL") or "").strip(),
+        webhook_path=webhook_path,
+        webhook_secret=(os.getenv("WEBHOOK_SECRET") or "").strip(),
+        webhook_host=(os.getenv("WEBHOOK_HOST") or "0.0.0.0").strip(),
+        webhook_port=_int_env("WEBHOOK_PORT", 8080),
+        webhook_concurrency=_int_env("WEBHOOK_CONCURRENCY", 100),
+        webhook_backlog=_int_env("WEBHOOK_BACKLOG", 1000),
+        worker_id=worker_id,
+        worker_count=worker_count,
+        shared_state_url=(os.getenv("SHARED_STATE_URL") or "sqlite:///data.sqlite3").strip(),
+        metrics_host=(os.getenv("METRICS_HOST") or "0.0.0.0").strip(),
+        metrics_port=_int_env("METRICS_PORT", 0),
     )
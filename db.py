@@ -1,60 +1,388 @@
+import asyncio
+import logging
+import time
 import aiosqlite
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, AsyncIterator, List, Tuple
+
+from cache import LRUCache
+from metrics import DB_LATENCY, timed
 
 DB_PATH = "data.sqlite3"
 
-CREATE_SQL = """
-CREATE TABLE IF NOT EXISTS users(
-  user_id INTEGER PRIMARY KEY,
-  city TEXT NOT NULL DEFAULT 'Tashkent',
-  remind_before INTEGER NOT NULL DEFAULT 10,
-  remind_enabled INTEGER NOT NULL DEFAULT 1,
-  last_imsak_date TEXT,
-  last_maghrib_date TEXT
-);
-"""
+# ✅ MUHIM: sxema faqat migratsiya orqali o‘zgaradi. i-element qo‘llangandan keyin PRAGMA user_version = i+1.
+# Faqat oxiriga qo‘shing, mavjudlarini o‘zgartirmang.
+MIGRATIONS: List[Tuple[str, ...]] = [
+    # 1: boshlang‘ich sxema (user_version'dan oldingi bazalarda jadvallar allaqachon bor)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS users(
+          user_id INTEGER PRIMARY KEY,
+          city TEXT NOT NULL DEFAULT 'Tashkent',
+          remind_before INTEGER NOT NULL DEFAULT 10,
+          remind_enabled INTEGER NOT NULL DEFAULT 1,
+          last_imsak_date TEXT,
+          last_maghrib_date TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS live_sessions(
+          chat_id INTEGER PRIMARY KEY,
+          user_id INTEGER NOT NULL,
+          mode TEXT NOT NULL,
+          msg_id INTEGER NOT NULL,
+          target REAL NOT NULL,
+          header TEXT NOT NULL,
+          started_at REAL NOT NULL,
+          owner TEXT NOT NULL DEFAULT ''
+        )
+        """,
+    ),
+    # 2: bugungi reminder fire vaqtlari (epoch, target - remind_before) — "kimning vaqti keldi" indeks bo‘yicha
+    (
+        "ALTER TABLE users ADD COLUMN next_imsak_at REAL",
+        "ALTER TABLE users ADD COLUMN next_maghrib_at REAL",
+        "CREATE INDEX IF NOT EXISTS idx_users_city ON users(city)",
+        "CREATE INDEX IF NOT EXISTS idx_users_next_imsak ON users(next_imsak_at) WHERE remind_enabled=1",
+        "CREATE INDEX IF NOT EXISTS idx_users_next_maghrib ON users(next_maghrib_at) WHERE remind_enabled=1",
+    ),
+    # 3: guruh obunalari (guruhda /ramadan — guruh shahri bo‘yicha)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS group_subscriptions(
+          chat_id INTEGER PRIMARY KEY,
+          city TEXT NOT NULL,
+          added_by INTEGER NOT NULL,
+          enabled INTEGER NOT NULL DEFAULT 1,
+          created_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_group_subs_city ON group_subscriptions(city) WHERE enabled=1",
+    ),
+]
+
+KINDS = ("imsak", "maghrib")
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA mmap_size=67108864",
+)
+
+log = logging.getLogger(__name__)
+
 
 class DB:
-    def __init__(self, path: str = DB_PATH):
+    """
+    Bitta uzoq yashaydigan aiosqlite ulanish (WAL).
+    Yozuvlar navbatga tushadi va guruh bo‘lib bitta tranzaksiyada commit qilinadi;
+    o‘qish faqat o‘zidan oldin navbatga tushgan yozuvlar commit bo‘lishini kutadi (read-your-writes).
+    """
+
+    def __init__(self, path: str = DB_PATH, batch_size: int = 500):
         self.path = path
+        self.batch_size = batch_size
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        # navbatga tushgan / commit qilingan yozuvlar soni (navbat FIFO — tartib raqami sifatida)
+        self._enqueued = 0
+        self._committed = 0
+        self._progress: Optional[asyncio.Condition] = None
 
     async def init(self) -> None:
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute(CREATE_SQL)
-            await db.commit()
+        if self._conn is not None:
+            return
+        self._conn = await aiosqlite.connect(self.path)
+        self._conn.row_factory = aiosqlite.Row
+        for p in PRAGMAS:
+            await self._conn.execute(p)
+        await self.migrate()
+
+        self._queue = asyncio.Queue()
+        self._progress = asyncio.Condition()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def migrate(self) -> int:
+        """
+        Qo‘llanmagan migratsiyalarni bitta tranzaksiyada bajaradi va schema versiyasini qaytaradi.
+        BEGIN IMMEDIATE: bir vaqtda ko‘tarilgan worker'lardan faqat bittasi migratsiya qiladi,
+        qolganlari lock'dan keyin yangilangan user_version'ni ko‘radi.
+        """
+        conn = self.conn
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            async with conn.execute("PRAGMA user_version") as cur:
+                version = (await cur.fetchone())[0]
+            if version > len(MIGRATIONS):
+                raise RuntimeError(f"DB sxemasi ({version}) koddan yangi ({len(MIGRATIONS)})")
+            for i, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+                for sql in statements:
+                    await conn.execute(sql)
+                await conn.execute(f"PRAGMA user_version={i}")
+                log.info("DB migration %d applied", i)
+            await conn.commit()
+        except BaseException:
+            await conn.rollback()
+            raise
+        return len(MIGRATIONS)
+
+    @property
+    def conn(self) -> aiosqlite.Connection:
+        if self._conn is None:
+            raise RuntimeError("DB.init() chaqirilmagan")
+        return self._conn
+
+    # ===== write-behind =====
+
+    def _write(self, sql: str, params: Tuple = ()) -> None:
+        if self._queue is None:
+            raise RuntimeError("DB.init() chaqirilmagan")
+        self._enqueued += 1
+        self._queue.put_nowait((sql, params))
+
+    async def _write_loop(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                for sql, params in batch:
+                    try:
+                        await self._conn.execute(sql, params)
+                    except Exception:
+                        log.exception("DB write failed: %s", sql)
+                await self._conn.commit()
+            except Exception:
+                log.exception("DB commit failed (%d statements)", len(batch))
+            finally:
+                self._committed += len(batch)
+                async with self._progress:
+                    self._progress.notify_all()
+
+    async def _barrier(self, seq: int) -> None:
+        # ✅ faqat `seq`gacha bo‘lgan yozuvlarni kutadi: keyin kelayotgan yozuvlar oqimi o‘qishni to‘xtatmaydi
+        if self._committed >= seq or self._progress is None:
+            return
+        async with self._progress:
+            await self._progress.wait_for(lambda: self._committed >= seq)
+
+    @timed(DB_LATENCY, method="flush")
+    async def flush(self) -> None:
+        await self._barrier(self._enqueued)
+
+    async def close(self) -> None:
+        if self._conn is None:
+            return
+        await self.flush()
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        await self._conn.close()
+        self._conn = None
+        self._queue = None
+
+    async def _fetchone(self, sql: str, params: Tuple = ()):
+        await self._barrier(self._enqueued)
+        async with self.conn.execute(sql, params) as cur:
+            return await cur.fetchone()
+
+    async def _fetchall(self, sql: str, params: Tuple = ()):
+        await self._barrier(self._enqueued)
+        async with self.conn.execute(sql, params) as cur:
+            return await cur.fetchall()
+
+    # ===== users =====
+
+    @timed(DB_LATENCY, method="ensure")
+    async def ensure(self, user_id: int) -> None:
+        self._write("INSERT OR IGNORE INTO users(user_id) VALUES(?)", (user_id,))
+
+    @timed(DB_LATENCY, method="get")
+    async def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        row = await self._fetchone("SELECT * FROM users WHERE user_id=?", (user_id,))
+        return dict(row) if row else None
+
+    @timed(DB_LATENCY, method="set_city")
+    async def set_city(self, user_id: int, city: str) -> None:
+        self._write("UPDATE users SET city=? WHERE user_id=?", (city, user_id))
+
+    @staticmethod
+    def clamp_remind_before(minutes: int) -> int:
+        return max(1, min(120, int(minutes)))
+
+    @timed(DB_LATENCY, method="set_remind_before")
+    async def set_remind_before(self, user_id: int, minutes: int) -> None:
+        minutes = self.clamp_remind_before(minutes)
+        self._write("UPDATE users SET remind_before=? WHERE user_id=?", (minutes, user_id))
+
+    @timed(DB_LATENCY, method="mark_sent")
+    async def mark_sent(self, user_id: int, kind: str, date_str: str) -> None:
+        col = "last_imsak_date" if kind == "imsak" else "last_maghrib_date"
+        self._write(f"UPDATE users SET {col}=? WHERE user_id=?", (date_str, user_id))
+
+    @timed(DB_LATENCY, method="list_cities")
+    async def list_cities(self) -> List[str]:
+        # ikkala jadvalda ham city indeksli — jadval skan qilinmaydi
+        rows = await self._fetchall(
+            "SELECT city FROM users UNION SELECT city FROM group_subscriptions WHERE enabled=1"
+        )
+        return [r["city"] for r in rows]
+
+    # ===== reminder rejasi (next_*_at) =====
+
+    @timed(DB_LATENCY, method="set_city_targets")
+    async def set_city_targets(self, city: str, imsak_at: Optional[float], maghrib_at: Optional[float]) -> None:
+        """Shahar bo‘yicha bugungi target'lar: har foydalanuvchining fire vaqti = target - remind_before (bitta UPDATE)."""
+        self._write(
+            "UPDATE users SET next_imsak_at=?-remind_before*60, next_maghrib_at=?-remind_before*60 WHERE city=?",
+            (imsak_at, maghrib_at, city),
+        )
+
+    @timed(DB_LATENCY, method="set_user_targets")
+    async def set_user_targets(self, user_id: int, imsak_at: Optional[float], maghrib_at: Optional[float]) -> None:
+        self._write(
+            "UPDATE users SET next_imsak_at=?-remind_before*60, next_maghrib_at=?-remind_before*60 WHERE user_id=?",
+            (imsak_at, maghrib_at, user_id),
+        )
+
+    async def iter_due(self, start: float, end: float, day: str, page: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """
+        [start, end) oralig‘ida reminder'i keladigan foydalanuvchilar (avval imsak, keyin maghrib), fire_at tartibida.
+        next_*_at indeksi bo‘yicha keyset sahifalar: butun jadval xotiraga olinmaydi va kursor
+        yozuvlar orasida ochiq qolmaydi.
+        """
+        for kind in KINDS:
+            col = f"next_{kind}_at"
+            sql = (
+                f"SELECT user_id, remind_before, {col} AS fire_at FROM users "
+                f"WHERE remind_enabled=1 AND {col}>=? AND {col}<? AND ({col}>? OR user_id>?) "
+                f"AND (last_{kind}_date IS NULL OR last_{kind}_date!=?) "
+                f"ORDER BY {col}, user_id LIMIT ?"
+            )
+            last_at, last_uid = start, -1
+            while True:
+                t = time.perf_counter()
+                rows = await self._fetchall(sql, (last_at, end, last_at, last_uid, day, page))
+                DB_LATENCY.observe(time.perf_counter() - t, method="iter_due")
+                for r in rows:
+                    yield {
+                        "user_id": r["user_id"],
+                        "kind": kind,
+                        "fire_at": r["fire_at"],
+                        "target": r["fire_at"] + r["remind_before"] * 60,
+                    }
+                if len(rows) < page:
+                    break
+                last_at, last_uid = rows[-1]["fire_at"], rows[-1]["user_id"]
+
+    # ===== guruh obunalari =====
+
+    @timed(DB_LATENCY, method="subscribe_group")
+    async def subscribe_group(self, chat_id: int, city: str, added_by: int) -> None:
+        self._write(
+            "INSERT INTO group_subscriptions(chat_id, city, added_by, created_at) VALUES(?,?,?,?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET city=excluded.city, added_by=excluded.added_by, enabled=1",
+            (chat_id, city, added_by, time.time()),
+        )
+
+    @timed(DB_LATENCY, method="unsubscribe_group")
+    async def unsubscribe_group(self, chat_id: int) -> None:
+        self._write("UPDATE group_subscriptions SET enabled=0 WHERE chat_id=?", (chat_id,))
+
+    # ===== live sessions (restart'dan keyin davom ettirish uchun) =====
+
+    @timed(DB_LATENCY, method="save_live_session")
+    async def save_live_session(self, s: Dict[str, Any], owner: str = "") -> None:
+        self._write(
+            "INSERT OR REPLACE INTO live_sessions(chat_id, user_id, mode, msg_id, target, header, started_at, owner) "
+            "VALUES(?,?,?,?,?,?,?,?)",
+            (s["chat_id"], s["user_id"], s["mode"], s["msg_id"], s["target"], s["header"], s["started_at"], owner),
+        )
+
+    @timed(DB_LATENCY, method="delete_live_session")
+    async def delete_live_session(self, chat_id: int) -> None:
+        self._write("DELETE FROM live_sessions WHERE chat_id=?", (chat_id,))
+
+    @timed(DB_LATENCY, method="list_live_sessions")
+    async def list_live_sessions(self) -> List[Dict[str, Any]]:
+        rows = await self._fetchall("SELECT * FROM live_sessions ORDER BY target")
+        return [dict(r) for r in rows]
+
+
+class CachedDB(DB):
+    """
+    DB + users profillari uchun LRU kesh (write-through).
+    Handler'lar har safar ensure()+get() qiladi — ma'lum foydalanuvchi uchun ikkalasi ham SQLite'ga bormaydi.
+    """
+
+    def __init__(self, path: str = DB_PATH, batch_size: int = 500, max_profiles: int = 50_000, ttl: float = 0.0):
+        super().__init__(path, batch_size)
+        self.profiles = LRUCache(max_profiles, ttl)
+        self.ensure_skipped = 0
 
     async def ensure(self, user_id: int) -> None:
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute("INSERT OR IGNORE INTO users(user_id) VALUES(?)", (user_id,))
-            await db.commit()
+        if user_id in self.profiles:
+            self.ensure_skipped += 1
+            return
+        await super().ensure(user_id)
 
     async def get(self, user_id: int) -> Optional[Dict[str, Any]]:
-        async with aiosqlite.connect(self.path) as db:
-            db.row_factory = aiosqlite.Row
-            cur = await db.execute("SELECT * FROM users WHERE user_id=?", (user_id,))
-            row = await cur.fetchone()
-            return dict(row) if row else None
+        user = self.profiles.get(user_id)
+        if user is None:
+            user = await super().get(user_id)
+            if user is None:
+                return None
+            self.profiles.set(user_id, user)
+        # chaqiruvchi o‘zgartirsa kesh buzilmasin
+        return dict(user)
 
     async def set_city(self, user_id: int, city: str) -> None:
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute("UPDATE users SET city=? WHERE user_id=?", (city, user_id))
-            await db.commit()
+        await super().set_city(user_id, city)
+        self.profiles.update(user_id, city=city)
 
     async def set_remind_before(self, user_id: int, minutes: int) -> None:
-        minutes = max(1, min(120, int(minutes)))
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute("UPDATE users SET remind_before=? WHERE user_id=?", (minutes, user_id))
-            await db.commit()
+        await super().set_remind_before(user_id, minutes)
+        self.profiles.update(user_id, remind_before=self.clamp_remind_before(minutes))
+
+    async def set_city_targets(self, city: str, imsak_at: Optional[float], maghrib_at: Optional[float]) -> None:
+        await super().set_city_targets(city, imsak_at, maghrib_at)
+        for user in self.profiles.values():
+            if user["city"] == city:
+                user.update(self._targets(user, imsak_at, maghrib_at))
+
+    async def set_user_targets(self, user_id: int, imsak_at: Optional[float], maghrib_at: Optional[float]) -> None:
+        await super().set_user_targets(user_id, imsak_at, maghrib_at)
+        user = self.profiles.peek(user_id)
+        if user is not None:
+            user.update(self._targets(user, imsak_at, maghrib_at))
+
+    @staticmethod
+    def _targets(user: Dict[str, Any], imsak_at: Optional[float], maghrib_at: Optional[float]) -> Dict[str, Any]:
+        # SQL bilan bir xil: next_*_at = target - remind_before (NULL bo‘lsa NULL)
+        before = int(user["remind_before"]) * 60
+        return {
+            "next_imsak_at": None if imsak_at is None else imsak_at - before,
+            "next_maghrib_at": None if maghrib_at is None else maghrib_at - before,
+        }
 
     async def mark_sent(self, user_id: int, kind: str, date_str: str) -> None:
+        await super().mark_sent(user_id, kind, date_str)
         col = "last_imsak_date" if kind == "imsak" else "last_maghrib_date"
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute(f"UPDATE users SET {col}=? WHERE user_id=?", (date_str, user_id))
-            await db.commit()
-
-    async def list_enabled(self) -> List[Dict[str, Any]]:
-        async with aiosqlite.connect(self.path) as db:
-            db.row_factory = aiosqlite.Row
-            cur = await db.execute("SELECT * FROM users WHERE remind_enabled=1")
-            rows = await cur.fetchall()
-            return [dict(r) for r in rows]
+        self.profiles.update(user_id, **{col: date_str})
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Tashqaridan (masalan qo‘lda SQL bilan) o‘zgargan profilni keshdan chiqaradi; None — hammasi."""
+        if user_id is None:
+            self.profiles.clear()
+        else:
+            self.profiles.invalidate(user_id)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {**self.profiles.stats(), "ensure_skipped": self.ensure_skipped}
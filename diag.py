@@ -0,0 +1,190 @@
+"""
+Event loop diagnostikasi (admin /diag uchun):
+
+    monitor = LoopMonitor(threshold=0.1)
+    monitor.start()               # event loop ichida
+    monitor.stats()               # lag, bloklashlar
+    await sample_profile(10)      # collapsed stacks (flamegraph.pl / speedscope)
+    await pstats_profile(10)      # cProfile, cumulative bo‘yicha
+    await monitor.close()
+
+Lag — kichik sleep'ning kechikishi. Bloklash — alohida watchdog thread: loop `threshold`dan
+uzoq javob bermasa, loop thread'ining o‘sha paytdagi stack'i yoziladi (masalan, sync Pillow render).
+"""
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from metrics import LOOP_BLOCKS, LOOP_LAG
+
+log = logging.getLogger(__name__)
+
+# /diag profile uchun yuqori chegara (sekund) va namuna oralig‘i
+PROFILE_MAX = 60.0
+SAMPLE_INTERVAL = 0.005
+
+# bir vaqtda bitta profil (cProfile ikkinchisini yoqolmaydi, sampler ham loop'ni sekinlatadi)
+_PROFILE_LOCK = threading.Lock()
+
+
+def _stack(frame, limit: int = 12) -> List[str]:
+    return [f"{os.path.basename(f.filename)}:{f.lineno} {f.name}" for f in traceback.extract_stack(frame)[-limit:]]
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1, keep: int = 3000):
+        self.interval = interval
+        self.threshold = threshold
+        # (ts, lag) — interval=0.1 da ~5 daqiqa
+        self.lags: Deque[tuple] = deque(maxlen=keep)
+        # {"at", "seconds", "stack"} — eng oxirgilari
+        self.blocks: Deque[Dict[str, Any]] = deque(maxlen=50)
+        self.max_lag = 0.0
+        self._beat = 0.0
+        self._tid: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._tid = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def close(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._thread = None
+
+    async def _run(self) -> None:
+        while True:
+            t = time.perf_counter()
+            self._beat = t
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - t - self.interval)
+            self.lags.append((time.time(), lag))
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG.set(lag)
+
+    def _watch(self) -> None:
+        # bitta bloklash epizodi — bitta yozuv (beat o‘zgarmaguncha davomiyligi yangilanadi)
+        seen_beat = None
+        block: Optional[Dict[str, Any]] = None
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._beat
+            stalled = time.perf_counter() - beat - self.interval
+            if stalled < self.threshold:
+                continue
+            if beat != seen_beat:
+                seen_beat = beat
+                frame = sys._current_frames().get(self._tid)
+                block = {"at": time.time(), "seconds": stalled, "stack": _stack(frame) if frame else []}
+                self.blocks.append(block)
+                LOOP_BLOCKS.inc()
+                log.warning("event loop %.0f ms dan beri bloklangan: %s", stalled * 1000, " <- ".join(block["stack"][-3:]))
+            else:
+                block["seconds"] = stalled
+
+    def stats(self, horizon: float = 300.0) -> Dict[str, Any]:
+        since = time.time() - horizon
+        lags = sorted(lag for ts, lag in self.lags if ts >= since)
+
+        def pct(q: float) -> float:
+            return lags[min(len(lags) - 1, int(q * len(lags)))] if lags else 0.0
+
+        return {
+            "lag": self.lags[-1][1] if self.lags else 0.0,
+            "p50": pct(0.5),
+            "p99": pct(0.99),
+            "max": lags[-1] if lags else 0.0,
+            "max_ever": self.max_lag,
+            "blocks": sum(1 for b in self.blocks if b["at"] >= since),
+        }
+
+
+async def sample_profile(seconds: float, interval: float = SAMPLE_INTERVAL) -> str:
+    """
+    Loop thread'ini `seconds` davomida har `interval`da namuna oladi; collapsed stacks qaytaradi:
+    "bot.py:main;...;calendar_image.py:render_ramadan_calendar_png 42". Idle (select) ham ko‘rinadi.
+    """
+    if not _PROFILE_LOCK.acquire(blocking=False):
+        raise RuntimeError("Profil allaqachon ishlayapti")
+    try:
+        tid = threading.get_ident()
+        counts: Counter = Counter()
+        stop = threading.Event()
+
+        def sample() -> None:
+            while not stop.wait(interval):
+                frame = sys._current_frames().get(tid)
+                stack = []
+                while frame is not None:
+                    stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+                counts[";".join(reversed(stack))] += 1
+
+        # ✅ sampler GIL'ni faqat loop uni bo‘shatganda (select) olsa, namunalar idle tomonga og‘adi:
+        # profil davomida loop thread'i GIL'ni tez-tez bo‘shatsin
+        switch = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch, interval / 10))
+        thread = threading.Thread(target=sample, name="diag-sampler", daemon=True)
+        thread.start()
+        try:
+            await asyncio.sleep(min(seconds, PROFILE_MAX))
+        finally:
+            stop.set()
+            sys.setswitchinterval(switch)
+            await asyncio.get_running_loop().run_in_executor(None, thread.join)
+        return "\n".join(f"{stack} {n}" for stack, n in counts.most_common()) + "\n"
+    finally:
+        _PROFILE_LOCK.release()
+
+
+async def pstats_profile(seconds: float, limit: int = 80) -> str:
+    """Loop thread'ida cProfile (deterministik, sekinroq) — cumulative bo‘yicha eng og‘ir `limit` funksiya."""
+    if not _PROFILE_LOCK.acquire(blocking=False):
+        raise RuntimeError("Profil allaqachon ishlayapti")
+    try:
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            await asyncio.sleep(min(seconds, PROFILE_MAX))
+        finally:
+            prof.disable()
+        out = io.StringIO()
+        pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+    finally:
+        _PROFILE_LOCK.release()
+
+
+def format_blocks(monitor: LoopMonitor) -> str:
+    lines = []
+    for b in reversed(monitor.blocks):
+        at = time.strftime("%H:%M:%S", time.localtime(b["at"]))
+        lines.append(f"# {at}  {b['seconds'] * 1000:.0f} ms")
+        lines.extend(f"  {s}" for s in b["stack"])
+        lines.append("")
+    return "\n".join(lines) or "bloklash qayd etilmagan\n"
@@ -0,0 +1,93 @@
+"""
+Lokal "soxta Telegram": webhook'ga update yuboradi (testlar va yuklama sinovi uchun).
+
+    client = FakeTelegramClient("http://127.0.0.1:8080/webhook", secret="...")
+    await client.message(user_id=1, text="⏳ Bugungi vaqtlar")
+    await client.callback(user_id=1, data="cal:Tashkent")
+"""
+from __future__ import annotations
+
+import itertools
+import time
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from webhook import SECRET_HEADER
+
+
+class FakeTelegramClient:
+    def __init__(self, url: str, secret: str = "", session: Optional[aiohttp.ClientSession] = None):
+        self.url = url
+        self.secret = secret
+        self._session = session
+        self._own_session = session is None
+        self._update_id = itertools.count(1)
+        self._message_id = itertools.count(1)
+
+    async def __aenter__(self) -> "FakeTelegramClient":
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @staticmethod
+    def _user(user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"}
+
+    @staticmethod
+    def _chat(chat_id: int) -> Dict[str, Any]:
+        if chat_id < 0:
+            return {"id": chat_id, "type": "supergroup", "title": f"g{chat_id}"}
+        return {"id": chat_id, "type": "private", "first_name": f"u{chat_id}"}
+
+    def message_update(self, user_id: int, text: str, chat_id: Optional[int] = None) -> Dict[str, Any]:
+        msg: Dict[str, Any] = {
+            "message_id": next(self._message_id),
+            "date": int(time.time()),
+            "chat": self._chat(chat_id if chat_id is not None else user_id),
+            "from": self._user(user_id),
+            "text": text,
+        }
+        if text.startswith("/"):
+            cmd = text.split()[0]
+            msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(cmd)}]
+        return {"update_id": next(self._update_id), "message": msg}
+
+    def callback_update(self, user_id: int, data: str, chat_id: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "update_id": next(self._update_id),
+            "callback_query": {
+                "id": str(next(self._update_id)),
+                "from": self._user(user_id),
+                "chat_instance": "fake",
+                "data": data,
+                "message": {
+                    "message_id": next(self._message_id),
+                    "date": int(time.time()),
+                    "chat": self._chat(chat_id if chat_id is not None else user_id),
+                    "text": "menu",
+                },
+            },
+        }
+
+    async def post(self, update: Dict[str, Any]) -> int:
+        if self._session is None:
+            await self.__aenter__()
+        headers = {SECRET_HEADER: self.secret} if self.secret else {}
+        async with self._session.post(self.url, json=update, headers=headers) as r:
+            await r.read()
+            return r.status
+
+    async def message(self, user_id: int, text: str, chat_id: Optional[int] = None) -> int:
+        return await self.post(self.message_update(user_id, text, chat_id))
+
+    async def callback(self, user_id: int, data: str, chat_id: Optional[int] = None) -> int:
+        return await self.post(self.callback_update(user_id, data, chat_id))
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional, Protocol, Tuple
+
+from outbox import Priority, priority
+
+TIME_UP_TEXT = "✅ Vaqt bo‘ldi!"
+FOOTER = "🛑 To‘xtatish bossangiz eslatma to‘xtaydi."
+
+
+def fmt_countdown(delta: timedelta | float) -> str:
+    sec = int(delta.total_seconds() if isinstance(delta, timedelta) else delta)
+    if sec < 0:
+        sec = 0
+    h = sec // 3600
+    m = (sec % 3600) // 60
+    s = sec % 60
+    return f"{h:02d}:{m:02d}:{s:02d}"
+
+
+@dataclass(slots=True)
+class LiveSession:
+    chat_id: int
+    user_id: int
+    mode: str  # "imsak" | "maghrib"
+    msg_id: int
+    target: float  # epoch sekund
+    header: str  # sarlavha + shahar + vaqt qatorlari (o‘zgarmaydi)
+    started_at: float = field(default_factory=time.time)
+    next_edit: float = 0.0  # shu vaqtgacha edit qilinmaydi (cadence)
+    last_text: str = ""
+
+    def render(self, now: float) -> str:
+        return f"{self.header}\n⏳ {fmt_countdown(self.target - now)}\n\n{FOOTER}"
+
+    def to_row(self) -> dict:
+        row = asdict(self)
+        row.pop("next_edit")
+        row.pop("last_text")
+        return row
+
+
+class CadencePolicy:
+    """
+    Qolgan vaqtga qarab edit oralig‘i.
+    steps: [(qolgan_sekund_gacha, interval)], o‘sish tartibida; undan uzog‘i — `far`.
+    Default: oxirgi 1 daqiqada har 1s, oxirgi 5 daqiqada har 10s, qolganida har 60s.
+    """
+
+    def __init__(self, steps: Tuple[Tuple[int, int], ...] = ((60, 1), (300, 10)), far: int = 60):
+        self.steps = tuple(sorted(steps))
+        self.far = far
+
+    @classmethod
+    def parse(cls, spec: str) -> "CadencePolicy":
+        """ "60:1,300:10,*:60" ko‘rinishidagi satrdan."""
+        steps: List[Tuple[int, int]] = []
+        far = 60
+        for part in (spec or "").split(","):
+            part = part.strip()
+            if not part:
+                continue
+            upto, _, every = part.partition(":")
+            if upto.strip() == "*":
+                far = max(1, int(every))
+            else:
+                steps.append((int(upto), max(1, int(every))))
+        return cls(tuple(steps), far)
+
+    def interval(self, remaining: float) -> int:
+        for upto, every in self.steps:
+            if remaining <= upto:
+                return every
+        return self.far
+
+    def next_edit(self, target: float, now: float) -> float:
+        """
+        Keyingi edit vaqti: ko‘rsatiladigan qolgan soniya interval'ga karrali bo‘lgan payt,
+        shunda soniyalar "yumaloq" bo‘ladi (01:23:00).
+        """
+        shown = int(target - now)
+        # oxirgi soniya: aks holda `now` qaytib, ticker shu sessiyani to‘xtovsiz qayta ko‘radi
+        if shown <= 0:
+            return target
+        every = self.interval(shown)
+        nxt = max(((shown - 1) // every) * every, 0)
+        # int(target - t) <= nxt bo‘ladigan birinchi t
+        return target - (nxt + 1) + 1e-3
+
+
+class Sender(Protocol):
+    async def edit(self, chat_id: int, msg_id: int, text: str) -> None: ...
+
+    async def send(self, chat_id: int, text: str) -> None: ...
+
+
+class BotSender:
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def edit(self, chat_id: int, msg_id: int, text: str) -> None:
+        # faqat countdown edit'lari LOW: navbatda yangisi eskisining o‘rnini egallaydi/tashlanadi
+        with priority(Priority.LOW):
+            await self.bot.edit_message_text(text, chat_id=chat_id, message_id=msg_id)
+
+    async def send(self, chat_id: int, text: str) -> None:
+        # "Vaqt bo‘ldi!" — countdown edit'laridan oldin ketadi
+        with priority(Priority.HIGH):
+            await self.bot.send_message(chat_id, text)
+
+
+class LiveEngine:
+    """
+    Barcha jonli countdown'lar uchun bitta ticker.
+    Har tick'da faqat xotiradagi sessiyalardan matn yasaladi (DB/API yo‘q),
+    edit'lar sender'ga topshiriladi.
+    """
+
+    def __init__(
+        self,
+        interval: float = 1.0,
+        cadence: Optional[CadencePolicy] = None,
+        on_finish: Optional[Callable[[LiveSession], None]] = None,
+    ):
+        self.interval = interval
+        self.cadence = cadence or CadencePolicy()
+        # sessiya target'ga yetib tugaganda chaqiriladi (masalan, DB'dan o‘chirish)
+        self.on_finish = on_finish
+        self.sessions: Dict[int, LiveSession] = {}
+        self._sender: Optional[Sender] = None
+        self._task: Optional[asyncio.Task] = None
+        # chat_id lar: oldingi edit hali tugamagan bo‘lsa yangisini yubormaymiz
+        self._inflight: set[int] = set()
+        self._bg: set[asyncio.Task] = set()
+        # metrikalar
+        self.session_ticks = 0  # har-sekund edit qilinganda qancha edit bo‘lardi
+        self.edits_sent = 0
+        self.edits_unchanged = 0
+        self.edits_failed = 0
+
+    def start(self, sender: Sender) -> None:
+        self._sender = sender
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def drain(self) -> None:
+        """Yuborilayotgan edit'lar tugashini kutadi."""
+        while self._bg:
+            await asyncio.gather(*list(self._bg), return_exceptions=True)
+
+    def add(self, session: LiveSession) -> None:
+        self.sessions[session.chat_id] = session
+
+    def remove(self, chat_id: int) -> Optional[LiveSession]:
+        return self.sessions.pop(chat_id, None)
+
+    async def _run(self) -> None:
+        while True:
+            # hamma sessiya bir fazada — butun interval chegarasida uyg‘onamiz
+            await asyncio.sleep(self.interval - (time.time() % self.interval))
+            try:
+                self.tick(time.time())
+            except Exception:
+                pass
+
+    def tick(self, now: float) -> None:
+        if self._sender is None:
+            return
+        for chat_id, s in list(self.sessions.items()):
+            self.session_ticks += 1
+            if chat_id in self._inflight:
+                continue
+            # next_edit <= target doim; resume'da esa tugagan sessiyalar ham navbat bilan chiqadi
+            if now < s.next_edit:
+                continue
+            done = s.target - now <= 0
+
+            text = s.render(now)
+            s.next_edit = self.cadence.next_edit(s.target, now)
+            if done:
+                self.sessions.pop(chat_id, None)
+                if self.on_finish is not None:
+                    self.on_finish(s)
+            elif text == s.last_text:
+                self.edits_unchanged += 1
+                continue
+            self._spawn(chat_id, self._deliver(s, text, done))
+
+    def _spawn(self, chat_id: int, coro) -> None:
+        self._inflight.add(chat_id)
+        task = asyncio.create_task(coro)
+        self._bg.add(task)
+        task.add_done_callback(lambda t: (self._bg.discard(t), self._inflight.discard(chat_id)))
+
+    async def _deliver(self, s: LiveSession, text: str, done: bool) -> None:
+        # ✅ MUHIM: edit xatosi sessiyani o‘ldirmasin — keyingi tick qayta urinadi
+        if text != s.last_text:
+            try:
+                await self._sender.edit(s.chat_id, s.msg_id, text)
+                self.edits_sent += 1
+                s.last_text = text
+            except Exception:
+                self.edits_failed += 1
+                s.next_edit = 0.0
+        if done:
+            try:
+                await self._sender.send(s.chat_id, TIME_UP_TEXT)
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "session_ticks": self.session_ticks,
+            "edits_sent": self.edits_sent,
+            "edits_unchanged": self.edits_unchanged,
+            "edits_failed": self.edits_failed,
+            "edits_saved": max(0, self.session_ticks - self.edits_sent),
+        }
@@ -0,0 +1,264 @@
+"""
+Yengil Prometheus-text metrikalar (tashqi kutubxonasiz) va /metrics HTTP endpoint.
+
+    @timed(DB_LATENCY, method="get")
+    async def get(...): ...
+
+METRICS_PORT=9100 bo‘lsa http://host:9100/metrics ochiladi (0 — o‘chirilgan).
+"""
+from __future__ import annotations
+
+import bisect
+import functools
+import heapq
+import inspect
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REGISTRY: List["_Metric"] = []
+
+
+def _key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in items)
+    return "{" + inner + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        REGISTRY.append(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        k = _key(labels)
+        self._values[k] = self._values.get(k, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_fmt_labels(k)} {v}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+        self._fn = fn
+        self._fn_label: Optional[str] = None
+
+    def set(self, value: float, **labels) -> None:
+        self._values[_key(labels)] = value
+
+    def set_function(self, fn: Callable[[], object], label: Optional[str] = None) -> None:
+        """label berilsa fn {label qiymati: son} qaytaradi — har biri alohida sample."""
+        self._fn = fn
+        self._fn_label = label
+
+    def samples(self) -> List[str]:
+        if self._fn is not None:
+            try:
+                if self._fn_label is None:
+                    return [f"{self.name} {float(self._fn())}"]
+                return [
+                    f"{self.name}{_fmt_labels(((self._fn_label, str(k)),))} {float(v)}" for k, v in self._fn().items()
+                ]
+            except Exception:
+                return []
+        return [f"{self.name}{_fmt_labels(k)} {v}" for k, v in self._values.items()]
+
+
+class SlowLog:
+    """
+    Har daqiqa uchun eng sekin `size` ta kuzatuv (Histogram.observe'dan keladi).
+    top(horizon) — so‘nggi horizon sekund ichidagi eng sekinlari: /diag "eng sekin await'lar".
+    """
+
+    def __init__(self, size: int = 20, keep_minutes: int = 15):
+        self.size = size
+        self.keep_minutes = keep_minutes
+        # minute -> min-heap[(seconds, ts, name, labels)]
+        self._buckets: Dict[int, List[Tuple[float, float, str, LabelKey]]] = {}
+
+    def offer(self, name: str, key: LabelKey, seconds: float) -> None:
+        now = time.time()
+        minute = int(now // 60)
+        heap = self._buckets.get(minute)
+        if heap is None:
+            heap = self._buckets[minute] = []
+            for m in [m for m in self._buckets if m <= minute - self.keep_minutes]:
+                del self._buckets[m]
+        if len(heap) < self.size:
+            heapq.heappush(heap, (seconds, now, name, key))
+        elif seconds > heap[0][0]:
+            heapq.heapreplace(heap, (seconds, now, name, key))
+
+    def top(self, horizon: float = 600.0, n: int = 10) -> List[Tuple[float, float, str, LabelKey]]:
+        since = time.time() - horizon
+        items = [it for heap in self._buckets.values() for it in heap if it[1] >= since]
+        return heapq.nlargest(n, items)
+
+
+SLOWEST = SlowLog()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        # label -> [bucket counts..., +Inf], sum
+        self._counts: Dict[LabelKey, List[int]] = {}
+        self._sums: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        k = _key(labels)
+        counts = self._counts.get(k)
+        if counts is None:
+            counts = self._counts[k] = [0] * (len(self.buckets) + 1)
+            self._sums[k] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[k] += value
+        SLOWEST.offer(self.name, k, value)
+
+    def samples(self) -> List[str]:
+        out = []
+        for k, counts in self._counts.items():
+            acc = 0
+            for b, c in zip(self.buckets, counts):
+                acc += c
+                out.append(f"{self.name}_bucket{_fmt_labels(k, ('le', repr(b)))} {acc}")
+            acc += counts[-1]
+            out.append(f"{self.name}_bucket{_fmt_labels(k, ('le', '+Inf'))} {acc}")
+            out.append(f"{self.name}_sum{_fmt_labels(k)} {self._sums[k]}")
+            out.append(f"{self.name}_count{_fmt_labels(k)} {acc}")
+        return out
+
+
+def timed(hist: Histogram, **labels):
+    """Sync yoki async funksiya davomiyligini histogramga yozadi."""
+
+    def deco(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*a, **kw):
+                t = time.perf_counter()
+                try:
+                    return await fn(*a, **kw)
+                finally:
+                    hist.observe(time.perf_counter() - t, **labels)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*a, **kw):
+                t = time.perf_counter()
+                try:
+                    return fn(*a, **kw)
+                finally:
+                    hist.observe(time.perf_counter() - t, **labels)
+        return wrapper
+
+    return deco
+
+
+def render() -> str:
+    return "\n".join(m.render() for m in REGISTRY) + "\n"
+
+
+# ===== hot-path metrikalar =====
+
+TIMINGS_LATENCY = Histogram("ramadan_timings_seconds", "prayers.get_today / get_calendar_by_city latency")
+DB_LATENCY = Histogram("ramadan_db_seconds", "DB method latency")
+RENDER_LATENCY = Histogram("ramadan_calendar_render_seconds", "calendar render latency (render_pool)")
+TELEGRAM_LATENCY = Histogram("ramadan_telegram_seconds", "Telegram Bot API call latency")
+TELEGRAM_ERRORS = Counter("ramadan_telegram_errors_total", "Telegram Bot API call errors")
+HANDLER_LATENCY = Histogram("ramadan_handler_seconds", "aiogram handler latency")
+HANDLER_ERRORS = Counter("ramadan_handler_errors_total", "aiogram handler errors")
+HANDLER_THROTTLED = Counter("ramadan_handler_throttled_total", "updates dropped by throttle.ThrottleMiddleware")
+REMINDER_TICK = Histogram("ramadan_reminder_tick_seconds", "reminder_tick duration")
+REMINDER_USERS = Counter("ramadan_reminder_users_total", "users processed by reminder_tick")
+REMINDER_FAILED = Counter("ramadan_reminder_failed_total", "due reminders not started (retried while before target)")
+TIMINGS_STALE = Counter("ramadan_timings_stale_total", "timings served from fallback while Aladhan failed")
+TIMINGS_BREAKER = Gauge("ramadan_timings_breaker_state", "Aladhan circuit breaker: 0 closed, 1 half_open, 2 open")
+LIVE_EDITS = Gauge("ramadan_live_edits", "LiveEngine countdown edits since start by result")
+OUTBOX_QUEUE = Gauge("ramadan_outbox_queue_depth", "outbox queued Telegram requests by priority")
+OUTBOX_WAIT = Gauge("ramadan_outbox_wait_seconds", "outbox wait before send, recent quantiles")
+LIVE_SESSIONS = Gauge("ramadan_live_sessions", "active LIVE_TASKS")
+LOOP_LAG = Gauge("ramadan_loop_lag_seconds", "event loop lag (diag.LoopMonitor)")
+LOOP_BLOCKS = Counter("ramadan_loop_blocks_total", "event loop blocked longer than BLOCK_THRESHOLD")
+PROFILE_CACHE_HIT_RATE = Gauge("ramadan_profile_cache_hit_ratio", "db.CachedDB profile cache hit rate")
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """router.message.middleware(...) / router.callback_query.middleware(...)"""
+
+    async def __call__(self, handler, event, data):
+        h = data.get("handler")
+        name = getattr(getattr(h, "callback", None), "__name__", "unknown")
+        t = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - t, handler=name)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """bot.session.middleware(...) — har bir Bot API chaqiruvi."""
+
+    async def __call__(self, make_request, bot, method):
+        name = getattr(method, "__api_method__", type(method).__name__)
+        t = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            TELEGRAM_LATENCY.observe(time.perf_counter() - t, method=name)
+
+
+async def start_server(host: str, port: int) -> web.AppRunner:
+    async def handle(_: web.Request) -> web.Response:
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Deque, Dict, List, Optional, Tuple
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+
+class Priority(IntEnum):
+    HIGH = 0  # reminder boshlanishi, "Vaqt bo‘ldi!"
+    NORMAL = 1  # handler javoblari
+    LOW = 2  # countdown edit'lari — tashlab yuborilishi mumkin
+
+
+class OutboxDropped(Exception):
+    """LOW xabar eskirdi yoki o‘sha chat uchun yangisi keldi."""
+
+
+_priority: ContextVar[Optional[Priority]] = ContextVar("outbox_priority", default=None)
+
+
+@contextmanager
+def priority(p: Priority):
+    """Shu blok ichidagi Telegram so‘rovlari berilgan prioritet bilan ketadi."""
+    token = _priority.set(p)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def ready_in(self, now: float) -> float:
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "chat_id", "future", "enqueued")
+
+    def __init__(self, priority: Priority, seq: int, chat_id: Optional[int], future: asyncio.Future, enqueued: float):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.future = future
+        self.enqueued = enqueued
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Outbox:
+    """
+    Telegram'ga chiquvchi so‘rovlar uchun navbat:
+    global token bucket (~30 msg/s) + har chat uchun bucket (DM ~1/s, guruh ~20/min),
+    prioritet bo‘yicha tartib, retry_after'ga rioya, eskirgan LOW edit'larni tashlash.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        private_rate: float = 1.0,
+        group_rate: float = 20 / 60,
+        chat_burst: float = 3.0,
+        low_max_wait: float = 5.0,
+    ):
+        self.global_rate = global_rate
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.low_max_wait = low_max_wait
+
+        now = time.monotonic()
+        self._global = TokenBucket(global_rate, global_rate, now)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._heap: List[_Waiter] = []
+        self._parked: List[Tuple[float, int, _Waiter]] = []
+        self._low_by_chat: Dict[int, _Waiter] = {}
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # stats
+        self.granted = {p.name: 0 for p in Priority}
+        self.dropped = 0
+        self.retry_after = 0
+        self._latency: Deque[float] = deque(maxlen=2000)
+
+    # ===== lifecycle =====
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._pump())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for w in self._heap + [w for _, _, w in self._parked]:
+            if not w.future.done():
+                w.future.set_exception(OutboxDropped("outbox closed"))
+        self._heap.clear()
+        self._parked.clear()
+
+    # ===== API =====
+
+    def _bucket(self, chat_id: int, now: float) -> TokenBucket:
+        b = self._chats.get(chat_id)
+        if b is None:
+            # manfiy chat_id — guruh/kanal
+            rate = self.group_rate if chat_id < 0 else self.private_rate
+            b = TokenBucket(rate, self.chat_burst, now)
+            self._chats[chat_id] = b
+        return b
+
+    async def acquire(self, chat_id: Optional[int], prio: Priority) -> None:
+        if self._task is None:
+            return  # start() qilinmagan — cheklovsiz
+        now = time.monotonic()
+        fut = asyncio.get_running_loop().create_future()
+        w = _Waiter(prio, next(self._seq), chat_id, fut, now)
+
+        if prio == Priority.LOW and chat_id is not None:
+            old = self._low_by_chat.get(chat_id)
+            if old is not None and not old.future.done():
+                old.future.set_exception(OutboxDropped("superseded"))
+                self.dropped += 1
+            self._low_by_chat[chat_id] = w
+
+        heapq.heappush(self._heap, w)
+        self._wake.set()
+        try:
+            await fut
+        finally:
+            if self._low_by_chat.get(chat_id) is w:
+                del self._low_by_chat[chat_id]
+        self._latency.append(time.monotonic() - now)
+
+    def pause(self, chat_id: Optional[int], seconds: float) -> None:
+        """retry_after: chat (yoki chat noma'lum bo‘lsa — hammasi) shuncha kutadi."""
+        until = time.monotonic() + seconds
+        b = self._global if chat_id is None else self._bucket(chat_id, time.monotonic())
+        b.blocked_until = max(b.blocked_until, until)
+        self.retry_after += 1
+        self._wake.set()
+
+    # ===== pump =====
+
+    async def _pump(self) -> None:
+        while True:
+            now = time.monotonic()
+            while self._parked and self._parked[0][0] <= now:
+                _, _, w = heapq.heappop(self._parked)
+                heapq.heappush(self._heap, w)
+
+            timeout: Optional[float] = None
+            if self._heap:
+                g = self._global.ready_in(now)
+                if g > 0:
+                    timeout = g
+                else:
+                    self._grant_one(now)
+                    continue
+            if self._parked:
+                p = self._parked[0][0] - now
+                timeout = p if timeout is None else min(timeout, p)
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _grant_one(self, now: float) -> None:
+        w = heapq.heappop(self._heap)
+        if w.future.done():
+            return
+        if w.priority == Priority.LOW and now - w.enqueued > self.low_max_wait:
+            w.future.set_exception(OutboxDropped("stale"))
+            self.dropped += 1
+            return
+        if w.chat_id is not None:
+            b = self._bucket(w.chat_id, now)
+            wait = b.ready_in(now)
+            if wait > 0:
+                heapq.heappush(self._parked, (now + wait, w.seq, w))
+                return
+            b.take(now)
+        self._global.take(now)
+        self.granted[w.priority.name] += 1
+        w.future.set_result(None)
+
+    # ===== stats =====
+
+    def stats(self) -> dict:
+        depth = {p.name: 0 for p in Priority}
+        for w in self._heap:
+            depth[w.priority.name] += 1
+        for _, _, w in self._parked:
+            depth[w.priority.name] += 1
+        lat = sorted(self._latency)
+
+        def pct(q: float) -> float:
+            return round(lat[min(len(lat) - 1, int(q * len(lat)))], 4) if lat else 0.0
+
+        return {
+            "queue_depth": depth,
+            "granted": dict(self.granted),
+            "dropped": self.dropped,
+            "retry_after": self.retry_after,
+            "wait_p50": pct(0.5),
+            "wait_p99": pct(0.99),
+            "chats": len(self._chats),
+        }
+
+
+class OutboxMiddleware(BaseRequestMiddleware):
+    """
+    bot.session.middleware(OutboxMiddleware(outbox)) — barcha send/edit so‘rovlari navbat orqali.
+    chat_id'siz metodlar (answerCallbackQuery, getUpdates, ...) cheklanmaydi.
+    """
+
+    def __init__(self, outbox: Outbox, max_retries: int = 3):
+        self.outbox = outbox
+        self.max_retries = max_retries
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+        if not isinstance(chat_id, int):
+            chat_id = None  # @username — faqat global limit
+
+        prio = _priority.get()
+        if prio is None:
+            # foydalanuvchi bosgan tugmaning edit'i ham — tashlab yuborilmaydi (LOW faqat live.BotSender.edit)
+            prio = Priority.NORMAL
+
+        attempt = 0
+        while True:
+            await self.outbox.acquire(chat_id, prio)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.outbox.pause(chat_id, e.retry_after)
+                attempt += 1
+                if prio == Priority.LOW or attempt > self.max_retries:
+                    raise
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+KINDS = ("imsak", "maghrib")
+
+# city -> (imsak epoch, maghrib epoch) bugun uchun
+Resolver = Callable[[str], Awaitable[Tuple[float, float]]]
+# eng katta remind_before (db.clamp_remind_before) — shuncha oldin "fire" bo‘lgan reja target'i hali oldinda bo‘lishi mumkin
+MAX_LEAD = 120 * 60
+# [start, end) oralig‘ida fire bo‘ladigan rejalar: {"user_id", "kind", "fire_at", "target"} (db.iter_due)
+Loader = Callable[[float, float], AsyncIterator[dict]]
+
+
+@dataclass(slots=True)
+class Due:
+    user_id: int
+    kind: str  # "imsak" | "maghrib"
+    day: str  # YYYY-MM-DD (mark_sent uchun)
+    fire_at: float
+    target: float
+
+
+class ReminderPlanner:
+    """
+    Kunlik reminder vaqtlari DB'da turadi (users.next_imsak_at/next_maghrib_at, indeksli).
+    Heap'da faqat oldindagi `window` soniya: keyingi oyna vaqti kelganda indeks bo‘yicha range so‘rov
+    bilan yuklanadi — butun jadval xotirada ushlanmaydi. Foydalanuvchi o‘zgarsa — faqat uning
+    yozuvlari yangilanadi (eski yozuvlar versiya orqali bekor bo‘ladi).
+    """
+
+    def __init__(self, resolve: Resolver, load: Loader, window: float = 3600.0):
+        self.resolve = resolve
+        self.load = load
+        self.window = window
+        self.day = ""
+        self._heap: List[Tuple[float, int, int, int, str, float]] = []  # (fire_at, seq, user_id, version, kind, target)
+        self._seq = itertools.count()
+        self._version: Dict[int, int] = {}
+        # [.., horizon) DB'dan yuklangan; until — kun oxiri
+        self._horizon = 0.0
+        self._until = 0.0
+        self.loaded = 0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def knows(self, user_id: int) -> bool:
+        return user_id in self._version
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def next_at(self) -> Optional[float]:
+        """Eng yaqin reminder yoki keyingi oynani yuklash vaqti."""
+        nxt = self._heap[0][0] if self._heap else None
+        if self._horizon < self._until and (nxt is None or self._horizon < nxt):
+            return self._horizon
+        return nxt
+
+    # ===== plan =====
+
+    async def rebuild(self, day: str, until: float) -> None:
+        """day uchun rejalar DB'ga yozilgandan keyin chaqiriladi; birinchi oynani yuklaydi."""
+        self.day = day
+        self._heap.clear()
+        now = time.time()
+        # ✅ restart'dan keyin: fire vaqti o‘tgan, lekin target'i hali oldinda bo‘lganlar ham yuklansin
+        # (target o‘tganlarini pop_due tashlaydi)
+        self._horizon = now - MAX_LEAD
+        self._until = until
+        await self.fill(now)
+
+    async def fill(self, now: float) -> int:
+        """Heap'ni now + window gacha to‘ldiradi (oldingi oynalar bilan kesishmaydi)."""
+        end = min(self._until, max(now, self._horizon) + self.window)
+        if end <= self._horizon:
+            return 0
+        n = 0
+        async for row in self.load(self._horizon, end):
+            uid = row["user_id"]
+            v = self._version.setdefault(uid, 0)
+            self._heap.append((row["fire_at"], next(self._seq), uid, v, row["kind"], row["target"]))
+            n += 1
+        self._horizon = end
+        heapq.heapify(self._heap)
+        self.loaded += n
+        self._wake.set()
+        return n
+
+    async def update_user(self, user: Optional[dict], user_id: Optional[int] = None) -> Optional[Tuple[float, float]]:
+        """
+        Shahar/remind_before/remind_enabled o‘zgarganda chaqiriladi.
+        Bugungi (imsak, maghrib) target'larini qaytaradi — chaqiruvchi DB'ga yozadi (db.set_user_targets).
+        """
+        uid = user["user_id"] if user else user_id
+        v = self._bump(uid)
+        if not user or not int(user.get("remind_enabled", 1)):
+            return None
+        try:
+            t = await self.resolve(user["city"])
+        except Exception:
+            return None
+
+        before = int(user["remind_before"]) * 60
+        now = time.time()
+        for kind, target in zip(KINDS, t):
+            fire_at = target - before
+            if (user.get(f"last_{kind}_date") or "") == self.day or now > target:
+                continue
+            # oynadan keyingisi DB'dan o‘z vaqtida yuklanadi
+            if fire_at < self._horizon:
+                heapq.heappush(self._heap, (fire_at, next(self._seq), uid, v, kind, target))
+        self._wake.set()
+        return t
+
+    def _bump(self, user_id: int) -> int:
+        v = self._version.get(user_id, 0) + 1
+        self._version[user_id] = v
+        return v
+
+    def reschedule(self, due: Due, at: float) -> None:
+        """Hozir boshlab bo‘lmadi (masalan, chatda countdown bor) — keyinroq yana."""
+        v = self._version.get(due.user_id)
+        if at > due.target or v is None:
+            return
+        heapq.heappush(self._heap, (at, next(self._seq), due.user_id, v, due.kind, due.target))
+        self._wake.set()
+
+    def pop_due(self, now: float) -> List[Due]:
+        out = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, _, uid, v, kind, target = heapq.heappop(self._heap)
+            if self._version.get(uid) != v:
+                continue  # eskirgan yozuv
+            if now > target:
+                continue
+            out.append(Due(uid, kind, self.day, fire_at, target))
+        return out
+
+    # ===== loop =====
+
+    def start(self, on_due: Callable[[], Awaitable[None]], max_sleep: float = 60.0) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(on_due, max_sleep))
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, on_due: Callable[[], Awaitable[None]], max_sleep: float) -> None:
+        while True:
+            self._wake.clear()
+            nxt = self.next_at()
+            delay = max_sleep if nxt is None else min(max_sleep, nxt - time.time())
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+            if self.next_at() is not None and self.next_at() <= time.time():
+                try:
+                    await on_due()
+                except Exception:
+                    pass
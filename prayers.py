@@ -1,23 +1,123 @@
-import aiohttp
-from datetime import date
+import asyncio
+import calendar
+import time
+from datetime import date, datetime, timedelta
+import pytz
 
-BASE = "https://api.aladhan.com/v1"
+import astro
+from aladhan import AladhanClient, UpstreamError
+from cache import TTLCache
+from cities import coords, country as city_country
+from metrics import TIMINGS_BREAKER, TIMINGS_LATENCY, TIMINGS_STALE, timed
+from timings_store import DayTimes, TimingsStore, YearTable
 
+# Kunlik vaqtlar shu timezone bo‘yicha olinadi va shu timezone'ning yarim tunida eskiradi
+TZ = "Asia/Tashkent"
+
+# (city, country, date, method, school) -> {"imsak", "maghrib"}
+TIMINGS_CACHE = TTLCache()
+
+# (city, country, year, method, school) -> [(dd-mm-yyyy, HH:MM, HH:MM)]
+RAMADAN_CACHE = TTLCache(max_items=1000)
+RAMADAN_TTL = 24 * 3600
+
+# Jadval (tabular) hijri kalendar Aladhan'dan 1-2 kunga farq qilishi mumkin
+RAMADAN_MARGIN_DAYS = 2
+
+# (city, year, method, school) yillik jadvallari — mmap fayllar, worker'lar orasida umumiy
+STORE = TimingsStore()
+# faqat bir vaqtdagi build'larni birlashtirish uchun (jadval o‘zi STORE'da)
+YEAR_TABLES = TTLCache(max_items=1000)
+
+# (city, country, method, school) -> (dd-mm-yyyy, times): oxirgi muvaffaqiyatli javob (stale fallback uchun)
+LAST_GOOD: dict = {}
+# stale javob berilgandan keyin fon yangilash shuncha kutib uriniladi
+REVALIDATE_DELAY = 30.0
+_REVALIDATING: dict = {}
+
+# bitta urinish uchun timeout'lar (AladhanClient o‘zi qayta urinadi)
+DAY_TIMEOUT = 8
+CALENDAR_TIMEOUT = 15
+
+# Process bo‘yicha bitta pooled client; main() start_client/close_client qiladi
+client = AladhanClient()
+_BREAKER_LEVEL = {"closed": 0, "half_open": 1, "open": 2}
+TIMINGS_BREAKER.set_function(lambda: _BREAKER_LEVEL[client.breaker.state])
+
+
+# "api" — api.aladhan.com, "local" — astro.py bilan offline hisoblash
+BACKEND = "api"
+
+
+def set_timezone(tz: str) -> None:
+    global TZ
+    TZ = tz
+
+
+def set_store_dir(path: str) -> None:
+    global STORE
+    STORE.close()
+    STORE = TimingsStore(path)
+    YEAR_TABLES.clear()
+
+
+def set_backend(name: str) -> None:
+    global BACKEND
+    if name not in ("api", "local"):
+        raise ValueError(f"Noma'lum timings backend: {name}")
+    BACKEND = name
+
+
+def _city_coords(city: str):
+    ll = coords(city)
+    if not ll:
+        raise RuntimeError(f"Shahar koordinatalari topilmadi: {city}")
+    return ll
+
+
+async def start_client(**pool) -> AladhanClient:
+    global client
+    if pool:
+        await client.close()
+        client = AladhanClient(**pool)
+    await client.start()
+    return client
+
+
+async def close_client() -> None:
+    await client.close()
+
+
+def _midnight_after(day: date) -> float:
+    tz = pytz.timezone(TZ)
+    return tz.localize(datetime.combine(day + timedelta(days=1), datetime.min.time())).timestamp()
 
-async def get_today(city: str, country: str, method: int = 2, school: int = 1):
-    """
-    Returns today's timings (Imsak, Maghrib) by city/country.
-    """
-    d = date.today().strftime("%d-%m-%Y")
-    url = f"{BASE}/timingsByCity/{d}"
-    params = {"city": city, "country": country, "method": method, "school": school}
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, params=params, timeout=20) as r:
-            data = await r.json()
+def _tz_today() -> date:
+    return datetime.now(pytz.timezone(TZ)).date()
 
-    if data.get("code") != 200:
-        raise RuntimeError(str(data))
+
+def cache_stats() -> dict:
+    return TIMINGS_CACHE.stats()
+
+
+def _local_day(d: str, city: str, method: int, school: int):
+    lat, lng = _city_coords(city)
+    day = datetime.strptime(d, "%d-%m-%Y").date()
+    t = astro.calendar_days(lat, lng, [day], TZ, method, school)[0]["timings"]
+    return {
+        "imsak": t["Imsak"],
+        "maghrib": t["Maghrib"],
+    }
+
+
+async def _fetch_day(d: str, city: str, country: str, method: int, school: int):
+    if BACKEND == "local":
+        return _local_day(d, city, method, school)
+
+    # gazetteer'dagi shahar o‘z davlat kodi bilan so‘raladi (Shymkent — KZ, Khujand — TJ ...)
+    params = {"city": city, "country": city_country(city) or country, "method": method, "school": school}
+    data = await client.get_json(f"/timingsByCity/{d}", params, timeout=DAY_TIMEOUT)
 
     t = data["data"]["timings"]
     return {
@@ -26,6 +126,247 @@ async def get_today(city: str, country: str, method: int = 2, school: int = 1):
     }
 
 
+async def _load_day(d: str, city: str, country: str, method: int, school: int):
+    times = await _fetch_day(d, city, country, method, school)
+    LAST_GOOD[(city.lower(), country.upper(), method, school)] = (d, times)
+    return times
+
+
+def _fallback_day(city: str, country: str, day: date, method: int, school: int):
+    """
+    Upstream ishlamayotganda: 1) shu kunning yillik jadvali (aniq), 2) oxirgi olingan vaqtlar
+    ("stale" — qaysi kunniki), 3) astro.py bilan lokal hisob ("stale": "local").
+    """
+    table = STORE.open(city, day.year, method, school)
+    dt = table.day_times(day) if table is not None else None
+    if dt is not None:
+        TIMINGS_STALE.inc(source="table")
+        return {"imsak": astro.hhmm(dt.imsak), "maghrib": astro.hhmm(dt.maghrib)}
+
+    last = LAST_GOOD.get((city.lower(), country.upper(), method, school))
+    if last is not None:
+        TIMINGS_STALE.inc(source="last_good")
+        return {**last[1], "stale": last[0]}
+
+    if coords(city):
+        TIMINGS_STALE.inc(source="local")
+        return {**_local_day(day.strftime("%d-%m-%Y"), city, method, school), "stale": "local"}
+    return None
+
+
+def _schedule_revalidate(key, city: str, country: str, day: date, method: int, school: int) -> None:
+    if key in _REVALIDATING:
+        return
+
+    async def run() -> None:
+        try:
+            await asyncio.sleep(REVALIDATE_DELAY)
+            d = day.strftime("%d-%m-%Y")
+            await TIMINGS_CACHE.get_or_load(
+                key,
+                lambda: _load_day(d, city, country, method, school),
+                lambda: _midnight_after(day),
+            )
+        except Exception:
+            # hali ham ishlamayapti — keyingi stale javobda yana rejalashtiriladi
+            pass
+        finally:
+            _REVALIDATING.pop(key, None)
+
+    _REVALIDATING[key] = asyncio.create_task(run())
+
+
+async def _get_timings(city: str, country: str, day: date, method: int, school: int):
+    d = day.strftime("%d-%m-%Y")
+    key = (city.lower(), country.upper(), d, method, school)
+    try:
+        times = await TIMINGS_CACHE.get_or_load(
+            key,
+            lambda: _load_day(d, city, country, method, school),
+            lambda: _midnight_after(day),
+        )
+    except Exception as e:
+        # noma'lum shahar va h.k. — eski javob yordam bermaydi
+        if isinstance(e, UpstreamError) and not e.retryable:
+            raise
+        # ✅ MUHIM: Aladhan o‘chiq bo‘lsa ham reminder/countdown to‘xtamasin
+        times = _fallback_day(city, country, day, method, school)
+        if times is None:
+            raise
+        _schedule_revalidate(key, city, country, day, method, school)
+    # chaqiruvchi o‘zgartirib yubormasin
+    return dict(times)
+
+
+def health() -> dict:
+    """Timings qatlami holati: backend, Aladhan circuit breaker, stale fallback'lar."""
+    return {
+        "backend": BACKEND,
+        "aladhan": client.health(),
+        "revalidating": len(_REVALIDATING),
+        "last_good_cities": len(LAST_GOOD),
+        "cache": TIMINGS_CACHE.stats(),
+    }
+
+
+@timed(TIMINGS_LATENCY, fn="get_timings")
+async def get_timings(city: str, country: str, day: date, method: int = 2, school: int = 1):
+    """
+    Berilgan kun (TZ bo‘yicha) uchun Imsak/Maghrib. Natija o‘sha kun tugaguncha keshda turadi.
+    """
+    return await _get_timings(city, country, day, method, school)
+
+
+@timed(TIMINGS_LATENCY, fn="get_today")
+async def get_today(city: str, country: str, method: int = 2, school: int = 1):
+    """
+    Returns today's timings (Imsak, Maghrib) by city/country.
+    Natija TZ bo‘yicha yarim tungacha keshda turadi.
+    """
+    return await _get_timings(city, country, _tz_today(), method, school)
+
+
+def _hhmm_minutes(s: str) -> int | None:
+    try:
+        h, m = (s or "").strip()[:5].split(":")
+        return int(h) * 60 + int(m)
+    except ValueError:
+        return None
+
+
+def _utc_offset_min(zone, d: date) -> int:
+    # kun o‘rtasidagi offset (DST o‘tish kunlarida tun vaqtlari 1 soatga siljishi mumkin)
+    return int(zone.utcoffset(datetime(d.year, d.month, d.day, 12)).total_seconds() // 60)
+
+
+def _year_records_local(city: str, year: int, method: int, school: int) -> list:
+    lat, lng = _city_coords(city)
+    zone = pytz.timezone(TZ)
+    days, computed = astro.compute_year(lat, lng, year, TZ, method, school)
+    out = []
+    for d, t in zip(days, computed):
+        _, hm, hd = astro.gregorian_to_hijri(d)
+        out.append(([t.get(p) for p in astro.PRAYERS], _utc_offset_min(zone, d), hm, hd))
+    return out
+
+
+async def _year_records_api(city: str, country: str, year: int, method: int, school: int) -> list:
+    months = await asyncio.gather(
+        *(get_calendar_by_city(m, year, city, country, method, school) for m in range(1, 13))
+    )
+    zone = pytz.timezone(TZ)
+    out = []
+    for days in months:
+        for d in days:
+            g = datetime.strptime(d["date"]["gregorian"]["date"], "%d-%m-%Y").date()
+            hijri = d["date"]["hijri"]
+            t = d["timings"]
+            out.append((
+                [_hhmm_minutes(t.get(p)) for p in astro.PRAYERS],
+                _utc_offset_min(zone, g),
+                int(hijri["month"]["number"]),
+                int(hijri["day"]),
+            ))
+    if len(out) != (date(year + 1, 1, 1) - date(year, 1, 1)).days:
+        raise RuntimeError(f"{city} {year}: yillik kalendar to‘liq emas ({len(out)} kun)")
+    return out
+
+
+async def _build_year(city: str, country: str, year: int, method: int, school: int) -> YearTable:
+    if BACKEND == "local":
+        records = await asyncio.to_thread(_year_records_local, city, year, method, school)
+        source = "local"
+    else:
+        records = await _year_records_api(city, country, year, method, school)
+        source = "api"
+    return STORE.write(city, year, method, school, records, source)
+
+
+async def get_year_table(city: str, country: str, year: int, method: int = 2, school: int = 1) -> YearTable:
+    """(city, year) yillik jadvali: diskda bo‘lsa mmap, bo‘lmasa API yoki astro.py'dan to‘ldiriladi."""
+    table = STORE.open(city, year, method, school)
+    if table is not None:
+        return table
+    key = (city.lower(), year, method, school)
+    return await YEAR_TABLES.get_or_load(
+        key,
+        lambda: _build_year(city, country, year, method, school),
+        float("inf"),
+    )
+
+
+def _day_times_from_strings(day: date, t: dict) -> DayTimes:
+    zone = pytz.timezone(TZ)
+    imsak, maghrib = _hhmm_minutes(t["imsak"]), _hhmm_minutes(t["maghrib"])
+    if imsak is None or maghrib is None:
+        raise RuntimeError(f"Noto‘g‘ri vaqt formati: {t}")
+    midnight = zone.localize(datetime.combine(day, datetime.min.time())).timestamp()
+    _, hm, hd = astro.gregorian_to_hijri(day)
+    return DayTimes(
+        imsak, maghrib, midnight + imsak * 60.0, midnight + maghrib * 60.0, hm, hd, stale=bool(t.get("stale"))
+    )
+
+
+@timed(TIMINGS_LATENCY, fn="get_day_times")
+async def get_day_times(city: str, country: str, day: date | None = None, method: int = 2, school: int = 1) -> DayTimes:
+    """
+    Imsak/Maghrib minutlari, epoch vaqtlari va hijri sana — yillik jadvaldan (parse/pytz'siz).
+    Jadval qurib bo‘lmasa kunlik vaqtlarga qaytadi.
+    """
+    day = day or _tz_today()
+    try:
+        dt = (await get_year_table(city, country, day.year, method, school)).day_times(day)
+    except Exception:
+        dt = None
+    if dt is None:
+        return _day_times_from_strings(day, await _get_timings(city, country, day, method, school))
+    return dt
+
+
+async def prefetch(
+    cities: list[str],
+    country: str,
+    days: int = 2,
+    concurrency: int = 4,
+    method: int = 2,
+    school: int = 1,
+) -> dict:
+    """
+    Bugundan boshlab `days` kunlik vaqtlarni keshga va shu yillarning jadvallarini STORE'ga
+    oldindan yuklaydi (bir vaqtda `concurrency` ta so‘rov),
+    shunda yarim tundan keyingi birinchi so‘rovlar va imsak countdown'lari tarmoqni kutmaydi.
+    """
+    today = _tz_today()
+    sem = asyncio.Semaphore(max(1, concurrency))
+    result = {"ok": 0, "tables": 0, "failed": 0}
+
+    async def one(city: str, day: date) -> None:
+        async with sem:
+            try:
+                await _get_timings(city, country, day, method, school)
+                result["ok"] += 1
+            except Exception:
+                # noma'lum shahar yoki tarmoq xatosi — foydalanuvchi so‘raganda qayta urinib ko‘riladi
+                result["failed"] += 1
+
+    async def table(city: str, year: int) -> None:
+        async with sem:
+            try:
+                await get_year_table(city, country, year, method, school)
+                result["tables"] += 1
+            except Exception:
+                result["failed"] += 1
+
+    span = [today + timedelta(days=i) for i in range(max(1, days))]
+    years = sorted({d.year for d in span})
+    await asyncio.gather(
+        *(one(c, d) for c in cities for d in span),
+        *(table(c, y) for c in cities for y in years),
+    )
+    return result
+
+
+@timed(TIMINGS_LATENCY, fn="get_calendar_by_city")
 async def get_calendar_by_city(
     month: int,
     year: int,
@@ -38,14 +379,78 @@ async def get_calendar_by_city(
     Gregorian month calendar for a city.
     Returns list of day objects (contains timings + hijri date).
     """
-    url = f"{BASE}/calendarByCity/{year}/{month}"
-    params = {"city": city, "country": country, "method": method, "school": school}
-
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, params=params, timeout=30) as r:
-            data = await r.json()
+    if BACKEND == "local":
+        lat, lng = _city_coords(city)
+        n = calendar.monthrange(year, month)[1]
+        days = [date(year, month, i) for i in range(1, n + 1)]
+        return astro.calendar_days(lat, lng, days, TZ, method, school)
 
-    if data.get("code") != 200:
-        raise RuntimeError(str(data))
+    params = {"city": city, "country": city_country(city) or country, "method": method, "school": school}
+    data = await client.get_json(f"/calendarByCity/{year}/{month}", params, timeout=CALENDAR_TIMEOUT)
 
     return data["data"]
+
+
+def ramadan_window(year: int) -> tuple[date, date]:
+    """
+    Gregorian `year` ichida boshlanadigan (birinchi) Ramazonning taxminiy oralig‘i.
+    Lokal hijri hisob bilan, tarmoqsiz.
+    """
+    h = int((year - 622) * 33 / 32)
+    for hy in range(h - 1, h + 3):
+        start = astro.hijri_to_gregorian(hy, 9, 1)
+        if start.year == year:
+            end = astro.hijri_to_gregorian(hy, 10, 1) - timedelta(days=1)
+            return start, end
+    raise ValueError(f"Ramazon topilmadi: {year}")
+
+
+def _months_between(start: date, end: date) -> list[tuple[int, int]]:
+    out = []
+    y, m = start.year, start.month
+    while (y, m) <= (end.year, end.month):
+        out.append((y, m))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return out
+
+
+async def _fetch_ramadan_rows(year: int, city: str, country: str, method: int, school: int):
+    start, end = ramadan_window(year)
+    margin = timedelta(days=RAMADAN_MARGIN_DAYS)
+    lo, hi = start - margin, end + margin
+    months = _months_between(lo, hi)
+
+    results = await asyncio.gather(
+        *(get_calendar_by_city(m, y, city, country, method, school) for y, m in months)
+    )
+
+    rows = []  # (greg_date, imsak, magh)
+    for days in results:
+        for d in days:
+            hijri = d["date"]["hijri"]
+            if hijri["month"]["number"] != 9:  # Ramadan
+                continue
+            g_date = d["date"]["gregorian"]["date"]  # dd-mm-yyyy
+            g = datetime.strptime(g_date, "%d-%m-%Y").date()
+            # boshqa yilning Ramazoni aralashib ketmasin
+            if not (lo <= g <= hi):
+                continue
+            t = d["timings"]
+            imsak = (t.get("Imsak") or "")[:5]
+            magh = (t.get("Maghrib") or "")[:5]
+            rows.append((g_date, imsak, magh))
+    return rows
+
+
+async def get_ramadan_rows(city: str, country: str, year: int, method: int = 2, school: int = 1):
+    """
+    `year` dagi Ramazon kunlari: [(dd-mm-yyyy, imsak HH:MM, maghrib HH:MM)].
+    Faqat Ramazonga to‘g‘ri keladigan 1-2 oy parallel olinadi, natija (city, year) bo‘yicha keshlanadi.
+    """
+    key = (city.lower(), country.upper(), year, method, school)
+    rows = await RAMADAN_CACHE.get_or_load(
+        key,
+        lambda: _fetch_ramadan_rows(year, city, country, method, school),
+        lambda: time.time() + RAMADAN_TTL,
+    )
+    return list(rows)
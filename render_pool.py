@@ -0,0 +1,113 @@
+"""
+Taqvim PNG'ini event loop'dan tashqarida chizish: ProcessPoolExecutor (boshqa yadrolarda),
+process pool ishlamasa — ThreadPoolExecutor.
+
+    pool = RenderPool(workers=2, max_concurrent=4)
+    pool.start()
+    png = await pool.render(title, rows)
+    await pool.close()
+
+Bir vaqtda max_concurrent tadan ortiq render yuborilmaydi, qolganlari semaphore navbatida kutadi.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+from calendar_image import render_png_bytes
+from metrics import RENDER_LATENCY
+
+log = logging.getLogger(__name__)
+
+
+def _mp_context():
+    # ✅ fork emas: asyncio/aiosqlite thread'lari bor process'ni fork qilish xavfli.
+    # forkserver __main__ (bot.py) va Pillow'ni bir marta yuklaydi, worker'lar undan tez fork qilinadi
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["__main__", "calendar_image"])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+class RenderPool:
+    def __init__(self, workers: int = 2, max_concurrent: int = 4, mode: str = "process"):
+        if mode not in ("process", "thread"):
+            raise ValueError(f"Noma'lum render mode: {mode}")
+        self.workers = max(1, workers)
+        self.max_concurrent = max(1, max_concurrent)
+        self.mode = mode
+        self._executor: Optional[Executor] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self.rendered = 0
+        self.waiting = 0
+
+    def start(self) -> None:
+        if self._executor is not None:
+            return
+        self._sem = asyncio.Semaphore(self.max_concurrent)
+        if self.mode == "process":
+            try:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=_mp_context())
+                # worker'lar startup'da ko‘tarilsin — birinchi foydalanuvchi import vaqtini kutmasin
+                for _ in range(self.workers):
+                    self._executor.submit(int)
+                return
+            except (OSError, NotImplementedError, ValueError):
+                log.warning("ProcessPoolExecutor ishlamadi — thread pool'ga o‘tiladi", exc_info=True)
+        self._use_threads()
+
+    def _use_threads(self) -> None:
+        self.mode = "thread"
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="render")
+
+    async def close(self) -> None:
+        if self._executor is None:
+            return
+        executor, self._executor = self._executor, None
+        await asyncio.get_running_loop().run_in_executor(None, lambda: executor.shutdown(wait=True, cancel_futures=True))
+
+    @property
+    def started(self) -> bool:
+        return self._executor is not None
+
+    async def render(self, title: str, rows: List[Tuple[str, str, str]], png_mode: str = "palette") -> bytes:
+        if self._executor is None:
+            self.start()
+        loop = asyncio.get_running_loop()
+        self.waiting += 1
+        try:
+            await self._sem.acquire()
+        finally:
+            self.waiting -= 1
+        t = time.perf_counter()
+        try:
+            executor = self._executor
+            try:
+                data = await loop.run_in_executor(executor, render_png_bytes, title, rows, png_mode)
+            except BrokenProcessPool:
+                # child o‘ldirildi (OOM va h.k.) — qolgan umr thread'larda
+                if self._executor is executor:
+                    log.warning("render process pool buzildi — thread pool'ga o‘tiladi")
+                    self._use_threads()
+                    executor.shutdown(wait=False, cancel_futures=True)
+                data = await loop.run_in_executor(self._executor, render_png_bytes, title, rows, png_mode)
+        finally:
+            self._sem.release()
+            RENDER_LATENCY.observe(time.perf_counter() - t)
+        self.rendered += 1
+        return data
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_concurrent": self.max_concurrent,
+            "waiting": self.waiting,
+            "rendered": self.rendered,
+        }
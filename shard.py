@@ -0,0 +1,310 @@
+"""
+Bir nechta worker process uchun: chat_id'larni consistent hashing bilan bo‘lish
+va umumiy holat (live sessiya lease'lari, "reminder yuborildi" belgilari, vaqtinchalik qiymatlar).
+
+SHARED_STATE_URL:
+    sqlite:///data.sqlite3   — default, bir mashinadagi process'lar uchun
+    memory://                — bitta process (testlar)
+"""
+from __future__ import annotations
+
+import bisect
+import hashlib
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import aiosqlite
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class ShardRing:
+    """chat_id -> worker (0..count-1). Worker soni o‘zgarsa kalitlarning ~1/n qismi ko‘chadi."""
+
+    def __init__(self, count: int = 1, vnodes: int = 64):
+        self.count = max(1, count)
+        points: List[Tuple[int, int]] = []
+        for w in range(self.count):
+            for v in range(vnodes):
+                points.append((_hash(f"worker-{w}#{v}"), w))
+        points.sort()
+        self._keys = [p for p, _ in points]
+        self._owners = [w for _, w in points]
+
+    def owner(self, chat_id: int) -> int:
+        if self.count == 1:
+            return 0
+        i = bisect.bisect(self._keys, _hash(str(chat_id))) % len(self._keys)
+        return self._owners[i]
+
+
+class SharedState:
+    """Pluggable backend interfeysi."""
+
+    async def init(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def claim_reminder(self, user_id: int, kind: str, day: str, owner: str) -> bool:
+        raise NotImplementedError
+
+    async def release_claim(self, user_id: int, kind: str, day: str, owner: str) -> None:
+        """Reminder yuborilmadi — boshqa urinish (shu yoki boshqa worker) qayta claim qila olsin."""
+        raise NotImplementedError
+
+    async def acquire_lease(self, chat_id: int, owner: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    async def renew_leases(self, chat_ids: Iterable[int], owner: str, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def release_lease(self, chat_id: int, owner: str) -> None:
+        raise NotImplementedError
+
+    async def lease_owner(self, chat_id: int) -> Optional[str]:
+        raise NotImplementedError
+
+    async def request_stop(self, chat_id: int) -> None:
+        raise NotImplementedError
+
+    async def stop_requests(self, owner: str) -> List[int]:
+        """Shu owner'ning to‘xtatish so‘ralgan chat'lari (o‘qilgach tozalanadi)."""
+        raise NotImplementedError
+
+    async def request_replan(self, user_id: int, owner: str) -> None:
+        """Foydalanuvchi sozlamasi boshqa worker'da o‘zgardi — egasi rejasini DB'dan qayta o‘qisin."""
+        raise NotImplementedError
+
+    async def replan_requests(self, owner: str) -> List[int]:
+        """Shu owner uchun qayta rejalash so‘ralgan foydalanuvchilar (o‘qilgach tozalanadi)."""
+        raise NotImplementedError
+
+    async def get_value(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set_value(self, key: str, value: str, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def cleanup(self, before_day: str) -> None:
+        pass
+
+
+class MemorySharedState(SharedState):
+    def __init__(self):
+        self._claims: Set[Tuple[int, str, str]] = set()
+        self._leases: Dict[int, Tuple[str, float, bool]] = {}
+        self._kv: Dict[str, Tuple[str, float]] = {}
+        self._replans: Dict[int, str] = {}
+
+    async def claim_reminder(self, user_id, kind, day, owner):
+        key = (user_id, kind, day)
+        if key in self._claims:
+            return False
+        self._claims.add(key)
+        return True
+
+    async def release_claim(self, user_id, kind, day, owner):
+        self._claims.discard((user_id, kind, day))
+
+    async def acquire_lease(self, chat_id, owner, ttl):
+        now = time.time()
+        cur = self._leases.get(chat_id)
+        if cur and cur[0] != owner and cur[1] > now:
+            return False
+        self._leases[chat_id] = (owner, now + ttl, False)
+        return True
+
+    async def renew_leases(self, chat_ids, owner, ttl):
+        exp = time.time() + ttl
+        for c in chat_ids:
+            cur = self._leases.get(c)
+            if cur and cur[0] == owner:
+                self._leases[c] = (owner, exp, cur[2])
+
+    async def release_lease(self, chat_id, owner):
+        cur = self._leases.get(chat_id)
+        if cur and cur[0] == owner:
+            del self._leases[chat_id]
+
+    async def lease_owner(self, chat_id):
+        cur = self._leases.get(chat_id)
+        return cur[0] if cur and cur[1] > time.time() else None
+
+    async def request_stop(self, chat_id):
+        cur = self._leases.get(chat_id)
+        if cur:
+            self._leases[chat_id] = (cur[0], cur[1], True)
+
+    async def stop_requests(self, owner):
+        out = [c for c, (o, _, stop) in self._leases.items() if o == owner and stop]
+        for c in out:
+            del self._leases[c]
+        return out
+
+    async def request_replan(self, user_id, owner):
+        self._replans[user_id] = owner
+
+    async def replan_requests(self, owner):
+        out = [u for u, o in self._replans.items() if o == owner]
+        for u in out:
+            del self._replans[u]
+        return out
+
+    async def get_value(self, key):
+        cur = self._kv.get(key)
+        return cur[0] if cur and cur[1] > time.time() else None
+
+    async def set_value(self, key, value, ttl):
+        self._kv[key] = (value, time.time() + ttl)
+
+    async def cleanup(self, before_day):
+        self._claims = {k for k in self._claims if k[2] >= before_day}
+
+
+SHARED_SQL = """
+CREATE TABLE IF NOT EXISTS live_leases(
+  chat_id INTEGER PRIMARY KEY,
+  owner TEXT NOT NULL,
+  expires_at REAL NOT NULL,
+  stop_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS reminder_claims(
+  user_id INTEGER NOT NULL,
+  kind TEXT NOT NULL,
+  day TEXT NOT NULL,
+  owner TEXT NOT NULL,
+  PRIMARY KEY(user_id, kind, day)
+);
+CREATE TABLE IF NOT EXISTS replan_requests(
+  user_id INTEGER PRIMARY KEY,
+  owner TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shared_kv(
+  key TEXT PRIMARY KEY,
+  value TEXT NOT NULL,
+  expires_at REAL NOT NULL
+);
+"""
+
+
+class SqliteSharedState(SharedState):
+    """
+    Bir fayldagi SQLite (WAL) — bitta mashinadagi bir nechta process uchun.
+    Har bir claim/lease bitta atomik statement + commit.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[aiosqlite.Connection] = None
+
+    async def init(self) -> None:
+        self._conn = await aiosqlite.connect(self.path)
+        await self._conn.execute("PRAGMA journal_mode=WAL")
+        await self._conn.execute("PRAGMA busy_timeout=5000")
+        await self._conn.executescript(SHARED_SQL)
+        await self._conn.commit()
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def _exec(self, sql: str, params: tuple = ()) -> int:
+        cur = await self._conn.execute(sql, params)
+        n = cur.rowcount
+        await cur.close()
+        await self._conn.commit()
+        return n
+
+    async def claim_reminder(self, user_id, kind, day, owner):
+        n = await self._exec(
+            "INSERT OR IGNORE INTO reminder_claims(user_id, kind, day, owner) VALUES(?,?,?,?)",
+            (user_id, kind, day, owner),
+        )
+        return n == 1
+
+    async def release_claim(self, user_id, kind, day, owner):
+        await self._exec(
+            "DELETE FROM reminder_claims WHERE user_id=? AND kind=? AND day=? AND owner=?",
+            (user_id, kind, day, owner),
+        )
+
+    async def acquire_lease(self, chat_id, owner, ttl):
+        now = time.time()
+        n = await self._exec(
+            "INSERT INTO live_leases(chat_id, owner, expires_at) VALUES(?,?,?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET owner=excluded.owner, expires_at=excluded.expires_at, "
+            "stop_requested=0 WHERE live_leases.expires_at < ? OR live_leases.owner = excluded.owner",
+            (chat_id, owner, now + ttl, now),
+        )
+        return n == 1
+
+    async def renew_leases(self, chat_ids, owner, ttl):
+        ids = list(chat_ids)
+        if not ids:
+            return
+        exp = time.time() + ttl
+        await self._conn.executemany(
+            "UPDATE live_leases SET expires_at=? WHERE chat_id=? AND owner=?",
+            [(exp, c, owner) for c in ids],
+        )
+        await self._conn.commit()
+
+    async def release_lease(self, chat_id, owner):
+        await self._exec("DELETE FROM live_leases WHERE chat_id=? AND owner=?", (chat_id, owner))
+
+    async def lease_owner(self, chat_id):
+        async with self._conn.execute(
+            "SELECT owner FROM live_leases WHERE chat_id=? AND expires_at>=?", (chat_id, time.time())
+        ) as cur:
+            row = await cur.fetchone()
+        return row[0] if row else None
+
+    async def request_stop(self, chat_id):
+        await self._exec("UPDATE live_leases SET stop_requested=1 WHERE chat_id=?", (chat_id,))
+
+    async def stop_requests(self, owner):
+        async with self._conn.execute(
+            "DELETE FROM live_leases WHERE owner=? AND stop_requested=1 RETURNING chat_id", (owner,)
+        ) as cur:
+            rows = await cur.fetchall()
+        await self._conn.commit()
+        return [r[0] for r in rows]
+
+    async def request_replan(self, user_id, owner):
+        await self._exec("INSERT OR REPLACE INTO replan_requests(user_id, owner) VALUES(?,?)", (user_id, owner))
+
+    async def replan_requests(self, owner):
+        async with self._conn.execute("DELETE FROM replan_requests WHERE owner=? RETURNING user_id", (owner,)) as cur:
+            rows = await cur.fetchall()
+        await self._conn.commit()
+        return [r[0] for r in rows]
+
+    async def get_value(self, key):
+        async with self._conn.execute(
+            "SELECT value FROM shared_kv WHERE key=? AND expires_at>=?", (key, time.time())
+        ) as cur:
+            row = await cur.fetchone()
+        return row[0] if row else None
+
+    async def set_value(self, key, value, ttl):
+        await self._exec(
+            "INSERT OR REPLACE INTO shared_kv(key, value, expires_at) VALUES(?,?,?)",
+            (key, value, time.time() + ttl),
+        )
+
+    async def cleanup(self, before_day):
+        await self._exec("DELETE FROM reminder_claims WHERE day < ?", (before_day,))
+        await self._exec("DELETE FROM shared_kv WHERE expires_at < ?", (time.time(),))
+
+
+def make_shared_state(url: str) -> SharedState:
+    if url.startswith("memory://"):
+        return MemorySharedState()
+    if url.startswith("sqlite:///"):
+        return SqliteSharedState(url[len("sqlite:///"):])
+    raise RuntimeError(f"Noma'lum SHARED_STATE_URL: {url}")
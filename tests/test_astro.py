@@ -0,0 +1,25 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from astro import compare_with_recorded
+from cities import lookup
+
+# <manba>_<shahar>_<yyyy-mm>_m2_s1.json, "data" — calendarByCity formatida:
+#   calendarByCity_* — api.aladhan.com javobi (python astro.py record Tashkent 2025 3 <path>)
+#   praytimes_*      — praytimes.org 2.3 (Aladhan hisoblagichining asosi), manba "source" maydonida
+DATA = Path(__file__).parent / "data"
+FIXTURES = sorted(DATA.glob("*_m2_s1.json"))
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=[p.stem for p in FIXTURES])
+def test_matches_reference_calendar(path):
+    city = lookup(path.stem.split("_")[1])
+    recorded = json.loads(path.read_text(encoding="utf-8"))["data"]
+
+    worst = compare_with_recorded(
+        recorded, city.lat, city.lng, city.tz, method=2, school=1, prayers=("Imsak", "Fajr", "Maghrib", "Isha")
+    )
+
+    assert all(v <= 1 for v in worst.values()), worst
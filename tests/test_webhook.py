@@ -0,0 +1,95 @@
+import asyncio
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+from aiohttp.test_utils import TestServer
+
+from fake_telegram import FakeTelegramClient
+from webhook import build_app
+
+TOKEN = "123456:TEST"
+SECRET = "s3cret"
+
+
+def _dispatcher(seen: list) -> Dispatcher:
+    dp = Dispatcher()
+
+    @dp.message()
+    async def record(m: Message):
+        seen.append((m.from_user.id, m.text))
+
+    return dp
+
+
+def _run(scenario, **app_kw):
+    async def main():
+        seen: list = []
+        bot = Bot(TOKEN)
+        app = build_app(_dispatcher(seen), bot, secret=SECRET, **app_kw)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            return await scenario(server, app, seen)
+        finally:
+            await server.close()
+            await bot.session.close()
+
+    return asyncio.run(main())
+
+
+def test_wrong_or_missing_secret_is_401():
+    async def scenario(server, app, seen):
+        url = str(server.make_url("/webhook"))
+        async with FakeTelegramClient(url, secret="wrong") as wrong, FakeTelegramClient(url) as missing:
+            statuses = [await wrong.message(1, "hi"), await missing.message(1, "hi")]
+        await app["webhook_handler"].drain()
+        return statuses, seen
+
+    statuses, seen = _run(scenario)
+    assert statuses == [401, 401]
+    assert seen == []
+
+
+def test_valid_update_reaches_dispatcher():
+    async def scenario(server, app, seen):
+        async with FakeTelegramClient(str(server.make_url("/webhook")), secret=SECRET) as client:
+            status = await client.message(7, "⏳ Bugungi vaqtlar")
+        await app["webhook_handler"].drain()
+        return status, seen
+
+    status, seen = _run(scenario)
+    assert status == 200
+    assert seen == [(7, "⏳ Bugungi vaqtlar")]
+
+
+def test_health_responds():
+    async def scenario(server, app, seen):
+        async with aiohttp.ClientSession() as session:
+            async with session.get(server.make_url("/webhook/health")) as r:
+                return r.status, await r.json()
+
+    status, body = _run(scenario, health=lambda: {"breaker": "closed"})
+    assert status == 200
+    assert body["ok"] is True
+    assert body["timings"] == {"breaker": "closed"}
+
+
+def test_saturated_backlog_is_503():
+    release = asyncio.Event()
+
+    async def scenario(server, app, seen):
+        handler = app["webhook_handler"]
+        handler.dp.message.outer_middleware(lambda h, e, d: release.wait())
+        async with FakeTelegramClient(str(server.make_url("/webhook")), secret=SECRET) as client:
+            statuses = [await client.message(1, str(i)) for i in range(4)]
+            in_flight = handler.in_flight
+            release.set()
+            await handler.drain()
+            statuses.append(await client.message(1, "again"))
+        await handler.drain()
+        return statuses, in_flight
+
+    statuses, in_flight = _run(scenario, concurrency=1, backlog=2)
+    assert statuses == [200, 200, 503, 503, 200]
+    assert in_flight == 2
@@ -27,3 +27,5 @@ GROUP_HELP = (
     "• /ramadan — shu guruhda bugungi saharlik/iftor va countdown\n"
     "• /start — bot menyusi\n"
 )
+
+STALE_NOTE = "\n⚠️ Vaqtlar serveri hozir javob bermayapti — taxminiy (oxirgi ma'lum) vaqtlar ko‘rsatildi.\n"
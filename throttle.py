@@ -0,0 +1,127 @@
+"""
+Menyu tugmalari/komandalar uchun debounce:
+
+    router.message.middleware(ThrottleMiddleware(window=2, chat_window=5))
+
+    @router.message(F.text == "⏳ Bugungi vaqtlar", flags={"throttle": "today"})
+
+Faqat `throttle` flag'i bor handler'larga ta'sir qiladi. Kalit = (flag, matn yoki callback data):
+- bir foydalanuvchi `window` ichida bir xil amalni qayta bossa — tashlanadi
+- guruhda kim bosmasin, bir chatda `chat_window` ichida bittasi bajariladi
+- shu chatda xuddi shu amal hali bajarilayotgan bo‘lsa — yangisi kutmasdan tashlanadi
+  (javob baribir shu chatga keladi)
+Tashlangan callback'larga ham answer() qilinadi — tugmadagi soat aylanib qolmasin.
+
+Javob bosgan odamga bog‘liq bo‘lsa (masalan, uning shahri), chat kaliti shu qiymat bilan
+ajratiladi — aks holda boshqa shahardagi a'zo javobsiz qolardi:
+
+    ThrottleMiddleware(scopes={"city": city_of})          # async city_of(user_id)
+    @router.message(..., flags={"throttle": "today", "throttle_scope": "city"})
+
+`scopes`da yo‘q scope'li handler'lar uchun chat bo‘yicha birlashtirish o‘chadi.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message
+
+from metrics import HANDLER_THROTTLED
+
+# shuncha kalitdan oshsa eskilari tozalanadi
+MAX_KEYS = 50_000
+
+
+class ThrottleMiddleware(BaseMiddleware):
+    def __init__(
+        self,
+        window: float = 2.0,
+        chat_window: float = 5.0,
+        scopes: Optional[Dict[str, Callable[[int], Awaitable[Hashable]]]] = None,
+    ):
+        self.window = window
+        self.chat_window = chat_window
+        self.scopes = scopes or {}
+        self._last: Dict[Hashable, float] = {}
+        self._inflight: Set[Hashable] = set()
+        self.passed = 0
+        self.throttled = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def _payload(event: Any) -> Optional[str]:
+        if isinstance(event, CallbackQuery):
+            return event.data
+        if isinstance(event, Message):
+            # "/ramadan@bot args" -> "/ramadan"
+            text = event.text or ""
+            return text.split(maxsplit=1)[0].split("@", 1)[0] if text.startswith("/") else text
+        return None
+
+    def _hit(self, key: Hashable, window: float, now: float) -> bool:
+        last = self._last.get(key)
+        if last is not None and now - last < window:
+            return True
+        self._last[key] = now
+        return False
+
+    def _sweep(self, now: float) -> None:
+        keep = max(self.window, self.chat_window)
+        self._last = {k: t for k, t in self._last.items() if now - t < keep}
+
+    async def _drop(self, event: Any, name: str, reason: str) -> None:
+        HANDLER_THROTTLED.inc(handler=name, reason=reason)
+        if isinstance(event, CallbackQuery):
+            try:
+                await event.answer("⏳")
+            except Exception:
+                pass
+
+    async def __call__(self, handler, event, data):
+        name = get_flag(data, "throttle")
+        payload = self._payload(event)
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        if name is None or payload is None or user is None:
+            return await handler(event, data)
+
+        chat_id = chat.id if chat is not None else user.id
+        chat_key = ("chat", chat_id, name, payload)
+        scope = get_flag(data, "throttle_scope")
+        if scope is not None:
+            resolve = self.scopes.get(scope)
+            # scope'ni aniqlab bo‘lmasa — chat kaliti shu foydalanuvchiniki
+            chat_key += (await resolve(user.id),) if resolve is not None else (("user", user.id),)
+        if chat_key in self._inflight:
+            self.coalesced += 1
+            return await self._drop(event, name, "coalesced")
+
+        now = time.monotonic()
+        if len(self._last) > MAX_KEYS:
+            self._sweep(now)
+        throttled = self._hit(("user", user.id, name, payload), self.window, now)
+        # ✅ guruhda har a'zo o‘z kaliti bilan o‘tib ketmasin — chat bo‘yicha ham
+        if not throttled and chat is not None and chat.type != "private":
+            throttled = self._hit(chat_key, self.chat_window, now)
+        if throttled:
+            self.throttled += 1
+            return await self._drop(event, name, "throttled")
+
+        self.passed += 1
+        self._inflight.add(chat_key)
+        try:
+            return await handler(event, data)
+        finally:
+            self._inflight.discard(chat_key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "passed": self.passed,
+            "throttled": self.throttled,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "keys": len(self._last),
+        }
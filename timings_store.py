@@ -0,0 +1,143 @@
+"""
+Ixcham yillik vaqtlar jadvali: har (shahar, yil, method, school) uchun bitta fayl, mmap bilan o‘qiladi.
+
+Fayl formati (little-endian):
+    header  "<4sHHBBBx"  magic b"RTT1", yil, kunlar soni, method, school, manba (b"a"pi / b"l"ocal)
+    yozuv   "<8HhBB"     har kun uchun: astro.PRAYERS tartibida mahalliy yarim tundan beri minutlar
+                         (yo‘q bo‘lsa 0xFFFF), UTC offset (minut), hijri oy, hijri kun
+
+Yozuv 20 bayt, yil ~7 KB. Qidiruv — kun indeksi bo‘yicha offset hisoblash (O(1)).
+Fayllar read-only mmap qilinadi: bir nechta worker process bitta page cache'ni bo‘lishadi.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import re
+import struct
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from astro import PRAYERS
+
+MAGIC = b"RTT1"
+HEADER = struct.Struct("<4sHHBBBx")
+RECORD = struct.Struct("<8HhBB")
+MISSING = 0xFFFF
+
+_PRAYER_IDX = {p.lower(): i for i, p in enumerate(PRAYERS)}
+_MINUTE = struct.Struct("<H")
+_UNIX_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# (8 ta minut, utc_offset_min, hijri_month, hijri_day)
+Record = Tuple[Sequence[int], int, int, int]
+
+
+class DayTimes(NamedTuple):
+    imsak: int  # mahalliy yarim tundan beri minut
+    maghrib: int
+    imsak_at: float  # epoch
+    maghrib_at: float
+    hijri_month: int
+    hijri_day: int
+    # upstream ishlamaganda boshqa kunning/lokal hisobning vaqtlari (taxminiy)
+    stale: bool = False
+
+
+def _slug(s: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", s.lower()).strip("_") or "city"
+
+
+class YearTable:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.year, self.days, self.method, self.school, source = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or len(self._mm) != HEADER.size + RECORD.size * self.days:
+            self._mm.close()
+            raise ValueError(f"Buzilgan timings fayli: {path}")
+        self.source = chr(source)
+        self._jan1 = date(self.year, 1, 1).toordinal()
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def _offset(self, d: date) -> int:
+        i = d.toordinal() - self._jan1
+        if not 0 <= i < self.days:
+            raise KeyError(d)
+        return HEADER.size + RECORD.size * i
+
+    def record(self, d: date) -> tuple:
+        return RECORD.unpack_from(self._mm, self._offset(d))
+
+    def minutes(self, d: date, prayer: str) -> Optional[int]:
+        m = _MINUTE.unpack_from(self._mm, self._offset(d) + 2 * _PRAYER_IDX[prayer.lower()])[0]
+        return None if m == MISSING else m
+
+    def day_times(self, d: date) -> Optional[DayTimes]:
+        """None — shu kun jadvalda yo‘q (MISSING): chaqiruvchi boshqa manbaga o‘tadi."""
+        rec = self.record(d)
+        imsak, maghrib = rec[_PRAYER_IDX["imsak"]], rec[_PRAYER_IDX["maghrib"]]
+        if imsak == MISSING or maghrib == MISSING:
+            return None
+        offset, hm, hd = rec[8], rec[9], rec[10]
+        # pytz'siz: kun boshi (UTC) + minutlar - offset
+        base = (d.toordinal() - _UNIX_EPOCH_ORDINAL) * 86400 - offset * 60
+        return DayTimes(imsak, maghrib, base + imsak * 60.0, base + maghrib * 60.0, hm, hd)
+
+
+class TimingsStore:
+    def __init__(self, directory: str = "cache/timings"):
+        self.dir = directory
+        self._tables: Dict[str, YearTable] = {}
+
+    def path(self, city: str, year: int, method: int, school: int) -> str:
+        return os.path.join(self.dir, f"{_slug(city)}_{year}_m{method}_s{school}.rtt")
+
+    def open(self, city: str, year: int, method: int = 2, school: int = 1) -> Optional[YearTable]:
+        path = self.path(city, year, method, school)
+        table = self._tables.get(path)
+        if table is not None:
+            return table
+        try:
+            table = YearTable(path)
+        except (OSError, ValueError):
+            return None
+        self._tables[path] = table
+        return table
+
+    def write(
+        self,
+        city: str,
+        year: int,
+        method: int,
+        school: int,
+        records: List[Record],
+        source: str,
+    ) -> YearTable:
+        buf = bytearray(HEADER.pack(MAGIC, year, len(records), method, school, ord(source[0])))
+        for minutes, offset, hm, hd in records:
+            mins = [MISSING if m is None else m for m in minutes]
+            buf += RECORD.pack(*mins, offset, hm, hd)
+
+        os.makedirs(self.dir, exist_ok=True)
+        path = self.path(city, year, method, school)
+        # ✅ boshqa worker yarim yozilgan faylni ko‘rmasin
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(buf)
+        os.replace(tmp, path)
+
+        old = self._tables.pop(path, None)
+        if old is not None:
+            old.close()
+        table = YearTable(path)
+        self._tables[path] = table
+        return table
+
+    def close(self) -> None:
+        for t in self._tables.values():
+            t.close()
+        self._tables.clear()
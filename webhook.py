@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+import hmac
+import logging
+from typing import Callable, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+log = logging.getLogger(__name__)
+
+
+class WebhookHandler:
+    """
+    Telegram update'ini qabul qiladi, darhol 200 qaytaradi va update'ni
+    fonda (concurrency cheklovi bilan) dispatcher'ga beradi.
+    Fonda `backlog`dan ko‘p update bo‘lsa — 503: task/xotira cheksiz o‘smaydi, Telegram qayta yuboradi.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, secret: str = "", concurrency: int = 100, backlog: int = 1000):
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        self.backlog = max(backlog, concurrency)
+        self._sem = asyncio.Semaphore(concurrency)
+        self._tasks: set[asyncio.Task] = set()
+        self.received = 0
+        self.rejected = 0
+        self.shed = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def __call__(self, request: web.Request) -> web.Response:
+        if self.secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            self.rejected += 1
+            return web.Response(status=401)
+
+        # ✅ body o‘qilishidan oldin: to‘lib qolganda update xotiraga ham olinmaydi
+        if len(self._tasks) >= self.backlog:
+            self.shed += 1
+            return web.Response(status=503, headers={"Retry-After": "1"})
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception:
+            self.rejected += 1
+            return web.Response(status=400)
+
+        self.received += 1
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update) -> None:
+        async with self._sem:
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                log.exception("update %s failed", update.update_id)
+
+    async def drain(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def build_app(
+    dp: Dispatcher,
+    bot: Bot,
+    path: str = "/webhook",
+    secret: str = "",
+    concurrency: int = 100,
+    health: Optional[Callable[[], dict]] = None,
+    backlog: int = 1000,
+) -> web.Application:
+    app = web.Application()
+    handler = WebhookHandler(dp, bot, secret, concurrency, backlog)
+    app["webhook_handler"] = handler
+    app.router.add_post(path, handler.__call__)
+
+    async def health_view(_: web.Request) -> web.Response:
+        body = {"ok": True, "in_flight": handler.in_flight, "shed": handler.shed}
+        if health is not None:
+            # masalan prayers.health(): Aladhan breaker holati — bot ishlayveradi, faqat ko‘rsatiladi
+            body["timings"] = health()
+        return web.json_response(body)
+
+    app.router.add_get(path.rstrip("/") + "/health", health_view)
+    return app
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    cfg,
+    stop: Optional[asyncio.Event] = None,
+    health: Optional[Callable[[], dict]] = None,
+) -> None:
+    """
+    Embedded aiohttp server. Telegram'ga webhook URL'ini ham o‘rnatadi
+    (WEBHOOK_BASE_URL bo‘sh bo‘lsa — tashqarida o‘rnatilgan deb hisoblanadi).
+    """
+    app = build_app(dp, bot, cfg.webhook_path, cfg.webhook_secret, cfg.webhook_concurrency, health, cfg.webhook_backlog)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, cfg.webhook_host, cfg.webhook_port)
+    await site.start()
+
+    if cfg.webhook_base_url:
+        await bot.set_webhook(
+            url=cfg.webhook_base_url.rstrip("/") + cfg.webhook_path,
+            secret_token=cfg.webhook_secret or None,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=min(100, cfg.webhook_concurrency),
+        )
+
+    try:
+        await (stop or asyncio.Event()).wait()
+    finally:
+        await app["webhook_handler"].drain()
+        await runner.cleanup()
@@ -0,0 +1,45 @@
+"""
+Bir mashinada N ta worker process:
+
+    python workers.py 4
+
+Har biriga WORKER_ID/WORKER_COUNT beriladi. Webhook rejimida har bir worker
+WEBHOOK_PORT + WORKER_ID portida tinglaydi (oldida load balancer turadi);
+polling rejimida update'larni faqat worker 0 oladi.
+"""
+from __future__ import annotations
+
+import os
+import signal
+import subprocess
+import sys
+
+
+def main(argv: list[str]) -> int:
+    n = int(argv[0]) if argv else int(os.getenv("WORKER_COUNT") or 1)
+    base_port = int(os.getenv("WEBHOOK_PORT") or 8080)
+
+    procs = []
+    for i in range(n):
+        env = dict(os.environ)
+        env["WORKER_ID"] = str(i)
+        env["WORKER_COUNT"] = str(n)
+        env["WEBHOOK_PORT"] = str(base_port + i)
+        procs.append(subprocess.Popen([sys.executable, "bot.py"], env=env))
+
+    def forward(signum, _frame):
+        for p in procs:
+            if p.poll() is None:
+                p.send_signal(signum)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    code = 0
+    for p in procs:
+        code = p.wait() or code
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))